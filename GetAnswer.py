@@ -2,109 +2,617 @@
 import os
 import shutil
 import glob
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import time
+import queue
+import functools
+import threading
+import re
+import contextvars
+from typing import Any
 from langchain_community.vectorstores import FAISS
 from langchain.chains import ConversationalRetrievalChain
-from langchain_community.document_loaders.csv_loader import CSVLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.memory import ConversationBufferMemory
+from langchain.chains.base import Chain
 from langchain.prompts import PromptTemplate
+from langchain_core.documents import Document
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.vectorstores import VectorStoreRetriever
 import traceback
+import stats_engine
+import tracing
+import data_source
+from trace_callbacks import LangChainSpanHandler
+import index_manifest as im
+import lexical_index
+import vector_index as vi
+import openai_http
+import embedding_providers as ep
+import shard_index
+import csv_documents
+from embedding_cache import CachedEmbeddings
+from chat_memory import TokenBudgetMemory, count_tokens
+from answer_cache import AnswerCache, temperature_band
+from resource_registry import LRURegistry, estimate_vectorstore_bytes
 
 # --- 설정 ---
-_CSV_DIRECTORY_PATH = r"C:\Users\skku07\Documents\GitHub\OneDayAI\BaseballCSVs" # 실제 경로로 수정 필요
+_CSV_DIRECTORY_PATH = data_source.DEFAULT_DIRECTORY
 _FAISS_INDEX_DIR = "faiss_indices"
+_EMBEDDING_MODEL = "text-embedding-ada-002"
+_EMBEDDING_CACHE_DIR = "embedding_cache"
+_LLM_MODEL = "gpt-4o-mini"
+_VECTORSTORE_MEMORY_BUDGET = 1 << 30  # 프로세스 전체에서 메모리에 유지할 벡터스토어 용량 (약 1GB)
+_MAX_CACHED_LLMS = 8
+_LEXICAL_MAX_DOCS = 12  # 이름으로 바로 찾은 행을 컨텍스트 후보로 넣는 최대 개수
+_HYBRID_FETCH_MULTIPLIER = 4  # 팀 이름이 있을 때 밀집 검색 후보를 k의 몇 배로 가져와 재순위할지
+_CONTEXT_CANDIDATES = 16  # 검색기가 가져오는 후보 수 (실제로 넣는 수는 토큰 예산으로 결정)
+DEFAULT_CONTEXT_TOKENS = 600  # 프롬프트 {context}에 넣을 검색 결과 토큰 예산
+_DOCUMENT_SEPARATOR_TOKENS = 1  # 문서 사이 "\n\n" (StuffDocumentsChain 기본 구분자)
+_MEMORY_TOKEN_LIMIT = 1200  # 프롬프트에 넣을 대화 기록 토큰 예산
+_MEMORY_KEEP_TURNS = 3  # 요약하지 않고 그대로 둘 최근 턴 수
+# 의미 기반 답변 캐시 (TTL이 0이면 사용 안 함). 유사도 기준은 임베딩 제공자별(embedding_providers.cache_threshold)이고,
+# ONEDAYAI_ANSWER_CACHE_THRESHOLD를 정하면 모든 제공자에 그 값을 씁니다
+_ANSWER_CACHE_THRESHOLD = float(os.environ["ONEDAYAI_ANSWER_CACHE_THRESHOLD"]) if os.environ.get("ONEDAYAI_ANSWER_CACHE_THRESHOLD") else None
+_ANSWER_CACHE_TTL = float(os.environ.get("ONEDAYAI_ANSWER_CACHE_TTL", str(6 * 3600)))
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+# 질문 재구성(condense) LLM 호출 방식
+#   auto: 선수/팀 이름이 있고 지시어가 없는 자기완결적 질문은 재구성 없이 바로 검색
+#   always: 대화 기록이 있으면 항상 재구성 (기존 방식), never: 재구성하지 않음
+_RETRIEVAL_MODES = ("auto", "always", "never")
+_DEFAULT_RETRIEVAL_MODE = "auto"
+# 앞선 대화를 가리키는 표현: 이름이 있어도 재구성이 필요함
+_ANAPHORA = re.compile(
+    r"(그\s*(?:선수|팀|사람|친구|중)|이\s*(?:선수|팀|사람)|저\s*(?:선수|팀|사람)|그중|걔|쟤|그[는녀것거]|이거|저거|"
+    r"그럼|그러면|그렇다면|아까|방금|앞에서|위에서|나머지|반대로|둘\s*다|두\s*선수|"
+    r"\b(?:he|she|him|her|his|they|them|their|that|those|it)\b)",
+    re.IGNORECASE,
+)
 
 # ANSI 색상 코드 정의 (가독성을 위해)
 YELLOW = "\033[33m"
 RESET = "\033[0m" # 색상 리셋
 
+# 프로세스 전역 리소스 캐시 (모든 Streamlit 세션이 공유)
+_vectorstore_registry = LRURegistry("vectorstore", max_bytes=_VECTORSTORE_MEMORY_BUDGET, sizeof=estimate_vectorstore_bytes)
+_llm_registry = LRURegistry("llm", max_entries=_MAX_CACHED_LLMS)
+_lexical_registry = LRURegistry("lexical", max_entries=_MAX_CACHED_LLMS)
+_shard_registry = LRURegistry("shards", max_entries=_MAX_CACHED_LLMS)
+_answer_cache = AnswerCache(threshold=_ANSWER_CACHE_THRESHOLD, ttl=_ANSWER_CACHE_TTL)
+
+# OpenAI 대신 사용할 임베딩/채팅 모델 (configure_backends로 지정, None이면 OpenAI 사용)
+_embeddings_override = None
+_chat_model_factory = None
+
 # --- 내부 헬퍼 함수 (수정) ---
-def _create_or_load_vectorstore(directory_path, chunk_size, chunk_overlap):
+@functools.lru_cache(maxsize=None)
+def _get_embeddings(embedding_provider=ep.OPENAI):
     """
-    지정된 디렉토리의 모든 CSV 파일에서 데이터를 로드하여
-    FAISS 인덱스를 생성하거나 로드합니다. 인덱스 경로는 설정값에 따라 동적으로 결정됩니다.
+    제공자별 임베딩 객체를 반환합니다 (프로세스당 1개). API 제공자는 디스크 임베딩 캐시로 감싸 인덱스 종류 간
+    벡터를 재사용하고, 로컬 CPU 제공자는 다시 계산하는 편이 빨라 그대로 씁니다.
+    configure_backends의 대역 임베딩은 API 제공자(openai)를 대신합니다.
     """
-    embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+    if not ep.is_remote(embedding_provider):
+        return ep.create(embedding_provider, _EMBEDDING_MODEL)
+    if _embeddings_override is not None:
+        underlying = _embeddings_override
+    else:
+        underlying = ep.create(embedding_provider, _EMBEDDING_MODEL, openai_http.client_kwargs())
+    return CachedEmbeddings(underlying, _EMBEDDING_MODEL, cache_dir=_EMBEDDING_CACHE_DIR)
 
-    index_subdir = f"c{chunk_size}_o{chunk_overlap}"
-    index_path = os.path.join(_FAISS_INDEX_DIR, index_subdir)
-    os.makedirs(_FAISS_INDEX_DIR, exist_ok=True)
 
-    if os.path.exists(index_path):
-        print(f"'{index_subdir}' 설정에 맞는 기존 인덱스 로드: {index_path}")
-        try:
-            return FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
-        except Exception as e:
-            print(f"인덱스 로드 실패 ({e}), 새 인덱스 생성 시도...")
-            shutil.rmtree(index_path, ignore_errors=True)
-            print(f"기존 인덱스 폴더 삭제: {index_path}")
+def _index_path(index_type, embedding_provider):
+    return os.path.join(_FAISS_INDEX_DIR, vi.index_subdir(index_type, embedding_provider))
+
+
+def _load_csv_documents(csv_file):
+    """CSV 파일 하나를 [(행 키, 행 문서)] 목록으로 로드합니다 (csv_documents 참고). 실패 시 빈 목록."""
+    print(f"{YELLOW} - 로딩 중: {os.path.basename(csv_file)}{RESET}")
+    try:
+        documents = csv_documents.load_row_documents(csv_file)
+        if not documents:
+            print(f"   경고: '{os.path.basename(csv_file)}' 파일에서 문서를 로드하지 못했습니다 (파일이 비어있거나 형식이 다를 수 있음).")
+        return documents
+    except Exception as load_e:
+        print(f"   오류: '{os.path.basename(csv_file)}' 파일 로딩 중 오류 발생: {load_e}")
+        return []
+
+
+def _row_documents(file_name, path):
+    """CSV 파일의 {행 키: (행 해시, [행 문서], [문서 ID])}를 반환합니다 (행당 문서 하나)."""
+    return {key: (im.text_sha256(doc.page_content), [doc], im.chunk_ids(file_name, key, 1))
+            for key, doc in _load_csv_documents(path)}
+
+
+def _update_vectorstore(vectorstore, manifest, scanned_files):
+    """
+    매니페스트와 현재 CSV를 비교해 추가/변경된 행만 임베딩하고, 삭제/변경된 행은
+    인덱스와 docstore에서 제거합니다. 변경이 있었으면 True를 반환합니다.
+    """
+    old_files = manifest.get("files", {})
+    stale_ids = []
+    new_docs, new_ids = [], []
+    new_files = {}
+
+    for file_name, info in scanned_files.items():
+        old_info = old_files.get(file_name)
+        if old_info and old_info["sha256"] == info["sha256"]:
+            new_files[file_name] = old_info
+            continue
+        old_rows = old_info["rows"] if old_info else {}
+        rows = _row_documents(file_name, info["path"])
+        file_rows = {}
+        for key, (row_hash, docs, ids) in rows.items():
+            old_row = old_rows.get(key)
+            if old_row and old_row["hash"] == row_hash:
+                file_rows[key] = old_row
+                continue
+            if old_row:
+                stale_ids.extend(old_row["ids"])
+            new_docs.extend(docs)
+            new_ids.extend(ids)
+            file_rows[key] = {"hash": row_hash, "ids": ids}
+        for key, old_row in old_rows.items():
+            if key not in rows:
+                stale_ids.extend(old_row["ids"])
+        new_files[file_name] = {"sha256": info["sha256"], "rows": file_rows}
+
+    for file_name, old_info in old_files.items():
+        if file_name not in scanned_files:
+            print(f"   삭제된 CSV 파일 반영: {file_name}")
+            for old_row in old_info["rows"].values():
+                stale_ids.extend(old_row["ids"])
+
+    manifest["files"] = new_files
+    if not stale_ids and not new_docs:
+        return False
 
-    print(f"'{directory_path}' 폴더 내 CSV 파일에서 새 인덱스 생성 중 (chunk_size={chunk_size}, chunk_overlap={chunk_overlap})...")
+    # 매니페스트와 인덱스가 어긋나 있으면 부분 갱신이 불가능하므로 호출자가 전체 재생성
+    existing_ids = set(vectorstore.index_to_docstore_id.values())
+    if not existing_ids.issuperset(stale_ids):
+        raise ValueError("매니페스트에 기록된 문서 ID가 인덱스에 없습니다.")
+    if existing_ids.difference(stale_ids).intersection(new_ids):
+        raise ValueError("새 문서 ID가 인덱스에 이미 존재합니다.")
+
+    print(f"증분 갱신: 삭제 {len(stale_ids)}개 문서, 추가 {len(new_docs)}개 문서 임베딩")
+    if stale_ids:
+        vectorstore.delete(stale_ids)
+    if new_docs:
+        vectorstore.add_documents(new_docs, ids=new_ids)
+    return True
+
+
+def _files_changed(manifest, scanned_files):
+    """매니페스트 이후 추가/변경/삭제된 CSV 파일이 있는지 확인합니다 (행 단위 비교 전 빠른 검사)."""
+    old_files = manifest.get("files", {})
+    if set(old_files) != set(scanned_files):
+        return True
+    return any(old_files[name]["sha256"] != info["sha256"] for name, info in scanned_files.items())
+
+
+def _create_or_load_vectorstore(directory_path, index_type=vi.DEFAULT_INDEX_TYPE, embedding_provider=None):
+    """
+    지정된 디렉토리의 모든 CSV 파일에서 선수 행마다 문서 하나를 만들어
+    FAISS 인덱스를 생성하거나 로드합니다. 인덱스 경로는 인덱스 종류와 임베딩 제공자에 따라 결정됩니다.
+    인덱스 옆의 매니페스트(파일/행 해시)와 비교해 바뀐 행만 다시 임베딩하며,
+    CSV 컬럼 구성이나 문서 형식(MANIFEST_VERSION)이 바뀐 경우에만 전체를 재생성합니다.
+    index_type(vector_index.INDEX_TYPES)이 학습형이면 생성 시 학습하고, CSV가 바뀌면 다시 학습합니다.
+    바뀐 것이 없으면 인덱스를 메모리 매핑으로 엽니다.
+    """
+    vi.check_index_type(index_type)
+    embedding_provider = ep.resolve(embedding_provider)
+    embeddings = _get_embeddings(embedding_provider)
+
+    index_subdir = vi.index_subdir(index_type, embedding_provider)
+    index_path = os.path.join(_FAISS_INDEX_DIR, index_subdir)
+    os.makedirs(_FAISS_INDEX_DIR, exist_ok=True)
 
     csv_files = glob.glob(os.path.join(directory_path, '*.csv'))
     if not csv_files:
         raise ValueError(f"지정된 디렉토리 '{directory_path}'에서 CSV 파일을 찾을 수 없습니다.")
 
+    scanned_files = im.scan_csv_files(csv_files)
+    schema = im.schema_signature(scanned_files, ep.model_name(embedding_provider, _EMBEDDING_MODEL))
+
+    if os.path.exists(index_path):
+        manifest = im.load_manifest(index_path)
+        if not manifest or manifest.get("schema") != schema:
+            print(f"'{index_subdir}' 인덱스의 매니페스트가 없거나 스키마가 변경되어 전체 재생성합니다.")
+        elif _files_changed(manifest, scanned_files) and index_type not in vi.INCREMENTAL_INDEX_TYPES:
+            print(f"CSV가 변경되어 '{index_subdir}' 인덱스를 다시 학습합니다 (임베딩은 캐시 사용).")
+        else:
+            print(f"'{index_subdir}' 설정에 맞는 기존 인덱스 로드: {index_path}")
+            try:
+                if not _files_changed(manifest, scanned_files):
+                    vectorstore = vi.load_vectorstore(index_path, embeddings, mmap=True)
+                else:
+                    # 메모리 매핑 인덱스는 읽기 전용이므로 증분 갱신은 일반 로드 후 저장하고 다시 매핑
+                    vectorstore = vi.load_vectorstore(index_path, embeddings, mmap=False)
+                    if _update_vectorstore(vectorstore, manifest, scanned_files):
+                        vi.save_vectorstore(vectorstore, index_path)
+                        vectorstore = vi.load_vectorstore(index_path, embeddings, mmap=True)
+                        print(f"증분 갱신된 인덱스 저장 완료: {index_path}")
+                    manifest["embedding_provider"] = embedding_provider
+                    im.save_manifest(index_path, manifest)
+                lexical_index.load_or_build(index_path, vectorstore, stats_engine.TEAM_ALIASES)
+                shard_index.load_or_build(index_path, vectorstore, manifest)
+                return vectorstore
+            except Exception as e:
+                print(f"인덱스 로드/증분 갱신 실패 ({e}), 새 인덱스 생성 시도...")
+        shutil.rmtree(index_path, ignore_errors=True)
+        print(f"기존 인덱스 폴더 삭제: {index_path}")
+
+    print(f"'{directory_path}' 폴더 내 CSV 파일에서 새 인덱스 생성 중 (index_type={index_type}, embedding={embedding_provider})...")
     print(f"발견된 CSV 파일: {len(csv_files)}개")
-    all_documents = []
-    for csv_file in csv_files:
-        # --- 이 부분을 수정하여 노란색으로 출력 ---
-        print(f"{YELLOW} - 로딩 중: {os.path.basename(csv_file)}{RESET}")
-        # ----------------------------------------
-        try:
-            loader = CSVLoader(file_path=csv_file, encoding='utf-8-sig')
-            documents = loader.load()
-            if documents:
-                all_documents.extend(documents)
-            else:
-                print(f"   경고: '{os.path.basename(csv_file)}' 파일에서 문서를 로드하지 못했습니다 (파일이 비어있거나 형식이 다를 수 있음).")
-        except Exception as load_e:
-             print(f"   오류: '{os.path.basename(csv_file)}' 파일 로딩 중 오류 발생: {load_e}")
-             # raise load_e
-
-    if not all_documents:
-        raise ValueError(f"'{directory_path}' 내의 CSV 파일들에서 유효한 문서를 로드하지 못했습니다.")
 
-    print(f"총 {len(all_documents)}개 문서 로드 완료. 텍스트 분할 중...")
+    manifest = {"schema": schema, "embedding_provider": embedding_provider, "files": {}}
+    texts, ids = [], []
+    for file_name, info in scanned_files.items():
+        rows = _row_documents(file_name, info["path"])
+        manifest["files"][file_name] = {
+            "sha256": info["sha256"],
+            "rows": {key: {"hash": row_hash, "ids": doc_ids} for key, (row_hash, _, doc_ids) in rows.items()},
+        }
+        for _, docs, doc_ids in rows.values():
+            texts.extend(docs)
+            ids.extend(doc_ids)
 
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    texts = text_splitter.split_documents(all_documents)
     if not texts:
-         raise ValueError("문서를 청크로 분할하지 못했습니다.")
+        raise ValueError(f"'{directory_path}' 내의 CSV 파일들에서 유효한 문서를 로드하지 못했습니다.")
 
-    print(f"문서 분할 완료 ({len(texts)}개 청크 생성). FAISS 인덱스 생성 중...")
-    vectorstore = FAISS.from_documents(texts, embeddings)
-    vectorstore.save_local(index_path)
+    print(f"행 문서 생성 완료 ({len(texts)}개). FAISS 인덱스 생성 중...")
+    vectorstore = FAISS.from_documents(texts, embeddings, ids=ids)
+    manifest["index_type"] = vi.train_index(vectorstore, index_type)
+    vi.save_vectorstore(vectorstore, index_path)
+    im.save_manifest(index_path, manifest)
+    vectorstore = vi.load_vectorstore(index_path, embeddings, mmap=True)
+    lexical_index.load_or_build(index_path, vectorstore, stats_engine.TEAM_ALIASES)
+    shard_index.load_or_build(index_path, vectorstore, manifest)
     print(f"새 인덱스 저장 완료: {index_path}")
-    print(f"{YELLOW}주의: '{directory_path}' 내의 CSV 파일 내용이 변경되면, '{_FAISS_INDEX_DIR}' 폴더를 직접 삭제해야 변경 사항이 반영된 새 인덱스가 생성됩니다.{RESET}")
     return vectorstore
 
 
+class _StatsAwareRetrievalChain(ConversationalRetrievalChain):
+    """
+    집계/순위 질문은 통계 엔진의 정확한 계산 결과를, 그 외 질문은 벡터 검색 결과를 컨텍스트로 사용합니다.
+    결과의 retrieval_path에 질문 재구성 경로(first_turn / direct / condensed)를 기록합니다.
+    answer_cache_namespace는 답변 캐시와 요청 합치기에서 이 체인의 답변을 구분하는
+    (페르소나, temperature 구간, 데이터 버전, 컨텍스트 예산, 인덱스 종류, 임베딩 제공자, 질문 재구성 방식)입니다.
+    검색 후보는 고정 개수 대신 context_tokens 예산을 채울 때까지만 {context}에 넣습니다 (pack_context).
+    """
+
+    answer_cache_namespace: tuple = ()
+    answer_cache_threshold: float = 1.0
+    context_tokens: int = DEFAULT_CONTEXT_TOKENS
+
+    def _call(self, inputs, run_manager=None):
+        state = {"path": "first_turn"}  # 대화 기록이 없으면 질문 재구성 체인이 호출되지 않음
+        token = _turn_state.set(state)
+        try:
+            output = super()._call(inputs, run_manager=run_manager)
+        finally:
+            _turn_state.reset(token)
+        output["retrieval_path"] = state["path"]
+        tracing.annotate(retrieval_path=state["path"])
+        print(f"검색 경로: {state['path']}")
+        return output
+
+    def _get_docs(self, question, inputs, *, run_manager):
+        with tracing.span("stats_engine") as span_attrs:
+            try:
+                stats_text = stats_engine.answer(_CSV_DIRECTORY_PATH, question)
+            except Exception as e:
+                print(f"통계 엔진 처리 실패, 벡터 검색으로 대체: {e}")
+                stats_text = None
+            span_attrs["hit"] = stats_text is not None
+        if stats_text is not None:
+            print(f"통계 엔진으로 처리: {stats_text.splitlines()[0]}")
+            return [Document(page_content=stats_text, metadata={"source": "stats_engine"})]
+        candidates = super()._get_docs(question, inputs, run_manager=run_manager)
+        with tracing.span("context_pack", candidates=len(candidates), budget=self.context_tokens) as span_attrs:
+            docs, used = pack_context(candidates, self.context_tokens)
+            span_attrs.update(docs=len(docs), tokens=used)
+        tracing.annotate(context_docs=len(docs), context_tokens=used)
+        return docs
+
+
+def pack_context(docs, budget):
+    """
+    검색 순위대로 문서를 넣다가 토큰 예산(budget)을 넘기 직전에 멈춥니다. 같은 ID는 한 번만 넣고,
+    첫 문서는 예산보다 길어도 넣습니다 (빈 컨텍스트 방지). (넣은 문서 목록, 사용한 토큰 수)를 반환합니다.
+    """
+    packed, used, seen = [], 0, set()
+    for doc in docs:
+        key = doc.id or doc.page_content
+        if key in seen:
+            continue
+        tokens = count_tokens(doc.page_content) + (_DOCUMENT_SEPARATOR_TOKENS if packed else 0)
+        if packed and used + tokens > budget:
+            break
+        seen.add(key)
+        packed.append(doc)
+        used += tokens
+    return packed, used
+
+
+# 현재 턴의 검색 경로 기록 (체인 인스턴스는 여러 스레드가 공유하므로 실행 컨텍스트별로 보관)
+_turn_state = contextvars.ContextVar("retrieval_turn_state", default=None)
+# 답변 캐시 조회에서 만든 (질문, 임베딩 객체, 벡터): 같은 질문을 검색할 때 다시 임베딩하지 않음
+_prepared_embedding = contextvars.ContextVar("prepared_query_embedding", default=None)
+
+
+def is_self_contained(question):
+    """질문만으로 검색이 가능한지(선수/팀 이름이 있고 앞선 대화를 가리키는 표현이 없는지) 판단합니다."""
+    return not _ANAPHORA.search(question) and stats_engine.mentions_entity(_CSV_DIRECTORY_PATH, question)
+
+
+class _ConditionalQuestionGenerator(Chain):
+    """
+    ConversationalRetrievalChain의 질문 재구성 체인을 감싸, 필요한 경우에만 LLM을 호출합니다.
+    대화 기록이 있을 때만 호출되며 (첫 턴은 체인이 바로 검색), 선택한 경로를 턴 상태에 기록합니다.
+    """
+
+    llm_chain: Chain
+    retrieval_mode: str = _DEFAULT_RETRIEVAL_MODE
+
+    @property
+    def input_keys(self):
+        return ["question", "chat_history"]
+
+    @property
+    def output_keys(self):
+        return ["text"]
+
+    def _call(self, inputs, run_manager=None):
+        question = inputs["question"]
+        if self.retrieval_mode == "never" or (self.retrieval_mode == "auto" and is_self_contained(question)):
+            path, text = "direct", question
+        else:
+            path = "condensed"
+            result = self.llm_chain.invoke(
+                {"question": question, "chat_history": inputs["chat_history"]},
+                config={"callbacks": run_manager.get_child() if run_manager else None},
+            )
+            text = result[self.llm_chain.output_keys[0]]
+        state = _turn_state.get()
+        if state is not None:
+            state["path"] = path
+        return {"text": text}
+
+
+class _TracedRetriever(VectorStoreRetriever):
+    """질의 임베딩과 FAISS 검색을 나누어 trace span으로 기록하는 검색기."""
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.search_type != "similarity":
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+        return self._dense_search(query, self.search_kwargs.get("k", 4))
+
+    def _embed_query(self, query):
+        """질의 임베딩. 답변 캐시 조회에서 같은 질문을 이미 임베딩했으면 그 벡터를 재사용합니다."""
+        prepared = _prepared_embedding.get()
+        if prepared is not None and prepared[0] == query and prepared[1] is self.vectorstore.embeddings:
+            tracing.annotate(query_embedding="reused")
+            return prepared[2]
+        with tracing.span("embed_query", chars=len(query)):
+            return self.vectorstore.embeddings.embed_query(query)
+
+    def _dense_search(self, query, k):
+        embedding = self._embed_query(query)
+        with tracing.span("faiss_search") as span_attrs:
+            docs = self.vectorstore.similarity_search_by_vector(embedding, **{**self.search_kwargs, "k": k})
+            span_attrs["docs"] = len(docs)
+            span_attrs["context_chars"] = sum(len(doc.page_content) for doc in docs)
+        return docs
+
+
+class _HybridRetriever(_TracedRetriever):
+    """
+    선수 이름이 들어간 질문은 이름 역색인으로 해당 행을 바로 가져오고 (임베딩 API 호출 없음),
+    그 밖의 질문만 밀집 검색을 합니다. 시즌/투타/팀 조건이 있으면 해당 (파일, 팀) 샤드만 검색하고,
+    샤드가 없을 때 팀 이름만 있으면 밀집 검색 후보를 넉넉히 가져와 해당 팀 문서를 RRF로 끌어올립니다.
+    """
+
+    lexical: Any
+    shards: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.search_type != "similarity":
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+        k = self.search_kwargs.get("k", 4)
+        with tracing.span("lexical_search") as span_attrs:
+            match = self.lexical.search(query)
+            span_attrs.update(names=match.names, teams=match.teams, docs=len(match.doc_ids), fuzzy=match.fuzzy)
+        if match.doc_ids:
+            docstore = self.vectorstore.docstore
+            docs = [docstore.search(doc_id) for doc_id in match.doc_ids[:_LEXICAL_MAX_DOCS]]
+            tracing.annotate(retrieval_source="lexical")
+            print(f"이름 역색인으로 검색: {', '.join(match.names)} ({len(docs)}개 행)")
+            return [doc for doc in docs if isinstance(doc, Document)]
+        if self.shards is not None:
+            shard_filter = shard_index.parse_filters(query, match.teams)
+            ranges = self.shards.route(shard_filter)
+            if ranges:
+                tracing.annotate(retrieval_source="shard")
+                print(f"샤드 검색: {shard_filter} -> 구간 {len(ranges)}개")
+                return self._shard_search(query, k, ranges)
+        if not match.teams:
+            tracing.annotate(retrieval_source="dense")
+            return self._dense_search(query, k)
+
+        candidates = self._dense_search(query, k * _HYBRID_FETCH_MULTIPLIER)
+        dense_ranking = [(doc.id or str(i)) for i, doc in enumerate(candidates)]
+        by_id = dict(zip(dense_ranking, candidates))
+        team_ranking = [doc_id for doc_id, doc in by_id.items()
+                        if lexical_index.doc_team(doc_id) in match.teams]
+        fused = lexical_index.reciprocal_rank_fusion([dense_ranking, team_ranking])
+        tracing.annotate(retrieval_source="hybrid")
+        return [by_id[doc_id] for doc_id in fused[:k]]
+
+    def _shard_search(self, query, k, ranges):
+        embedding = self._embed_query(query)
+        with tracing.span("shard_search", ranges=len(ranges)) as span_attrs:
+            doc_ids = self.shards.search(self.vectorstore, embedding, k, ranges)
+            docstore = self.vectorstore.docstore
+            docs = [doc for doc in (docstore.search(doc_id) for doc_id in doc_ids) if isinstance(doc, Document)]
+            span_attrs["vectors"] = sum(end - start for start, end in ranges)
+            span_attrs["docs"] = len(docs)
+        return docs
+
+
+# --- 공유 리소스 접근 함수 ---
+def get_vectorstore(index_type=vi.DEFAULT_INDEX_TYPE, embedding_provider=None):
+    """(인덱스 종류, 임베딩 제공자)별 벡터스토어를 프로세스 전역 캐시에서 가져오거나 로드합니다."""
+    embedding_provider = ep.resolve(embedding_provider)
+    return _vectorstore_registry.get_or_create(
+        (index_type, embedding_provider),
+        lambda: _create_or_load_vectorstore(_CSV_DIRECTORY_PATH, index_type, embedding_provider),
+    )
+
+
+def is_index_cached(index_type=vi.DEFAULT_INDEX_TYPE, embedding_provider=None):
+    """벡터스토어가 이미 프로세스 전역 캐시에 있는지 (로드/생성 없이 확인)."""
+    return _vectorstore_registry.peek((index_type, ep.resolve(embedding_provider))) is not None
+
+
+def get_lexical_index(index_type=vi.DEFAULT_INDEX_TYPE, embedding_provider=None):
+    """벡터스토어와 같은 폴더에 저장된 선수/팀 이름 역색인을 프로세스 전역 캐시에서 가져옵니다."""
+    embedding_provider = ep.resolve(embedding_provider)
+    return _lexical_registry.get_or_create(
+        (index_type, embedding_provider),
+        lambda: lexical_index.load_or_build(
+            _index_path(index_type, embedding_provider),
+            get_vectorstore(index_type, embedding_provider),
+            stats_engine.TEAM_ALIASES,
+        ),
+    )
+
+
+def get_shard_index(index_type=vi.DEFAULT_INDEX_TYPE, embedding_provider=None):
+    """벡터스토어와 같은 폴더에 저장된 (파일, 팀) 샤드를 프로세스 전역 캐시에서 가져옵니다. 없으면 None."""
+    embedding_provider = ep.resolve(embedding_provider)
+    index_path = _index_path(index_type, embedding_provider)
+    return _shard_registry.get_or_create(
+        (index_type, embedding_provider),
+        lambda: shard_index.load_or_build(index_path, get_vectorstore(index_type, embedding_provider),
+                                          im.load_manifest(index_path)),
+    )
+
+
+def _openai_chat_model(**kwargs):
+    from langchain_openai import ChatOpenAI  # 첫 사용 시 임포트
+    return ChatOpenAI(**kwargs, **openai_http.client_kwargs())  # 모든 모델이 HTTP 연결 풀 하나를 공유
+
+
+def get_llm(temperature, streaming=False):
+    """temperature(와 스트리밍 여부)별 ChatOpenAI 클라이언트를 프로세스 전역 캐시에서 가져옵니다."""
+    return _llm_registry.get_or_create(
+        (round(float(temperature), 2), streaming),
+        lambda: (_chat_model_factory or _openai_chat_model)(temperature=temperature, model_name=_LLM_MODEL, streaming=streaming),
+    )
+
+
+def configure_backends(embeddings=None, embedding_model=None, chat_model_factory=None,
+                       csv_directory=None, index_dir=None, embedding_cache_dir=None):
+    """
+    OpenAI 대신 사용할 임베딩 객체/채팅 모델 생성 함수와 데이터·인덱스 경로를 지정합니다 (benchmark.py 등 오프라인 실행용).
+    chat_model_factory는 ChatOpenAI와 같은 키워드(temperature, model_name, streaming)를 받아야 하며,
+    embedding_model은 대역 임베딩을 인덱스 스키마/캐시에서 구분하는 이름입니다. 캐시된 리소스는 모두 비웁니다.
+    이전 설정을 반환하므로 configure_backends(**previous)로 되돌릴 수 있습니다.
+    """
+    global _embeddings_override, _chat_model_factory, _EMBEDDING_MODEL
+    global _CSV_DIRECTORY_PATH, _FAISS_INDEX_DIR, _EMBEDDING_CACHE_DIR
+    previous = {
+        "embeddings": _embeddings_override, "embedding_model": _EMBEDDING_MODEL,
+        "chat_model_factory": _chat_model_factory, "csv_directory": _CSV_DIRECTORY_PATH,
+        "index_dir": _FAISS_INDEX_DIR, "embedding_cache_dir": _EMBEDDING_CACHE_DIR,
+    }
+    _embeddings_override = embeddings
+    _chat_model_factory = chat_model_factory
+    if embedding_model:
+        _EMBEDDING_MODEL = embedding_model
+    if csv_directory:
+        _CSV_DIRECTORY_PATH = csv_directory
+        data_source.set_directory(csv_directory)
+    if index_dir:
+        _FAISS_INDEX_DIR = index_dir
+    if embedding_cache_dir:
+        _EMBEDDING_CACHE_DIR = embedding_cache_dir
+    _get_embeddings.cache_clear()
+    _vectorstore_registry.invalidate()
+    _lexical_registry.invalidate()
+    _shard_registry.invalidate()
+    _llm_registry.invalidate()
+    _answer_cache.invalidate()
+    return previous
+
+
+_KEEP = object()
+
+
+def configure_answer_cache(threshold=_KEEP, ttl=None):
+    """
+    답변 캐시의 유사도 기준/TTL을 바꾸고 이전 설정을 반환합니다 (ttl=0이면 사용 안 함, benchmark.py 등).
+    threshold=None이면 임베딩 제공자별 기준으로 돌아갑니다.
+    """
+    previous = {"threshold": _answer_cache.threshold, "ttl": _answer_cache.ttl}
+    if threshold is not _KEEP:
+        _answer_cache.threshold = threshold
+    if ttl is not None:
+        _answer_cache.ttl = ttl
+    return previous
+
+
+def get_answer_cache_stats():
+    """답변 캐시 항목 수, 적중률, 적중으로 절약한 답변 생성 시간(초)."""
+    return _answer_cache.stats()
+
+
+def attach_answer_audio(entry, audio):
+    """stream_answer가 timings["cache_entry"]로 돌려준 캐시 항목에 합성 음성을 보관합니다."""
+    _answer_cache.attach_audio(entry, audio)
+
+
+def invalidate_vectorstores():
+    """CSV 갱신 후 메모리에 캐시된 벡터스토어와 이름 역색인, 샤드, 답변 캐시를 모두 버립니다 (다음 접근 시 증분 갱신)."""
+    _vectorstore_registry.invalidate()
+    _lexical_registry.invalidate()
+    _shard_registry.invalidate()
+    _answer_cache.invalidate()
+
+
 # --- 공개 인터페이스 함수 (수정) ---
 def initialize_qa_system(character_system_prompt="You are a helpful assistant.",
-                         temperature=0.7, chunk_size=1000, chunk_overlap=100):
+                         temperature=0.7, context_tokens=DEFAULT_CONTEXT_TOKENS, use_memory=True,
+                         retrieval_mode=_DEFAULT_RETRIEVAL_MODE, index_type=vi.DEFAULT_INDEX_TYPE,
+                         embedding_provider=None):
     """
     지정된 폴더의 CSV 데이터와 캐릭터 페르소나, 설정값들을 기반으로 QA 시스템을 초기화합니다.
+    use_memory=False이면 대화 기록 없이 동작하여 여러 스레드가 같은 체인을 공유할 수 있습니다.
+    retrieval_mode는 후속 질문의 재구성 LLM 호출 방식입니다 (_RETRIEVAL_MODES 참고).
+    index_type은 FAISS 인덱스 종류, embedding_provider는 임베딩 제공자입니다 (vector_index.INDEX_TYPES,
+    embedding_providers.PROVIDERS 참고, None이면 기본 제공자).
+    context_tokens는 {context}에 넣을 검색 결과의 토큰 예산입니다 (pack_context 참고).
     """
-    print(f"QA 시스템 초기화 시작 (T={temperature}, C={chunk_size}, O={chunk_overlap})")
+    embedding_provider = embedding_provider or ep.DEFAULT_PROVIDER
+    print(f"QA 시스템 초기화 시작 (T={temperature}, K={context_tokens}, I={index_type}, E={embedding_provider})")
     print(f"페르소나: {character_system_prompt[:100]}...")
 
     try:
         if not os.environ.get("OPENAI_API_KEY") or os.environ.get("OPENAI_API_KEY") == "YOUR_API_KEY_HERE":
              raise ValueError("OpenAI API 키가 설정되지 않았거나 유효하지 않습니다.")
+        if retrieval_mode not in _RETRIEVAL_MODES:
+            raise ValueError(f"알 수 없는 retrieval_mode: {retrieval_mode} (가능한 값: {', '.join(_RETRIEVAL_MODES)})")
 
-        vectorstore = _create_or_load_vectorstore(_CSV_DIRECTORY_PATH, chunk_size, chunk_overlap)
+        vectorstore = get_vectorstore(index_type, embedding_provider)
 
-        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True, output_key='answer')
+        # 최근 턴은 그대로, 오래된 턴은 백그라운드 요약으로 합쳐 대화 기록을 토큰 예산 안으로 유지
+        memory = TokenBudgetMemory(
+            llm=get_llm(0.0), memory_key="chat_history", return_messages=True, output_key='answer',
+            max_token_limit=_MEMORY_TOKEN_LIMIT, keep_last_turns=_MEMORY_KEEP_TURNS,
+        ) if use_memory else None
 
-        llm = ChatOpenAI(temperature=temperature, model_name='gpt-4o-mini')
+        # 답변 LLM만 토큰 스트리밍, 질문 재구성 LLM은 스트리밍하지 않아 답변 토큰만 화면에 흘러나감
+        llm = get_llm(temperature, streaming=True)
+        condense_llm = get_llm(temperature)
 
         _template = f"""
 {character_system_prompt}
@@ -117,14 +625,27 @@ Answer:"""
             template=_template, input_variables=["context", "chat_history", "question"]
         )
 
-        qa_chain = ConversationalRetrievalChain.from_llm(
+        qa_chain = _StatsAwareRetrievalChain.from_llm(
             llm=llm,
-            retriever=vectorstore.as_retriever(),
+            condense_question_llm=condense_llm,
+            retriever=_HybridRetriever(vectorstore=vectorstore, search_kwargs={"k": _CONTEXT_CANDIDATES},
+                                       lexical=get_lexical_index(index_type, embedding_provider),
+                                       shards=get_shard_index(index_type, embedding_provider)),
             memory=memory,
             return_source_documents=False,
             combine_docs_chain_kwargs={"prompt": QA_PROMPT},
             verbose=False
         )
+        qa_chain.context_tokens = context_tokens
+        qa_chain.answer_cache_threshold = ep.cache_threshold(embedding_provider)
+        qa_chain.question_generator = _ConditionalQuestionGenerator(
+            llm_chain=qa_chain.question_generator, retrieval_mode=retrieval_mode
+        )
+        index_path = _index_path(index_type, embedding_provider)
+        qa_chain.answer_cache_namespace = (
+            im.text_sha256(character_system_prompt)[:16], temperature_band(temperature), _data_version(index_path),
+            context_tokens, index_type, embedding_provider, retrieval_mode,
+        )
         print("페르소나 및 설정 적용 QA 시스템 초기화 성공")
         return qa_chain
 
@@ -133,31 +654,220 @@ Answer:"""
         traceback.print_exc()
         return None
 
-# get_answer 함수는 변경 없음
+def _data_version(index_path):
+    """인덱스 매니페스트(스키마 + CSV 파일 해시)로 정한 데이터 버전. CSV가 바뀌면 답변 캐시 네임스페이스도 바뀝니다."""
+    manifest = im.load_manifest(index_path) or {}
+    file_hashes = sorted(info["sha256"] for info in manifest.get("files", {}).values())
+    return im.text_sha256("\n".join([manifest.get("schema", ""), *file_hashes]))[:16]
+
+
+def _lookup_answer_cache(chain, query):
+    """
+    답변 캐시를 조회합니다. 캐시할 수 없는 질문(앞선 대화에 기대는 후속 질문)이면 None,
+    아니면 {"namespace", "embedding", "question", "entry"(적중 시 CacheEntry, 아니면 None)}.
+    검색이 어차피 질의를 임베딩하는 질문(밀집/샤드 검색)만 유사도로 찾고 그 임베딩을 검색에 넘기며,
+    이름 역색인이나 통계 엔진으로 답하는 질문은 임베딩 없이 같은 질문 문자열로만 찾습니다 (embedding=None).
+    """
+    base = getattr(chain, "answer_cache_namespace", ())
+    if not base or not _answer_cache.enabled:
+        return None
+    has_history = chain.memory is not None and bool(chain.memory.chat_memory.messages)
+    if has_history and not is_self_contained(query):
+        return None
+    try:
+        with tracing.span("answer_cache") as span_attrs:
+            # 임베딩이 가까워도 선수/팀/숫자, 투수/타자, 순위 방향(최고/꼴찌)이 다르면 다른 질문이므로 네임스페이스로 분리
+            match = chain.retriever.lexical.search(query)
+            namespace = base + (tuple(sorted(match.names)), tuple(sorted(match.teams)), tuple(_NUMBER.findall(query)),
+                                stats_engine.question_intent(query))
+            embedding = None
+            if not match.doc_ids and not stats_engine.handles(_CSV_DIRECTORY_PATH, query):
+                embedding = chain.retriever.vectorstore.embeddings.embed_query(query)
+            found = _answer_cache.lookup(namespace, embedding, question=query, threshold=chain.answer_cache_threshold)
+            span_attrs.update(hit=found is not None, embedded=embedding is not None)
+    except Exception as e:
+        print(f"답변 캐시 조회 실패 (캐시 없이 진행): {e}")
+        return None
+    tracing.annotate(answer_cache="hit" if found else "miss")
+    if found:
+        entry, similarity = found
+        print(f"답변 캐시 적중: '{entry.question}' (유사도 {similarity:.3f}, 절약 {entry.latency:.2f}s)")
+    return {"namespace": namespace, "embedding": embedding, "question": query, "entry": found[0] if found else None}
+
+
+def _serve_cached(chain, lookup):
+    """캐시된 답변을 반환하고, 대화 기록에도 이번 턴으로 남깁니다."""
+    answer = lookup["entry"].answer
+    remember_turn(chain, lookup["question"], answer)
+    return answer
+
+
+def remember_turn(chain, query, answer):
+    """체인을 거치지 않고 얻은 답변(캐시, 다른 세션과 합친 요청)을 이 체인의 대화 기록에 남깁니다."""
+    if chain.memory is not None:
+        chain.memory.save_context({"question": query}, {"answer": answer})
+
+
+def coalesce_key(chain, query):
+    """
+    동시에 들어온 같은 질문을 한 번만 생성하기 위한 키 (backend_service). 답변 캐시와 같은 기준으로,
+    앞선 대화에 기대는 후속 질문이면 세션마다 답이 다르므로 None.
+    """
+    base = getattr(chain, "answer_cache_namespace", ())
+    if not base:
+        return None
+    has_history = chain.memory is not None and bool(chain.memory.chat_memory.messages)
+    if has_history and not is_self_contained(query):
+        return None
+    return base + (" ".join(query.split()),)
+
+
+def _remember_answer(lookup, result, latency):
+    """캐시 대상 질문의 답변을 저장합니다. 질문 재구성을 거친 답변은 대화 맥락에 기대므로 저장하지 않습니다."""
+    if lookup is None or not result.get("answer") or result.get("retrieval_path") == "condensed":
+        return None
+    return _answer_cache.store(lookup["namespace"], lookup["question"], lookup["embedding"],
+                               _extract_answer(result), latency)
+
+
+def _extract_answer(result):
+    """체인 결과에서 답변 문자열을 꺼냅니다."""
+    answer = result.get("answer", "답변을 찾을 수 없습니다.")
+    if isinstance(answer, dict):
+        answer = answer.get("answer", "답변 형식 오류")
+    return answer.strip() if answer else "빈 답변이 반환되었습니다."
+
+
+def _qa_inputs(chain, query):
+    """체인 입력을 만듭니다. 메모리 없는 체인에는 빈 대화 기록을 직접 넘깁니다."""
+    inputs = {"question": query}
+    if chain.memory is None:
+        inputs["chat_history"] = []
+    return inputs
+
+
+def _qa_config(*callbacks):
+    """현재 trace에 LLM span을 기록하는 콜백을 포함한 체인 실행 설정을 만듭니다."""
+    return {"callbacks": [LangChainSpanHandler(), *callbacks]}
+
+
+def _invoke_chain(chain, query, lookup, config):
+    """체인을 실행합니다. 답변 캐시 조회에서 만든 질의 임베딩이 있으면 검색기가 재사용하도록 넘깁니다."""
+    embedding = lookup["embedding"] if lookup else None
+    if embedding is None:
+        return chain.invoke(_qa_inputs(chain, query), config=config)
+    token = _prepared_embedding.set((query, chain.retriever.vectorstore.embeddings, embedding))
+    try:
+        return chain.invoke(_qa_inputs(chain, query), config=config)
+    finally:
+        _prepared_embedding.reset(token)
+
+
+def run_qa(chain, query):
+    """오류를 문자열로 바꾸지 않고 그대로 올리는 QA 호출 (배치 실행의 재시도 등에 사용). 답변 캐시를 거칩니다."""
+    start = time.perf_counter()
+    lookup = _lookup_answer_cache(chain, query)
+    if lookup and lookup["entry"]:
+        return _serve_cached(chain, lookup)
+    result = _invoke_chain(chain, query, lookup, _qa_config())
+    _remember_answer(lookup, result, time.perf_counter() - start)
+    return _extract_answer(result)
+
+
 def get_answer(chain, query):
     if not chain:
         return "오류: QA 시스템이 준비되지 않았습니다."
     try:
         print(f"QA Chain 호출: Query='{query}'")
-        result = chain.invoke({"question": query})
-        print(f"QA Chain 결과: {result}")
-        answer = result.get("answer", "답변을 찾을 수 없습니다.")
-        if isinstance(answer, dict):
-            answer = answer.get("answer", "답변 형식 오류")
-        return answer.strip() if answer else "빈 답변이 반환되었습니다."
+        answer = run_qa(chain, query)
+        print(f"QA Chain 완료: 답변 {len(answer)}자")
+        return answer
     except Exception as e:
         print(f"답변 생성 중 오류 발생 (get_answer): {e}")
         traceback.print_exc()
         return f"답변 생성 중 오류가 발생했습니다. 잠시 후 다시 시도해 주세요."
 
+
+class _TokenQueueHandler(BaseCallbackHandler):
+    """스트리밍 LLM이 만든 토큰을 큐로 전달하는 콜백."""
+
+    def __init__(self, token_queue):
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.token_queue.put(token)
+
+
+_STREAM_DONE = object()
+
+
+def stream_answer(chain, query, timings=None):
+    """
+    get_answer의 스트리밍 버전. 답변 토큰을 생성되는 대로 yield 합니다.
+    오류/대체 문구는 get_answer와 같으며, timings 딕셔너리를 넘기면
+    첫 토큰까지 걸린 시간(ttft)과 전체 시간(total)을 초 단위로 기록합니다.
+    답변 캐시를 거치며, timings["answer_cache"]에 "hit"/"miss"를, timings["cache_entry"]에
+    캐시 항목(적중했거나 새로 저장된 경우, 음성 보관용 attach_answer_audio에 사용)을 기록합니다.
+    """
+    timings = timings if timings is not None else {}
+    if not chain:
+        yield "오류: QA 시스템이 준비되지 않았습니다."
+        return
+
+    print(f"QA Chain 스트리밍 호출: Query='{query}'")
+    start = time.perf_counter()
+    lookup = _lookup_answer_cache(chain, query)
+    if lookup is not None:
+        timings["answer_cache"] = "hit" if lookup["entry"] else "miss"
+    if lookup and lookup["entry"]:
+        answer = _serve_cached(chain, lookup)
+        timings["cache_entry"] = lookup["entry"]
+        timings["ttft"] = time.perf_counter() - start
+        yield answer
+        timings["total"] = time.perf_counter() - start
+        return
+
+    token_queue = queue.Queue()
+    outcome = {}
+
+    def run_chain():
+        try:
+            outcome["result"] = _invoke_chain(chain, query, lookup, _qa_config(_TokenQueueHandler(token_queue)))
+        except Exception as e:
+            outcome["error"] = e
+            traceback.print_exc()
+        finally:
+            token_queue.put(_STREAM_DONE)
+
+    # 현재 trace가 워커 스레드에서도 보이도록 컨텍스트를 복사해 실행
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(run_chain,), daemon=True)
+    worker.start()
+
+    streamed = False
+    while True:
+        token = token_queue.get()
+        if token is _STREAM_DONE:
+            break
+        if not streamed:
+            timings["ttft"] = time.perf_counter() - start
+            streamed = True
+        yield token
+    worker.join()
+
+    if "error" in outcome:
+        print(f"답변 생성 중 오류 발생 (stream_answer): {outcome['error']}")
+        yield ("\n\n" if streamed else "") + "답변 생성 중 오류가 발생했습니다. 잠시 후 다시 시도해 주세요."
+    elif not streamed:
+        # 토큰 콜백 없이 끝난 경우 (스트리밍 미지원 모델 등) 최종 답변을 한 번에 전달
+        timings["ttft"] = time.perf_counter() - start
+        yield _extract_answer(outcome["result"])
+    timings["total"] = time.perf_counter() - start
+    if "result" in outcome:
+        timings["cache_entry"] = _remember_answer(lookup, outcome["result"], timings["total"])
+    print(f"QA Chain 스트리밍 완료: 첫 토큰 {timings['ttft']:.2f}s, 전체 {timings['total']:.2f}s")
+
 # get_data_source_description 함수 수정
 def get_data_source_description():
-    """데이터 소스 디렉토리에 대한 설명을 반환합니다."""
-    if os.path.isdir(_CSV_DIRECTORY_PATH):
-        try:
-            csv_count = len(glob.glob(os.path.join(_CSV_DIRECTORY_PATH, '*.csv')))
-            return f"'{os.path.basename(_CSV_DIRECTORY_PATH)}' 폴더 내 {csv_count}개 CSV 데이터 기반"
-        except Exception:
-             return f"'{os.path.basename(_CSV_DIRECTORY_PATH)}' 폴더 데이터 기반"
-    else:
-        return "CSV 데이터 폴더 기반 (경로 확인 필요)"
\ No newline at end of file
+    """데이터 소스 디렉토리에 대한 설명을 반환합니다 (data_source.describe)."""
+    return data_source.describe(_CSV_DIRECTORY_PATH)
\ No newline at end of file
@@ -1,8 +1,15 @@
 # SpeakAnswer.py
 
 import os
-from openai import OpenAI, OpenAIError
+import re
+import json
+import hashlib
+import tempfile
+import threading
+import unicodedata
 from tts_styles import get_style_params, get_default_style_name
+import tracing
+import openai_http
 # import streamlit as st # st를 사용하지 않는다면 이 import도 제거 가능
 
 # --- 이 부분을 삭제하세요 ---
@@ -14,12 +21,144 @@ from tts_styles import get_style_params, get_default_style_name
 # )                     # <--- 삭제 끝
 # -------------------------
 
+# --- 설정 ---
+_TTS_MODEL = "tts-1-hd"
+_TTS_FORMAT = "mp3"
+_TTS_CACHE_DIR = "tts_cache"
+_TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 디스크 오디오 캐시 최대 크기 (약 256MB)
+
+
+class _AudioCache:
+    """
+    (정규화된 텍스트, 목소리, 모델, 포맷) 해시를 파일 이름으로 쓰는 디스크 오디오 캐시.
+    임시 파일에 쓴 뒤 os.replace로 교체하므로 여러 Streamlit 세션이 동시에 써도 안전하며,
+    용량을 넘으면 가장 오래 사용되지 않은(mtime 기준) 파일부터 지웁니다.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._approx_bytes = None  # 첫 저장 시 디렉토리를 스캔해 초기화
+
+    @staticmethod
+    def key(text, voice, model, response_format):
+        payload = json.dumps([text, voice, model, response_format], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key, response_format):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{response_format}")
+
+    def get(self, key, response_format):
+        path = self._path(key, response_format)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # LRU 순서 갱신
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, response_format, data):
+        path = self._path(key, response_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tts-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_total()
+            else:
+                self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith(".tts-"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """용량의 90% 이하가 될 때까지 오래된 파일부터 삭제합니다."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._approx_bytes = total
+
+
+_audio_cache = _AudioCache(_TTS_CACHE_DIR, _TTS_CACHE_MAX_BYTES)
+_client = None
+_client_lock = threading.Lock()
 
-def generate_tts_bytes(text, style_name=None):
-    """텍스트를 음성으로 변환하여 bytes 객체로 반환합니다."""
-    # ... (나머지 함수 코드는 그대로 유지) ...
-    client = OpenAI() # API 키는 환경 변수에서 자동으로 로드됨
 
+def _get_client():
+    """프로세스 전체에서 공유하는 OpenAI 클라이언트 (채팅/임베딩과 같은 HTTP 연결 풀, openai_http 참고)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI  # 첫 합성 때 임포트 (앱 시작을 늦추지 않도록)
+            _client = OpenAI(**openai_http.client_kwargs()) # API 키는 환경 변수에서 자동으로 로드됨
+        return _client
+
+
+def configure_backend(client=None, cache_dir=None):
+    """
+    TTS 클라이언트와 오디오 캐시 폴더를 교체합니다 (benchmark.py의 오프라인 대역용).
+    client는 OpenAI 클라이언트처럼 audio.speech.create(...)를 제공해야 하며, None이면 다음 호출 때 OpenAI 클라이언트를 만듭니다.
+    """
+    global _client, _audio_cache
+    with _client_lock:
+        _client = client
+    if cache_dir:
+        _audio_cache = _AudioCache(cache_dir, _TTS_CACHE_MAX_BYTES)
+
+
+def _normalize_text(text):
+    """캐시 키가 공백/유니코드 표기 차이에 흔들리지 않도록 텍스트를 정규화합니다."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def get_tts_cache_stats():
+    """TTS 오디오 캐시 적중/미스 통계를 반환합니다."""
+    return _audio_cache.stats()
+
+
+def generate_tts_bytes(text, style_name=None):
+    """텍스트를 음성으로 변환하여 bytes 객체로 반환합니다. 같은 텍스트/목소리는 디스크 캐시에서 재사용합니다."""
     if not style_name:
         style_name = get_default_style_name() # 스타일 이름이 없으면 기본값 사용
 
@@ -30,20 +169,42 @@ def generate_tts_bytes(text, style_name=None):
          # 대체 목소리 설정 또는 오류 반환
          tts_params = {"voice": "alloy"} # 안전한 기본값
 
+    text = _normalize_text(text)
+    with tracing.span("tts_synthesize", chars=len(text), voice=tts_params["voice"]) as span_attrs:
+        audio_bytes = _synthesize(text, tts_params["voice"], span_attrs)
+        span_attrs["bytes"] = len(audio_bytes) if audio_bytes else 0
+    return audio_bytes
+
+
+def _synthesize(text, voice, span_attrs):
+    """캐시를 먼저 확인하고, 없으면 TTS API를 호출해 결과를 캐시에 저장합니다."""
+    cache_key = _AudioCache.key(text, voice, _TTS_MODEL, _TTS_FORMAT)
+    cached = _audio_cache.get(cache_key, _TTS_FORMAT)
+    span_attrs["cache_hit"] = bool(cached)
+    if cached:
+        return cached
+
     try:
-        response = client.audio.speech.create(
-            model="tts-1-hd",          # 또는 "tts-1-hd"
-            voice=tts_params["voice"], # tts_styles에서 얻은 목소리 사용
+        response = _get_client().audio.speech.create(
+            model=_TTS_MODEL,          # 또는 "tts-1"
+            voice=voice,               # tts_styles에서 얻은 목소리 사용
             input=text,
-            # 필요한 경우 speed, response_format 등 다른 파라미터 추가
+            response_format=_TTS_FORMAT,
         )
         # 오디오 데이터를 bytes로 반환
         audio_bytes = response.read()
+        if audio_bytes:
+            try:
+                _audio_cache.put(cache_key, _TTS_FORMAT, audio_bytes)
+            except OSError as cache_e:
+                print(f"TTS 캐시 저장 실패 (무시): {cache_e}")
         return audio_bytes
 
-    except OpenAIError as e:
-        print(f"OpenAI TTS API 오류: {e}")
-        return None
     except Exception as e:
-        print(f"TTS 생성 중 예상치 못한 오류: {e}")
-        return None
\ No newline at end of file
+        # openai 패키지를 오류 분류만을 위해 임포트하지 않도록 예외 모듈로 구분
+        if type(e).__module__.startswith("openai"):
+            print(f"OpenAI TTS API 오류: {e}")
+        else:
+            print(f"TTS 생성 중 예상치 못한 오류: {e}")
+        span_attrs["error"] = type(e).__name__
+        return None
@@ -0,0 +1,174 @@
+# answer_cache.py (비슷한 질문의 답변을 재사용하는 의미 기반 답변 캐시: 질의 임베딩 유사도 + TTL)
+#
+# 캐시는 (페르소나, temperature 구간, 데이터 버전, 질문 속 선수/팀/숫자) 네임스페이스로 나뉘고,
+# 같은 네임스페이스 안에서 질의 임베딩의 코사인 유사도가 threshold 이상인 답변을 돌려줍니다.
+# "문보경 타율?"과 "박동원 타율?"처럼 임베딩이 가까워도 대상이 다른 질문이 섞이지 않도록
+# 선수/팀/숫자는 유사도가 아니라 네임스페이스로 구분합니다. 합성한 음성도 답변 옆에 보관할 수 있습니다.
+# 임베딩 없이 저장/조회하면(검색에 임베딩이 필요 없는 질문) 정규화한 질문 문자열이 같을 때만 적중합니다.
+import re
+import time
+import bisect
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+_DEFAULT_TTL = 6 * 3600  # 초 (0 이하이면 캐시 사용 안 함)
+_DEFAULT_MAX_ENTRIES = 2000
+_DEFAULT_MAX_AUDIO_BYTES = 128 * 1024 * 1024  # 메모리에 보관할 음성 총량 (약 128MB)
+_TEMPERATURE_BANDS = (0.3, 0.7)  # temperature를 낮음/보통/높음 구간으로 나누는 경계
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.~]+$")
+
+
+def normalize_question(question):
+    """정확 일치 키용 질문 정규화 (대소문자, 공백 연속, 끝 문장부호 무시)."""
+    return _TRAILING_PUNCTUATION.sub("", " ".join(question.lower().split()))
+
+
+def temperature_band(temperature):
+    """temperature가 속한 구간 번호 (같은 구간의 체인끼리 답변을 공유)."""
+    return bisect.bisect_right(_TEMPERATURE_BANDS, round(float(temperature), 2))
+
+
+class CacheEntry:
+    """캐시된 답변 하나. vector는 임베딩 없이 저장했으면 None, audio는 합성이 끝난 뒤 attach_audio로 채워집니다."""
+
+    def __init__(self, entry_id, namespace, question, vector, answer, latency):
+        self.entry_id = entry_id
+        self.namespace = namespace
+        self.question = question
+        self.key = normalize_question(question)
+        self.vector = vector
+        self.answer = answer
+        self.latency = latency  # 원래 답변 생성에 걸린 시간 (초)
+        self.audio = None
+        self.created = time.monotonic()
+        self.hits = 0
+
+
+class AnswerCache:
+    """
+    프로세스 전역 의미 기반 답변 캐시 (스레드 안전). 전체 항목 수는 max_entries, 음성은 max_audio_bytes로
+    제한하며 가장 오래 쓰이지 않은 것부터 버립니다. ttl이 지난 항목은 조회 시 무시되고 저장 시 정리됩니다.
+    threshold(코사인 유사도, 1.0이면 같은 질문만)를 정하면 lookup에 넘긴 임베딩 제공자별 기준 대신 항상 이 값을 씁니다.
+    """
+
+    def __init__(self, threshold=None, ttl=_DEFAULT_TTL, max_entries=_DEFAULT_MAX_ENTRIES,
+                 max_audio_bytes=_DEFAULT_MAX_AUDIO_BYTES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_audio_bytes = max_audio_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # entry_id -> CacheEntry (LRU 순서)
+        self._namespaces = {}  # 네임스페이스 -> {entry_id: CacheEntry}
+        self._ids = itertools.count()
+        self._audio_bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and (self.threshold is None or self.threshold <= 1.0)
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry, now):
+        return now - entry.created > self.ttl
+
+    def lookup(self, namespace, embedding, question=None, threshold=1.0):
+        """
+        가장 비슷한 유효 항목이 기준(self.threshold, 없으면 threshold) 이상이면 (CacheEntry, 유사도), 아니면 None.
+        embedding이 None이면 정규화한 question이 같은 항목만 찾습니다 (유사도 1.0).
+        """
+        if not self.enabled:
+            return None
+        query = self._unit(embedding) if embedding is not None else None
+        key = normalize_question(question) if question is not None else None
+        now = time.monotonic()
+        with self._lock:
+            self.lookups += 1
+            candidates = [entry for entry in self._namespaces.get(namespace, {}).values() if not self._expired(entry, now)]
+            exact = [entry for entry in candidates if key is not None and entry.key == key]
+            if exact:
+                entry, similarity = exact[-1], 1.0
+            else:
+                candidates = [entry for entry in candidates if entry.vector is not None]
+                if query is None or not candidates:
+                    return None
+                similarities = np.stack([entry.vector for entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] < (self.threshold if self.threshold is not None else threshold):
+                    return None
+                entry, similarity = candidates[best], float(similarities[best])
+            entry.hits += 1
+            self.hits += 1
+            self.saved_seconds += entry.latency
+            self._entries.move_to_end(entry.entry_id)
+            return entry, similarity
+
+    def store(self, namespace, question, embedding, answer, latency):
+        """답변을 저장하고 CacheEntry를 반환합니다 (음성은 나중에 attach_audio로). embedding은 None이어도 됩니다."""
+        if not self.enabled:
+            return None
+        vector = self._unit(embedding) if embedding is not None else None
+        entry = CacheEntry(next(self._ids), namespace, question, vector, answer, latency)
+        now = time.monotonic()
+        with self._lock:
+            for expired in [e for e in self._entries.values() if self._expired(e, now)]:
+                self._remove(expired)
+            self._entries[entry.entry_id] = entry
+            self._namespaces.setdefault(namespace, {})[entry.entry_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries.values())))
+        return entry
+
+    def attach_audio(self, entry, audio):
+        """답변의 합성 음성을 함께 보관합니다. 음성 총량을 넘으면 오래 쓰이지 않은 항목의 음성부터 버립니다."""
+        if entry is None or not audio:
+            return
+        with self._lock:
+            if entry.entry_id not in self._entries:
+                return
+            self._audio_bytes += len(audio) - len(entry.audio or b"")
+            entry.audio = audio
+            for other in list(self._entries.values()):
+                if self._audio_bytes <= self.max_audio_bytes:
+                    break
+                if other.audio is not None and other is not entry:
+                    self._audio_bytes -= len(other.audio)
+                    other.audio = None
+
+    def _remove(self, entry):
+        self._entries.pop(entry.entry_id, None)
+        bucket = self._namespaces.get(entry.namespace)
+        if bucket is not None:
+            bucket.pop(entry.entry_id, None)
+            if not bucket:
+                del self._namespaces[entry.namespace]
+        if entry.audio is not None:
+            self._audio_bytes -= len(entry.audio)
+
+    def invalidate(self):
+        """모든 항목을 버립니다 (CSV 인덱스가 다시 만들어졌을 때)."""
+        with self._lock:
+            self._entries.clear()
+            self._namespaces.clear()
+            self._audio_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "audio_bytes": self._audio_bytes,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 2),
+            }
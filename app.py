@@ -3,9 +3,13 @@
 import streamlit as st
 import os
 import io
+import sys
+import copy
+import uuid
 import time
+import itertools
 import traceback # 오류 로깅용
-from openai import OpenAI
+_script_start = time.perf_counter() # 재실행 렌더링 시간 측정용
 # --- 페이지 설정 (가장 먼저!) ---
 st.set_page_config(
     page_title="멀티 페르소나 야구 챗봇",
@@ -15,12 +19,29 @@ st.set_page_config(
 )
 
 # --- 필수 사용자 정의 모듈 임포트 ---
+# GetAnswer/SpeakAnswer(LangChain, OpenAI 스택, 임포트만 수 초)는 첫 화면을 그린 뒤 필요할 때 load_backend()로 임포트하고,
+# 서버 시작 시 예열 스레드(prewarm.py)가 미리 임포트/인덱스 로드를 해 둡니다.
 try:
-    import GetAnswer as ga
-    from SpeakAnswer import generate_tts_bytes
+    from tts_pipeline import TTSPipeline
+    from characters import CHARACTERS as BASE_CHARACTERS
+    from pronunciation import normalize_for_tts # TTS 약어 발음 변환 (pronunciation_lexicon.tsv)
+    import tracing # 턴별 단계 소요 시간 기록 (traces.jsonl)
+    import prewarm
+    from chain_builder import ChainBuilder, ChainSlot # 설정 변경 시 체인을 백그라운드에서 재생성
+    from session_store import AudioStore, ChatHistory # 음성 블롭/대화 기록을 세션 상태 밖(디스크)에 보관
+    import embedding_providers # 임베딩 제공자 이름/기본값 (무거운 임포트 없음)
+    import data_source # CSV 폴더 경로/설명 (GetAnswer 임포트 없이 데이터 봇 설명 표시)
+    import backend_service # 답변/TTS 호출을 모든 세션이 공유하는 비동기 서비스로 (입장 제어, 중복 요청 합치기)
 except ImportError as e:
     st.error(f"필수 모듈 임포트 오류: {e}")
     st.stop()
+_imports_done = time.perf_counter()
+
+
+def load_backend():
+    """GetAnswer 모듈을 반환합니다. 예열 스레드가 이미 임포트했으면 바로, 임포트 중이면 끝날 때까지 기다립니다."""
+    import GetAnswer
+    return GetAnswer
 
 # --- OpenAI API 키 설정 ---
 try:
@@ -37,50 +58,67 @@ if not api_key_valid:
      st.warning("⚠️ OpenAI API 키가 유효하지 않아 RAG 및 TTS 기능이 비활성화됩니다.")
 
 
-# --- 캐릭터 정보 정의 ---
-CHARACTERS = {
-     "친절한 비서": {
-         "avatar": "😊",
-         "description": "항상 친절하고 상세하게 답변 (CSV 기반)",
-         "system_prompt": "You are a very kind, polite, and helpful assistant providing answers based on the provided CSV data context. Always answer in Korean.",
-         "voice": "nova"
-     },
-     "야구봇 (기본)": {
-         "avatar": "⚾",
-         "description": f"{ga.get_data_source_description() if api_key_valid else '데이터 기반 야구 질문 답변 (키 필요)'}",
-         "system_prompt": "You are a helpful assistant providing answers based on the provided CSV data context. Answer factually based on the data. If the information is not in the context, say so. Respond in Korean.",
-         "voice": "alloy"
-     },
-     "시니컬한 친구": {
-         "avatar": "😏",
-         "description": "모든 것을 약간 삐딱하지만 재치있게 답변 (CSV 기반)",
-         "system_prompt": "You are a cynical friend who answers questions based on the provided CSV data context with sarcasm and wit, but is ultimately helpful in your own way. If the information is not in the context, mock the user for asking about something not present. Respond in Korean.",
-         "voice": "echo"
-     },
-     "전문 분석가": {
-          "avatar": "👩‍💼",
-          "description": "데이터에 기반하여 전문가적으로 분석 (CSV 기반)",
-          "system_prompt": "You are a professional data analyst. Provide answers based strictly on the provided CSV data context. Use formal language and provide insights where possible based on the data. If the information is not in the context, state that clearly. Respond in Korean.",
-          "voice": "shimmer"
-     },
-        "열정적인 해설가": {
-        "avatar": "🗣️",
-        "description": "생생한 중계처럼 흥미진진하게 해설 (실시간 경기 또는 하이라이트 기반)",
-        "system_prompt": "You are a passionate baseball commentator. Describe the situation vividly, as if you are broadcasting live. Use energetic and engaging language. Focus on the excitement and key moments. Respond in Korean.",
-        "voice": "alloy"
-    },
-    "유쾌한 야구 팬": {
-        "avatar": "🍻",
-        "description": "재미있는 입담으로 야구 이야기를 풀어내는 팬 (일반적인 야구 상식 기반)",
-        "system_prompt": "You are an enthusiastic baseball fan. Share your thoughts and opinions on baseball in a fun and engaging way. Use casual language and inject humor where appropriate. Respond in Korean.",
-        "voice": "onyx"
-    },
-    "레알 진상 아저씨": {
-        "avatar": "😠",
-        "description": "8, 90년대 야구에 대한 강한 불만과 함께 짜증 섞인 말투를 사용하는 아저씨 (과거 부정적인 야구 경험 및 불만 기반)",
-        "system_prompt": "You are a grumpy and highly critical baseball fan from the 80s and 90s. Express strong dissatisfaction with current baseball compared to the past, using a nagging and irritable tone. Complain about everything from player skills to game rules, often exaggerating and being unreasonable. Use informal, rough, and often negative language. Respond in Korean.",
-        "voice": "capsule"
-    },
+# --- 서버 시작 시 백그라운드 예열 (프로세스당 한 번, 모든 세션 공유) ---
+@st.cache_resource(show_spinner=False)
+def start_prewarm():
+    return prewarm.start()
+
+warmup = start_prewarm() if api_key_valid else None
+
+
+@st.cache_resource(show_spinner=False)
+def get_audio_store():
+    """프로세스 전역 음성 블롭 저장소 (세션 상태에는 audio_id만 보관)."""
+    return AudioStore()
+
+audio_store = get_audio_store()
+
+
+def _prepare_index(index_type, embedding_provider):
+    ga = load_backend()
+    ga.get_vectorstore(index_type, embedding_provider)
+    ga.get_lexical_index(index_type, embedding_provider)
+    ga.get_shard_index(index_type, embedding_provider)
+
+
+@st.cache_resource(show_spinner=False)
+def get_chain_builder():
+    """프로세스 전역 체인 재생성 큐 (인덱스 준비는 세션 간 공유)."""
+    return ChainBuilder(
+        prepare_index=_prepare_index,
+        create_chain=lambda config: load_backend().initialize_qa_system(**config),
+        is_index_ready=lambda index_type, embedding_provider: (
+            "GetAnswer" in sys.modules and load_backend().is_index_cached(index_type, embedding_provider)),
+    )
+
+chain_builder = get_chain_builder()
+service = backend_service.get_service() # 프로세스 전역 (세션은 요청만 넘기는 얇은 클라이언트)
+HISTORY_PAGE = 20 # 채팅 화면에 한 번에 그리는 메시지 수 ("이전 대화 더 보기"마다 이만큼 더)
+
+
+# --- 캐릭터 정보 정의 (characters.py) ---
+DATA_BOT_NAME = "야구봇 (기본)"
+CHARACTERS = copy.deepcopy(BASE_CHARACTERS)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def data_source_description():
+    """데이터 봇 설명 (CSV 폴더 스캔). GetAnswer를 기다리지 않고, 재실행마다 폴더를 훑지 않도록 잠시 캐시합니다."""
+    return data_source.describe()
+
+# 설정 컬럼의 단계별 소요 시간 표시 이름
+_SPAN_LABELS = {
+    "condense_llm": "질문 재구성 LLM",
+    "stats_engine": "통계 엔진",
+    "embed_query": "질의 임베딩",
+    "answer_cache": "답변 캐시 조회",
+    "faiss_search": "FAISS 검색",
+    "lexical_search": "이름 역색인",
+    "shard_search": "샤드 검색",
+    "answer_llm": "답변 LLM",
+    "tts_normalize": "TTS 발음 변환",
+    "tts_synthesize": "TTS 합성",
+    "rerun_render": "화면 렌더링",
 }
 
 # --- CSS 주입 (카카오톡 스타일 적용 - 원본 기반) ---
@@ -114,68 +152,63 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# --- 핵심 기능 초기화 ---
-llm_client = None
-if api_key_valid:
-    try:
-        if "llm_client" not in st.session_state:
-            st.session_state.llm_client = OpenAI(api_key=OPENAI_API_KEY)
-        llm_client = st.session_state.llm_client
-    except Exception as e:
-        st.error(f"OpenAI 클라이언트 초기화 실패: {e}")
-        api_key_valid = False
-
-# --- RAG 체인 재생성 함수 ---
-def recreate_active_chain():
-    # ... (이전과 동일) ...
-    if not api_key_valid:
-        st.warning("API 키가 유효하지 않아 RAG 체인을 생성할 수 없습니다.")
-        st.session_state.active_chain = None
+# --- RAG 체인 설정 ---
+def chain_config():
+    """현재 캐릭터와 설정 값으로 만든 initialize_qa_system 인자."""
+    state = st.session_state
+    return {
+        "character_system_prompt": CHARACTERS[state.selected_character]["system_prompt"],
+        "temperature": state.temperature,
+        "context_tokens": state.context_tokens,
+        "retrieval_mode": state.retrieval_mode,
+        "index_type": state.index_type,
+        "embedding_provider": state.embedding_provider,
+    }
+
+
+def sync_active_chain():
+    """
+    원하는 설정이 바뀌었으면 백그라운드 재생성을 요청합니다 (스크립트 스레드는 기다리지 않음).
+    설정만 바뀌면 새 체인이 준비될 때까지 이전 체인으로 답하고, 캐릭터가 바뀌면 이전 체인을 바로 내려놓습니다.
+    """
+    slot = st.session_state.chain_slot
+    if not api_key_valid or not st.session_state.selected_character:
+        if slot.wanted is not None:
+            chain_builder.request(slot, None, replace=True)
         return
-    if st.session_state.selected_character:
-        selected_name = st.session_state.selected_character
-        selected_details = CHARACTERS[selected_name]
-        char_prompt = selected_details["system_prompt"]
-        temp = st.session_state.temperature
-        c_size = st.session_state.chunk_size
-        c_overlap = st.session_state.chunk_overlap
-        status_placeholder = st.empty()
-        status_placeholder.info(f"{selected_name} 대화 준비 중 (T={temp}, C={c_size}, O={c_overlap})... 인덱스 생성 시 시간이 걸릴 수 있습니다.")
-        try:
-            st.session_state.active_chain = ga.initialize_qa_system(
-                character_system_prompt=char_prompt, temperature=temp, chunk_size=c_size, chunk_overlap=c_overlap
-            )
-            if not st.session_state.active_chain:
-                 status_placeholder.error(f"{selected_name} RAG 체인 생성 실패. 터미널 로그를 확인하세요.")
-            else:
-                 status_placeholder.empty()
-                 print(f"Active chain recreated for {selected_name} with settings T={temp}, C={c_size}, O={c_overlap}")
-        except Exception as chain_e:
-            status_placeholder.error(f"체인 생성 중 오류: {chain_e}")
-            print(f"!!! Chain recreation error: {chain_e}")
-            traceback.print_exc()
-            st.session_state.active_chain = None
-    else:
-         print("캐릭터가 선택되지 않아 체인을 재생성하지 않습니다.")
-         st.session_state.active_chain = None
+    config = chain_config()
+    if config == slot.wanted:
+        return
+    persona_changed = slot.wanted is None or slot.wanted["character_system_prompt"] != config["character_system_prompt"]
+    chain_builder.request(slot, config, replace=persona_changed, debounce=0 if persona_changed else None)
+    print(f"체인 재생성 요청: {st.session_state.selected_character} (T={config['temperature']}, "
+          f"K={config['context_tokens']}, I={config['index_type']}, E={config['embedding_provider']})")
 
 
 # --- 세션 상태 초기화 ---
 # ... (이전과 동일) ...
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if "chat_histories" not in st.session_state:
-    st.session_state.chat_histories = {name: [] for name in CHARACTERS}
+    st.session_state.chat_histories = {
+        name: ChatHistory(audio_store.history_path(st.session_state.session_id, name),
+                          store=audio_store, session_id=st.session_state.session_id) for name in CHARACTERS
+    }
+if "history_window" not in st.session_state:
+    st.session_state.history_window = {} # 캐릭터별 화면에 그릴 최근 메시지 수
 if "selected_character" not in st.session_state:
     st.session_state.selected_character = None
-if "active_chain" not in st.session_state:
-     st.session_state.active_chain = None
+if "chain_slot" not in st.session_state:
+     st.session_state.chain_slot = ChainSlot() # 활성 체인 + 백그라운드 재생성 상태
 if "autoplay_next_audio" not in st.session_state:
      st.session_state.autoplay_next_audio = False
 default_temp = 0.7
-default_chunk_size = 1000
-default_chunk_overlap = 100
+default_context_tokens = 600 # GetAnswer.DEFAULT_CONTEXT_TOKENS (GetAnswer는 첫 화면 후에 임포트)
 if "temperature" not in st.session_state: st.session_state.temperature = default_temp
-if "chunk_size" not in st.session_state: st.session_state.chunk_size = default_chunk_size
-if "chunk_overlap" not in st.session_state: st.session_state.chunk_overlap = default_chunk_overlap
+if "context_tokens" not in st.session_state: st.session_state.context_tokens = default_context_tokens
+if "retrieval_mode" not in st.session_state: st.session_state.retrieval_mode = "auto"
+if "index_type" not in st.session_state: st.session_state.index_type = "flat"
+if "embedding_provider" not in st.session_state: st.session_state.embedding_provider = embedding_providers.DEFAULT_PROVIDER
 
 
 # --- 3단 레이아웃 정의 ---
@@ -189,22 +222,42 @@ with col_config:
     st.session_state.temperature = st.slider(
         "Temperature (답변 다양성)", 0.0, 1.0, st.session_state.temperature, 0.05, key="temp_slider",
         help="RAG 답변 생성 시 LLM의 다양성을 조절합니다. 높을수록 창의적이지만 부정확할 수 있습니다.",
-        on_change=recreate_active_chain, disabled=settings_disabled
+        disabled=settings_disabled
     )
     st.markdown("---")
     st.subheader("RAG 설정")
-    st.session_state.chunk_size = st.slider(
-        "Chunk Size (청크 크기)", 100, 2000, st.session_state.chunk_size, 50, key="chunk_size_slider",
-        help="문서를 나눌 기준 크기(글자 수). 변경 시 데이터 재처리가 필요할 수 있습니다.",
-        on_change=recreate_active_chain, disabled=settings_disabled
+    st.session_state.context_tokens = st.slider(
+        "Context 예산 (토큰)", 200, 3000, st.session_state.context_tokens, 100, key="context_tokens_slider",
+        help="검색된 선수 기록을 프롬프트에 넣을 최대 토큰 수. 선수 한 명(행)이 문서 하나이며, 순위대로 예산을 채울 때까지 넣습니다. 인덱스 재생성은 필요 없습니다.",
+        disabled=settings_disabled
+    )
+    index_type_labels = {"flat": "Flat (정확)", "sq8": "SQ8 (8비트 양자화)", "ivf": "IVF (클러스터)",
+                         "hnsw": "HNSW (그래프)", "pq": "IVF-PQ (최소 용량)"}
+    st.session_state.index_type = st.selectbox(
+        "인덱스 종류", list(index_type_labels), index=list(index_type_labels).index(st.session_state.index_type),
+        format_func=index_type_labels.get, key="index_type_select",
+        help="벡터 검색 인덱스 종류입니다. Flat 외에는 생성 시 학습하며 용량/속도 대신 재현율이 조금 떨어질 수 있습니다 (benchmark.py로 비교).",
+        disabled=settings_disabled
+    )
+    provider_labels = embedding_providers.LABELS
+    st.session_state.embedding_provider = st.selectbox(
+        "임베딩", list(provider_labels), index=list(provider_labels).index(st.session_state.embedding_provider),
+        format_func=provider_labels.get, key="embedding_provider_select",
+        help="검색 인덱스를 만들고 질문을 벡터로 바꿀 임베딩입니다. 로컬 CPU(n-gram 해시)는 질문마다 API를 호출하지 않아 빠르고 오프라인에서도 동작합니다. 제공자마다 인덱스를 따로 만듭니다.",
+        disabled=settings_disabled
     )
-    max_overlap = st.session_state.chunk_size - 50 if st.session_state.chunk_size > 100 else 50
-    st.session_state.chunk_overlap = st.slider(
-        "Chunk Overlap (청크 중첩)", 0, max_overlap, min(st.session_state.chunk_overlap, max_overlap), 10, key="chunk_overlap_slider",
-        help="나눠진 청크끼리 겹치는 글자 수. 검색 정확도에 영향을 줄 수 있습니다. 변경 시 데이터 재처리가 필요할 수 있습니다.",
-        on_change=recreate_active_chain, disabled=settings_disabled
+    st.caption("설정을 바꾸면 백그라운드에서 체인을 다시 준비하며, 준비될 때까지 이전 설정으로 답변합니다.")
+    retrieval_mode_labels = {"auto": "자동 (필요할 때만)", "always": "항상", "never": "사용 안 함"}
+    st.session_state.retrieval_mode = st.radio(
+        "후속 질문 재구성", list(retrieval_mode_labels), index=list(retrieval_mode_labels).index(st.session_state.retrieval_mode),
+        format_func=retrieval_mode_labels.get, key="retrieval_mode_radio", horizontal=True,
+        help="이전 대화를 참고해 질문을 다시 쓰는 LLM 호출 방식입니다. '자동'은 선수/팀 이름이 있고 '그 선수' 같은 지시어가 없는 질문은 바로 검색합니다.",
+        disabled=settings_disabled
     )
-    st.caption("Chunk Size 또는 Overlap 변경 시, 해당 설정에 맞는 데이터 인덱스를 처음 로드할 때 시간이 소요될 수 있습니다.")
+    build_status = st.container() # 체인 재생성 진행률 (캐릭터 선택 반영 후 채움)
+    timing_placeholder = st.empty() # 최근 턴의 단계별 소요 시간 (스크립트 끝에서 채움)
+    if warmup is not None and warmup.summary():
+        st.caption(warmup.summary())
 
 
 # --- 컬럼 2: 캐릭터 목록 ---
@@ -218,16 +271,42 @@ with col_list:
             if st.session_state.selected_character != name:
                  st.session_state.selected_character = name
                  st.session_state.autoplay_next_audio = False
-                 recreate_active_chain()
                  st.rerun()
         if is_disabled: st.caption("(API 키 필요)")
 
 
+# --- 체인 재생성 요청과 진행률 표시 (진행 중일 때만 조각을 주기적으로 다시 그림) ---
+sync_active_chain()
+chain_slot = st.session_state.chain_slot
+st.session_state.chain_build_busy = chain_slot.busy
+
+
+@st.fragment(run_every=0.5 if chain_slot.busy else None)
+def show_build_progress():
+    slot = st.session_state.chain_slot
+    progress = chain_builder.progress(slot)
+    if progress is not None:
+        eta = f"약 {progress['eta']:.0f}초 남음" if progress["eta"] >= 1 else "곧 완료"
+        st.progress(progress["fraction"], text=f"🔧 {progress['label']} 중... {eta}")
+        if slot.chain is not None:
+            st.caption("준비될 때까지 이전 설정으로 답변합니다.")
+    elif slot.error:
+        st.error(f"체인 재생성 실패: {slot.error}")
+    if st.session_state.chain_build_busy and not slot.busy:
+        st.session_state.chain_build_busy = False
+        st.rerun() # 새 체인 반영 (채팅 입력 활성화, 진행률 조각 주기 실행 중지)
+
+with build_status:
+    show_build_progress()
+
+
 # --- 컬럼 3: 채팅 영역 ---
 with col_chat:
     if st.session_state.selected_character:
         selected_name = st.session_state.selected_character
         selected_details = CHARACTERS[selected_name]
+        if selected_name == DATA_BOT_NAME:
+            selected_details["description"] = data_source_description() if api_key_valid else '데이터 기반 야구 질문 답변 (키 필요)'
 
         # --- 캐릭터 정보 및 대화 삭제 버튼 ---
         # ... (이전과 동일) ...
@@ -239,9 +318,10 @@ with col_chat:
              delete_disabled = selected_name not in st.session_state.chat_histories or not st.session_state.chat_histories[selected_name]
              if st.button(f"🧹 기록 삭제", key=f"clear_btn_{selected_name}", help=f"'{selected_name}' 와(과)의 대화 내역을 지웁니다.", disabled=delete_disabled):
                  if selected_name in st.session_state.chat_histories:
-                     st.session_state.chat_histories[selected_name] = []
-                     if hasattr(st.session_state.active_chain, 'memory') and st.session_state.active_chain:
-                          try: st.session_state.active_chain.memory.clear(); print(f"{selected_name} 체인 메모리 초기화됨.")
+                     st.session_state.chat_histories[selected_name].clear()
+                     st.session_state.history_window.pop(selected_name, None)
+                     if chain_slot.chain is not None and hasattr(chain_slot.chain, 'memory'):
+                          try: chain_slot.chain.memory.clear(); print(f"{selected_name} 체인 메모리 초기화됨.")
                           except AttributeError: print("활성 체인에 메모리가 없거나 clear() 메소드 없음.")
                           except Exception as mem_e: print(f"메모리 초기화 중 오류: {mem_e}")
                      st.toast(f"'{selected_name}' 대화 기록 삭제 완료!", icon="🧹")
@@ -250,157 +330,171 @@ with col_chat:
                      st.rerun()
         st.divider()
 
-        # --- 채팅 메시지 표시 영역 ---
-        # ... (이전과 동일) ...
+        # --- 채팅 메시지 표시 영역 (최근 메시지만 그리고, 이전 대화는 요청할 때 보관 파일에서 읽음) ---
         chat_display_area = st.container()
         with chat_display_area:
-            messages = st.session_state.chat_histories.get(selected_name, [])
+            history = st.session_state.chat_histories[selected_name]
+            window = st.session_state.history_window.get(selected_name, HISTORY_PAGE)
+            if len(history) > window:
+                if st.button(f"⬆️ 이전 대화 더 보기 ({len(history) - window}개)", key=f"more_btn_{selected_name}"):
+                    st.session_state.history_window[selected_name] = window + HISTORY_PAGE
+                    st.session_state.autoplay_next_audio = False
+                    st.rerun()
+            messages = history.tail(window)
             for index, message in enumerate(messages):
                 avatar_display = selected_details['avatar'] if message["role"] == "assistant" else "👤"
                 with st.chat_message(message["role"], avatar=avatar_display):
                     st.markdown(message["content"])
                     is_last_message = (index == len(messages) - 1)
-                    if is_last_message and message["role"] == "assistant" and message.get("audio") and st.session_state.get("autoplay_next_audio", False):
-                        try: st.audio(message["audio"], format="audio/mp3", autoplay=True)
+                    if is_last_message and message["role"] == "assistant" and message.get("audio_id") and st.session_state.get("autoplay_next_audio", False):
+                        try:
+                            audio_data = audio_store.get(message["audio_id"])
+                            if audio_data: st.audio(audio_data, format="audio/mp3", autoplay=True)
                         except Exception as audio_e: st.warning(f"오디오 재생 중 오류: {audio_e}")
                         finally: st.session_state.autoplay_next_audio = False
 
         # --- 채팅 입력 및 응답 처리 ---
-        chat_input_disabled = not st.session_state.get("active_chain") or not api_key_valid
+        active_chain = chain_slot.chain # 재생성 중이면 이전 체인 (턴 도중 교체되어도 이 턴은 같은 체인 사용)
+        chat_input_disabled = active_chain is None or not api_key_valid
         if prompt := st.chat_input(f"{selected_name}에게 메시지 보내기...", key=f"chat_input_{selected_name}", disabled=chat_input_disabled):
 
-            current_chat_history = st.session_state.chat_histories.get(selected_name, [])
+            current_chat_history = st.session_state.chat_histories[selected_name]
             current_chat_history.append({"role": "user", "content": prompt})
-            st.session_state.chat_histories[selected_name] = current_chat_history
             st.session_state.autoplay_next_audio = False
 
             response_text = None
             audio_bytes = None
 
-            with st.spinner("답변 생성 중..."):
-                try:
-                    if st.session_state.active_chain:
-                        response_text = ga.get_answer(st.session_state.active_chain, prompt)
-                    else:
-                        response_text = "오류: RAG 시스템 준비 안됨. 캐릭터를 다시 선택하거나 설정을 확인하세요."
-
-                    # --- TTS Generation ---
-                    if api_key_valid and response_text and not response_text.startswith(("오류:", "API 오류", "[LLM", "[{", "알 수 없는", "답변을 찾을 수 없습니다", "답변 형식 오류")):
-                        try:
-                            character_voice = selected_details.get("voice", "nova")
-                            print(f"--- TTS 호출 시도: 캐릭터='{selected_name}', 목소리='{character_voice}', 텍스트='{response_text[:50]}...'")
-
-                            # --- TTS 입력 텍스트 전처리 (약어 발음 수정) ---
-                            # 원본 텍스트 복사
-                            tts_input_text = response_text
-
-                            # 팀 약어 처리 (구체적인 것 먼저)
-                            tts_input_text = tts_input_text.replace("LG트윈스", "엘 지 트윈스")
-                            tts_input_text = tts_input_text.replace("SSG 랜더스", "에스 에스 지 랜더스")
-                            tts_input_text = tts_input_text.replace("KT 위즈", "케이 티 위즈")
-                            tts_input_text = tts_input_text.replace("NC 다이노스", "엔 씨 다이노스")
-
-                            # 팀 약어 + 공백 처리
-                            tts_input_text = tts_input_text.replace("LG ", "엘 지 ")
-                            tts_input_text = tts_input_text.replace("SSG ", "에스 에스 지 ")
-                            tts_input_text = tts_input_text.replace("KT ", "케이 티 ")
-                            tts_input_text = tts_input_text.replace("NC ", "엔 씨 ")
-
-                            # 팀 약어만 있는 경우 처리 (다른 약어 처리 전에)
-                            tts_input_text = tts_input_text.replace("LG", "엘 지")
-                            tts_input_text = tts_input_text.replace("SSG", "에스 에스 지")
-                            tts_input_text = tts_input_text.replace("KT", "케이 티")
-                            tts_input_text = tts_input_text.replace("NC", "엔 씨")
-
-                            # 주요 통계 약어 처리 (긴 것, 특수한 것 먼저)
-                            tts_input_text = tts_input_text.replace("rRA9pf", "알 알 에이 나인 피 에프")
-                            tts_input_text = tts_input_text.replace("rRA9", "알 알 에이 나인")
-                            tts_input_text = tts_input_text.replace("RA9", "알 에이 나인")
-                            tts_input_text = tts_input_text.replace("ERA", "이 알 에이")
-                            tts_input_text = tts_input_text.replace("oWAR", "오 더블유 에이 알")
-                            tts_input_text = tts_input_text.replace("dWAR", "디 더블유 에이 알")
-                            tts_input_text = tts_input_text.replace("WAR", "더블유 에이 알")
-                            tts_input_text = tts_input_text.replace("WHIP", "더블유 에이치 아이 피")
-                            tts_input_text = tts_input_text.replace("FIP", "에프 아이 피")
-                            tts_input_text = tts_input_text.replace("TBF", "티 비 에프")
-                            tts_input_text = tts_input_text.replace("IBB", "아이 비 비") # 혹시 IBB도 사용될 경우 대비
-                            tts_input_text = tts_input_text.replace("IB", "아이 비")
-                            tts_input_text = tts_input_text.replace("ROE", "알 오 이")
-                            tts_input_text = tts_input_text.replace("SHO", "에스 에이치 오")
-                            tts_input_text = tts_input_text.replace("wRC+", "더블유 알 씨 플러스")
-                            tts_input_text = tts_input_text.replace("AVG", "에이 브이 지")
-                            tts_input_text = tts_input_text.replace("OBP", "오 비 피")
-                            tts_input_text = tts_input_text.replace("SLG", "에스 엘 지")
-                            tts_input_text = tts_input_text.replace("OPS", "오 피 에스")
-                            tts_input_text = tts_input_text.replace("RBI", "알 비 아이")
-                            tts_input_text = tts_input_text.replace("GDP", "지 디 피")
-                            tts_input_text = tts_input_text.replace("ePA", "이 피 에이")
-
-                            # 나머지 약어들 (알파벳 순 또는 길이 순)
-                            tts_input_text = tts_input_text.replace("GS", "지 에스")
-                            tts_input_text = tts_input_text.replace("GR", "지 알")
-                            tts_input_text = tts_input_text.replace("GF", "지 에프")
-                            tts_input_text = tts_input_text.replace("CG", "씨 지")
-                            tts_input_text = tts_input_text.replace("HD", "에이치 디")
-                            tts_input_text = tts_input_text.replace("IP", "아이 피")
-                            tts_input_text = tts_input_text.replace("ER", "이 알")
-                            tts_input_text = tts_input_text.replace("HR", "에이치 알")
-                            tts_input_text = tts_input_text.replace("BB", "비 비")
-                            tts_input_text = tts_input_text.replace("HP", "에이치 피")
-                            tts_input_text = tts_input_text.replace("SO", "에스 오")
-                            tts_input_text = tts_input_text.replace("BK", "비 케이")
-                            tts_input_text = tts_input_text.replace("WP", "더블유 피")
-                            tts_input_text = tts_input_text.replace("PA", "피 에이")
-                            tts_input_text = tts_input_text.replace("AB", "에이 비")
-                            tts_input_text = tts_input_text.replace("TB", "티 비")
-                            tts_input_text = tts_input_text.replace("SB", "에스 비")
-                            tts_input_text = tts_input_text.replace("CS", "씨 에스")
-                            tts_input_text = tts_input_text.replace("SH", "에스 에이치")
-                            tts_input_text = tts_input_text.replace("SF", "에스 에프")
-                            tts_input_text = tts_input_text.replace("2B", "이 루타") # 숫자는 한글로 읽도록 수정
-                            tts_input_text = tts_input_text.replace("3B", "삼 루타") # 숫자는 한글로 읽도록 수정
-
-                            # 한 글자 약어 (다른 약어 처리 후 마지막에)
-                            tts_input_text = tts_input_text.replace(" G", " 게임") # G는 게임 수로 읽도록
-                            tts_input_text = tts_input_text.replace(" W", " 승") # W는 승리로 읽도록
-                            tts_input_text = tts_input_text.replace(" L", " 패") # L은 패배로 읽도록
-                            tts_input_text = tts_input_text.replace(" S", " 세이브") # S는 세이브로 읽도록
-                            tts_input_text = tts_input_text.replace(" R", " 득점") # R은 득점/실점으로 읽도록 (문맥 따라 다름 주의)
-                            tts_input_text = tts_input_text.replace(" H", " 안타") # H는 안타로 읽도록
-
-                            # ---------------------------------------------
-
-                            # 수정된 텍스트로 TTS 호출
-                            print(f"--- TTS 전처리 후 텍스트: '{tts_input_text[:50]}...'")
-                            audio_bytes = generate_tts_bytes(tts_input_text, style_name=character_voice)
-                            print(f"--- TTS 결과: {'Bytes 생성됨 (길이: ' + str(len(audio_bytes)) + ')' if audio_bytes else 'None'}")
-                            if audio_bytes:
-                                st.session_state.autoplay_next_audio = True
-                        except Exception as tts_e:
-                            st.warning(f"TTS 생성 중 오류 발생: {tts_e}")
-                            print(f"!!! TTS Generation Error: {tts_e}")
-                            traceback.print_exc()
-                            audio_bytes = None
-                    else:
-                         if not api_key_valid: print("--- TTS 건너뜀: API 키 유효하지 않음")
-                         elif not response_text: print("--- TTS 건너뜀: 응답 텍스트 없음")
-                         else: print(f"--- TTS 건너뜀: 응답 텍스트 형식 부적합 ('{response_text[:20]}...')")
+            with st.chat_message("user", avatar="👤"):
+                st.markdown(prompt)
 
+            turn_trace = tracing.start_trace("turn", character=selected_name, question_chars=len(prompt),
+                                             context_tokens=st.session_state.context_tokens,
+                                             index_type=st.session_state.index_type,
+                                             embedding_provider=st.session_state.embedding_provider) # 인덱스 설정은 prewarm.py의 인기 설정 집계용
+            with tracing.use_trace(turn_trace):
+                try:
+                    # --- 문장 단위 TTS 파이프라인 (답변이 스트리밍되는 동안 완성된 문장부터 음성 합성) ---
+                    character_voice = selected_details.get("voice", "nova")
+                    tts_pipe = None
+                    session_id = st.session_state.session_id # TTS 스레드에서는 세션 상태를 읽을 수 없음
+                    if api_key_valid:
+                        def synthesize_segment(segment):
+                            with tracing.span("tts_normalize", chars=len(segment)):
+                                tts_text = normalize_for_tts(segment)
+                            return service.generate_tts_bytes(session_id, tts_text, style_name=character_voice)
+                        tts_pipe = TTSPipeline(synthesize_segment)
+
+                    # --- 답변 스트리밍 (토큰이 생성되는 대로 말풍선에 표시) ---
+                    cached_audio = None
+                    answer_timings = {}
+                    with st.chat_message("assistant", avatar=selected_details['avatar']):
+                        if active_chain:
+                            answer_stream = service.stream_answer(session_id, active_chain, prompt, timings=answer_timings)
+                            # 첫 조각을 먼저 받아 답변 캐시 적중 여부를 확인 (적중했고 음성도 있으면 TTS를 다시 돌리지 않음)
+                            first_chunk = next(answer_stream, "")
+                            if answer_timings.get("answer_cache") == "hit":
+                                cached_audio = answer_timings["cache_entry"].audio
+                            answer_stream = itertools.chain([first_chunk], answer_stream)
+                            if tts_pipe and cached_audio is None:
+                                answer_stream = tts_pipe.tee(answer_stream)
+                            response_text = st.write_stream(answer_stream)
+                            response_text = response_text.strip() if isinstance(response_text, str) else "".join(map(str, response_text)).strip()
+                            st.session_state.last_answer_timings = answer_timings
+                        else:
+                            response_text = "오류: RAG 시스템 준비 안됨. 캐릭터를 다시 선택하거나 설정을 확인하세요."
+                            st.markdown(response_text)
+
+                    with st.spinner("음성 생성 중..."):
+                        # --- TTS Generation (스트리밍 중 문장 단위로 미리 합성된 오디오를 순서대로 이어 붙임) ---
+                        if cached_audio is not None:
+                            if tts_pipe: tts_pipe.cancel()
+                            audio_bytes = cached_audio
+                            st.session_state.autoplay_next_audio = True
+                            print(f"--- TTS 건너뜀: 답변 캐시의 음성 사용 (길이: {len(audio_bytes)})")
+                        elif tts_pipe and response_text and not response_text.startswith(("오류:", "API 오류", "[LLM", "[{", "알 수 없는", "답변을 찾을 수 없습니다", "답변 형식 오류")):
+                            try:
+                                print(f"--- TTS 파이프라인: 캐릭터='{selected_name}', 목소리='{character_voice}', 문장 {len(tts_pipe.segments)}개")
+                                audio_bytes = tts_pipe.result_bytes()
+                                print(f"--- TTS 결과: {'Bytes 생성됨 (길이: ' + str(len(audio_bytes)) + ')' if audio_bytes else 'None'}")
+                                if audio_bytes:
+                                    st.session_state.autoplay_next_audio = True
+                                    load_backend().attach_answer_audio(answer_timings.get("cache_entry"), audio_bytes)
+                            except Exception as tts_e:
+                                st.warning(f"TTS 생성 중 오류 발생: {tts_e}")
+                                print(f"!!! TTS Generation Error: {tts_e}")
+                                traceback.print_exc()
+                                audio_bytes = None
+                        else:
+                             if tts_pipe: tts_pipe.cancel()
+                             if not api_key_valid: print("--- TTS 건너뜀: API 키 유효하지 않음")
+                             elif not response_text: print("--- TTS 건너뜀: 응답 텍스트 없음")
+                             else: print(f"--- TTS 건너뜀: 응답 텍스트 형식 부적합 ('{response_text[:20]}...')")
+
+                except backend_service.ServiceBusy as busy_e:
+                    st.warning(f"⏳ {busy_e} 잠시 후 다시 질문해 주세요.")
+                    print(f"!!! Service Busy: {busy_e}")
+                    response_text = "오류: 요청이 많아 지금은 답변하지 못했습니다. 잠시 후 다시 시도해 주세요."
                 except Exception as e:
                     st.error(f"응답 처리 중 예외 발생: {e}")
                     print(f"!!! Top Level Response Processing Error: {e}")
                     traceback.print_exc()
                     response_text = f"오류: 응답 처리 중 문제가 발생했습니다."
 
-            # 봇 응답 저장
+            # 봇 응답 저장 (음성은 디스크 블롭 저장소에 두고 메시지에는 audio_id만)
+            audio_id = None
+            if audio_bytes:
+                try: audio_id = audio_store.put(st.session_state.session_id, audio_bytes)
+                except OSError as store_e: print(f"음성 저장 실패 (재생 생략): {store_e}")
             current_chat_history.append({
                 "role": "assistant",
                 "content": response_text if response_text else "응답 생성 실패",
-                "audio": audio_bytes
+                "audio_id": audio_id
             })
-            st.session_state.chat_histories[selected_name] = current_chat_history
+            turn_trace.attrs.update(answer_chars=len(response_text or ""), audio_bytes=len(audio_bytes or b""))
+            st.session_state.pending_trace = turn_trace # 재실행 렌더링 시간까지 포함해 다음 실행 끝에서 마무리
             st.rerun()
 
     else: # 선택된 캐릭터 없을 때
         st.info("👈 **왼쪽 목록**에서 대화할 상대를 선택해주세요.")
-        st.caption("⚙️ **설정**은 가장 왼쪽 열에서 조절할 수 있습니다.")
\ No newline at end of file
+        st.caption("⚙️ **설정**은 가장 왼쪽 열에서 조절할 수 있습니다.")
+
+
+# --- 턴 trace 마무리: 답변 직후 재실행의 렌더링 시간까지 기록하고 설정 컬럼에 단계별 소요 시간 표시 ---
+pending_trace = st.session_state.pop("pending_trace", None)
+if pending_trace is not None:
+    pending_trace.add_span("rerun_render", _script_start, time.perf_counter())
+    pending_trace.finish()
+    st.session_state.last_trace = pending_trace
+last_timings = st.session_state.get("last_answer_timings")
+timing_lines = []
+if last_timings and "total" in last_timings:
+    timing_lines.append(f"⏱️ 최근 답변: 첫 토큰 {last_timings['ttft']:.2f}초 / 전체 {last_timings['total']:.2f}초"
+                        + (" (같은 질문 요청과 합쳐짐)" if last_timings.get("coalesced") else ""))
+last_trace = st.session_state.get("last_trace")
+if last_trace is not None and last_trace.sampled:
+    retrieval_path_labels = {"first_turn": "첫 턴 (재구성 없음)", "direct": "바로 검색 (재구성 생략)", "condensed": "질문 재구성 후 검색"}
+    if last_trace.attrs.get("retrieval_path"):
+        timing_lines.append(f"검색 경로: {retrieval_path_labels.get(last_trace.attrs['retrieval_path'], last_trace.attrs['retrieval_path'])}")
+    if last_trace.attrs.get("memory_tokens") is not None:
+        timing_lines.append(f"대화 기록: {last_trace.attrs['memory_tokens']:,}토큰 (요약/생략으로 {last_trace.attrs.get('memory_tokens_saved', 0):,}토큰 절약)")
+    if last_trace.attrs.get("answer_cache"):
+        timing_lines.append(f"답변 캐시: {'적중' if last_trace.attrs['answer_cache'] == 'hit' else '미스'}")
+    timing_lines.extend(tracing.format_breakdown(last_trace, _SPAN_LABELS))
+cache_stats = load_backend().get_answer_cache_stats() if "GetAnswer" in sys.modules else {"lookups": 0}
+if cache_stats["lookups"]:
+    timing_lines.append(f"답변 캐시 누적: 적중률 {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['lookups']}), "
+                        f"절약 {cache_stats['saved_seconds']:.1f}초")
+service_stats = service.stats()
+if service_stats["requests"]:
+    timing_lines.append(f"백엔드 서비스: 처리 중 {service_stats['active']}/{service_stats['max_inflight']} "
+                        f"(최대 {service_stats['peak_active']}), 합쳐진 요청 {service_stats['coalesced']}, "
+                        f"거절 {service_stats['rejected']}")
+if timing_lines:
+    timing_placeholder.caption("  \n".join(timing_lines))
+
+# --- 시작 시간: 세션의 첫 실행에서 임포트/첫 화면까지 걸린 시간을 한 번 기록 ---
+if "first_render_ms" not in st.session_state:
+    st.session_state.first_render_ms = round((time.perf_counter() - _script_start) * 1000, 1)
+    print(f"[startup] 첫 화면 {st.session_state.first_render_ms}ms (모듈 임포트 {(_imports_done - _script_start) * 1000:.1f}ms, "
+          f"GetAnswer {'로드됨' if 'GetAnswer' in sys.modules else '미로드'})")
@@ -0,0 +1,243 @@
+# backend_service.py (프로세스 하나의 모든 세션이 공유하는 비동기 백엔드: 답변 생성/TTS 호출의 입장 제어와 중복 요청 합치기)
+#
+# Streamlit 세션(스크립트 스레드)과 TTS 파이프라인 스레드는 요청을 넘기고 결과만 받는 얇은 클라이언트입니다.
+#   - asyncio 이벤트 루프 하나를 데몬 스레드에서 계속 돌리고, 동기 코드는 get_answer/stream_answer/generate_tts_bytes로
+#     코루틴을 넘겨 결과를 기다립니다.
+#   - 입장 제어: 사용자(세션)별 동시 실행 수(per_user)와 전체 동시 실행 수(max_inflight)를 세마포어로 제한하고,
+#     admission_timeout 안에 자리가 나지 않으면 ServiceBusy를 올립니다 (대기열이 끝없이 쌓이지 않도록).
+#   - 합치기: 같은 키의 요청이 진행 중이면 새로 호출하지 않고 그 결과를 함께 받습니다.
+#     TTS는 (텍스트, 스타일), 답변은 대화 기록에 기대지 않는 질문일 때만 (체인 설정, 질문) (GetAnswer.coalesce_key).
+#   - LangChain/OpenAI SDK 호출은 동기이므로 max_inflight개 스레드 풀에서 실행하고, HTTP 연결은 openai_http의 공유 풀을 씁니다.
+# 호출한 쪽의 contextvars(현재 trace)를 워커 스레드로 넘기므로 턴 trace의 단계별 span이 그대로 기록됩니다.
+#
+# 환경 변수:
+#   ONEDAYAI_SERVICE_MAX_INFLIGHT       전체 동시 실행 수 (기본 32)
+#   ONEDAYAI_SERVICE_PER_USER           사용자별 동시 실행 수 (기본 4, 답변 스트림 1 + 문장별 TTS)
+#   ONEDAYAI_SERVICE_ADMISSION_TIMEOUT  입장 대기 한도 (초, 기본 30)
+import os
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+_MAX_INFLIGHT = int(os.environ.get("ONEDAYAI_SERVICE_MAX_INFLIGHT", "32"))
+_PER_USER = int(os.environ.get("ONEDAYAI_SERVICE_PER_USER", "4"))
+_ADMISSION_TIMEOUT = float(os.environ.get("ONEDAYAI_SERVICE_ADMISSION_TIMEOUT", "30"))
+_STREAM_DONE = object()
+
+
+class ServiceBusy(RuntimeError):
+    """입장 대기 한도 안에 실행 자리가 나지 않았습니다 (잠시 후 다시 시도)."""
+
+
+class _UserSlot:
+    def __init__(self, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0  # 대기 중이거나 실행 중인 요청 수 (0이 되면 슬롯을 지움)
+
+
+class BackendService:
+    """데몬 스레드의 이벤트 루프에서 도는 공유 백엔드. 메서드는 어느 스레드에서나 호출할 수 있습니다."""
+
+    def __init__(self, max_inflight=_MAX_INFLIGHT, per_user=_PER_USER, admission_timeout=_ADMISSION_TIMEOUT):
+        self.max_inflight = max_inflight
+        self.per_user = per_user
+        self.admission_timeout = admission_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="backend-call")
+        self._loop = asyncio.new_event_loop()
+        self._global = None
+        self._users = {}  # 사용자 ID -> _UserSlot (이벤트 루프 스레드에서만 접근)
+        self._inflight = {}  # 합치기 키 -> asyncio.Future (이벤트 루프 스레드에서만 접근)
+        self._stats = {"requests": 0, "coalesced": 0, "rejected": 0, "active": 0, "peak_active": 0}
+        self._stats_lock = threading.Lock()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="backend-service", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._global = asyncio.Semaphore(self.max_inflight)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def _count(self, key, delta=1):
+        with self._stats_lock:
+            self._stats[key] += delta
+            if key == "active":
+                self._stats["peak_active"] = max(self._stats["peak_active"], self._stats["active"])
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, users=len(self._users), max_inflight=self.max_inflight, per_user=self.per_user)
+
+    def close(self):
+        """이벤트 루프와 워커 스레드를 멈춥니다 (benchmark.py처럼 서비스를 따로 만든 경우)."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    # --- 이벤트 루프 안에서 쓰는 코루틴 ---
+    @contextlib.asynccontextmanager
+    async def _admission(self, user_id):
+        """사용자별, 전체 순서로 자리를 얻습니다. admission_timeout 안에 못 얻으면 ServiceBusy."""
+        slot = self._users.get(user_id)
+        if slot is None:
+            slot = self._users[user_id] = _UserSlot(self.per_user)
+        slot.users += 1
+        deadline = time.monotonic() + self.admission_timeout
+        acquired = []
+        try:
+            for semaphore in (slot.semaphore, self._global):
+                try:
+                    await asyncio.wait_for(semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._count("rejected")
+                    raise ServiceBusy(f"요청이 많아 {self.admission_timeout:.0f}초 안에 처리를 시작하지 못했습니다.") from None
+                acquired.append(semaphore)
+            self._count("active")
+            try:
+                yield
+            finally:
+                self._count("active", -1)
+        finally:
+            for semaphore in acquired:
+                semaphore.release()
+            slot.users -= 1
+            if slot.users == 0:
+                self._users.pop(user_id, None)
+
+    async def _run(self, context, func, *args):
+        """동기 함수를 워커 스레드에서 호출자의 contextvars로 실행합니다 (입장 제어 안에서만 호출)."""
+        return await self._loop.run_in_executor(self._executor, context.run, func, *args)
+
+    async def _call(self, user_id, context, func, *args):
+        """입장 제어를 거쳐 동기 함수를 실행합니다."""
+        async with self._admission(user_id):
+            return await self._run(context, func, *args)
+
+    async def _coalesced(self, key, factory):
+        """같은 key가 진행 중이면 그 결과를 기다리고, 아니면 factory()를 실행해 결과를 공유합니다. (결과, 합쳐졌는지)"""
+        if key is not None and key in self._inflight:
+            return await self._follow(self._inflight[key]), True
+        return await self._lead(key, factory), False
+
+    async def _follow(self, future):
+        """진행 중인 같은 요청의 결과를 기다립니다 (자리를 차지하지 않음)."""
+        self._count("coalesced")
+        return await asyncio.shield(future)
+
+    async def _lead(self, key, factory):
+        """factory()를 실행하고, 실행 중에는 같은 key의 요청이 결과를 함께 받도록 등록합니다."""
+        future = self._loop.create_future()
+        if key is not None:
+            self._inflight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 기다리는 쪽이 없어도 "retrieved" 처리
+            raise
+        finally:
+            if key is not None:
+                self._inflight.pop(key, None)
+
+    async def _answer_key(self, context, chain, question):
+        import GetAnswer as ga
+        # 엔티티 판정이 통계 엔진(CSV 로드)을 거칠 수 있어 루프 밖(워커 스레드)에서 계산. 입장 제어 안에서만 호출
+        key = await self._run(context, ga.coalesce_key, chain, question)
+        return ("answer",) + key if key else None
+
+    async def _answer(self, user_id, context, chain, question):
+        import GetAnswer as ga
+        # 키 계산과 답변 생성은 한 번 얻은 자리 안에서 하고, 합쳐진 요청은 자리를 내놓고 결과만 기다림
+        async with self._admission(user_id):
+            key = await self._answer_key(context, chain, question)
+            leader = self._inflight.get(key) if key is not None else None
+            if leader is None:
+                return await self._lead(key, lambda: self._run(context, ga.get_answer, chain, question))
+        answer = await self._follow(leader)
+        await self._call(user_id, context, ga.remember_turn, chain, question, answer)
+        return answer
+
+    async def _stream(self, user_id, context, chain, question, timings, token_queue):
+        """답변 토큰을 token_queue로 흘려보냅니다. 같은 질문이 진행 중이면 그 답변 전체를 한 조각으로 보냅니다."""
+        import GetAnswer as ga
+        start = time.perf_counter()
+
+        def produce():
+            parts = []
+            for token in ga.stream_answer(chain, question, timings):
+                parts.append(token)
+                token_queue.put(token)
+            return "".join(parts)
+
+        try:
+            async with self._admission(user_id):
+                key = await self._answer_key(context, chain, question)
+                leader = self._inflight.get(key) if key is not None else None
+                if leader is None:
+                    await self._lead(key, lambda: self._run(context, produce))
+            if leader is not None:
+                answer = await self._follow(leader)
+                await self._call(user_id, context, ga.remember_turn, chain, question, answer)
+                timings.update(coalesced=True, ttft=time.perf_counter() - start, total=time.perf_counter() - start)
+                token_queue.put(answer)
+        except BaseException as e:
+            token_queue.put(e)
+        finally:
+            token_queue.put(_STREAM_DONE)
+
+    async def _tts(self, user_id, context, text, style_name):
+        import SpeakAnswer
+        key = ("tts", " ".join(text.split()), style_name)
+        audio, _ = await self._coalesced(
+            key, lambda: self._call(user_id, context, SpeakAnswer.generate_tts_bytes, text, style_name))
+        return audio
+
+    # --- 동기 호출 인터페이스 (Streamlit 스크립트 스레드, TTS 파이프라인 스레드 등) ---
+    def _submit(self, coroutine_function, *args, timeout=None):
+        self._count("requests")
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(*args), self._loop)
+        return future.result(timeout)
+
+    def get_answer(self, user_id, chain, question):
+        """GetAnswer.get_answer와 같은 답변 문자열. 입장 대기 한도를 넘으면 ServiceBusy."""
+        return self._submit(self._answer, user_id, contextvars.copy_context(), chain, question)
+
+    def stream_answer(self, user_id, chain, question, timings=None):
+        """GetAnswer.stream_answer와 같은 토큰 제너레이터. 합쳐진 요청이면 timings["coalesced"]=True와 답변 전체를 한 번에 냅니다."""
+        timings = timings if timings is not None else {}
+        self._count("requests")
+        token_queue = queue.Queue()
+        asyncio.run_coroutine_threadsafe(
+            self._stream(user_id, contextvars.copy_context(), chain, question, timings, token_queue), self._loop)
+        while True:
+            token = token_queue.get()
+            if token is _STREAM_DONE:
+                return
+            if isinstance(token, BaseException):
+                raise token
+            yield token
+
+    def generate_tts_bytes(self, user_id, text, style_name=None):
+        """SpeakAnswer.generate_tts_bytes와 같은 음성 바이트 (같은 문장/스타일 동시 요청은 한 번만 합성)."""
+        return self._submit(self._tts, user_id, contextvars.copy_context(), text, style_name)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """프로세스 전역 BackendService (첫 호출 때 이벤트 루프 스레드 시작)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = BackendService()
+        return _service
@@ -0,0 +1,216 @@
+# batch_runner.py (JSONL 질문 목록을 동시에 실행해 답변을 JSONL로 기록하는 배치 QA 실행기)
+#
+# 입력 한 줄 예시:
+#   {"id": "q1", "persona": "전문 분석가", "temperature": 0.3, "context_tokens": 600, "retrieval_mode": "auto",
+#    "index_type": "flat", "embedding_provider": "ngram", "question": "문보경 선수의 OPS는?"}
+# persona는 characters.py의 캐릭터 이름이거나 시스템 프롬프트 문자열 자체입니다.
+# embedding_provider를 생략하면 기본 제공자(ONEDAYAI_EMBEDDING_PROVIDER)를 씁니다.
+#
+# 답변 JSONL만 표준 출력(-o 생략 시)이나 -o 파일로 나가고, 진행/재시도 로그는 모두 표준 오류로 나갑니다.
+# --no-answer-cache는 의미 기반 답변 캐시를 끄고 매 질문을 체인으로 실행합니다 (체인 자체의 재생/측정용).
+#
+# 실행: python batch_runner.py questions.jsonl -o answers.jsonl --concurrency 8 --rps 4 --retries 3
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openai import OpenAIError
+
+import GetAnswer as ga
+import embedding_providers as ep
+from characters import CHARACTERS
+
+_DEFAULT_CONCURRENCY = 8
+_DEFAULT_RPS = 4.0  # 요청 키(rate_key, 기본은 페르소나)별 초당 호출 수
+_DEFAULT_RETRIES = 3
+_BACKOFF_BASE = 1.0  # 재시도 대기: base * 2^(시도-1) + 지터
+_BACKOFF_MAX = 30.0
+_RETRYABLE_ERRORS = (OpenAIError, TimeoutError, ConnectionError)
+
+
+class TokenBucket:
+    """키별 토큰 버킷. acquire()는 토큰이 생길 때까지 호출 스레드를 재웁니다."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _RateLimiter:
+    def __init__(self, rate):
+        self.rate = rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        with self._lock:
+            bucket = self._buckets.setdefault(key, TokenBucket(self.rate))
+        bucket.acquire()
+
+
+def _resolve_persona(persona):
+    """캐릭터 이름이면 해당 시스템 프롬프트를, 아니면 문자열을 그대로 시스템 프롬프트로 사용합니다."""
+    if not persona:
+        return CHARACTERS["야구봇 (기본)"]["system_prompt"]
+    character = CHARACTERS.get(persona)
+    return character["system_prompt"] if character else persona
+
+
+def _chain_config(record):
+    return (
+        _resolve_persona(record.get("persona")),
+        round(float(record.get("temperature", 0.7)), 2),
+        int(record.get("context_tokens", ga.DEFAULT_CONTEXT_TOKENS)),
+        record.get("retrieval_mode", "auto"),
+        record.get("index_type", "flat"),
+        record.get("embedding_provider") or ep.DEFAULT_PROVIDER,
+    )
+
+
+class BatchRunner:
+    """
+    설정(페르소나, temperature, 컨텍스트 예산, 검색 모드, 인덱스 종류, 임베딩 제공자)이 같은 질문들은 메모리 없는 체인 하나를 공유합니다.
+    벡터스토어와 LLM 클라이언트는 GetAnswer의 프로세스 전역 레지스트리에서 재사용되므로
+    인덱스 종류와 임베딩 제공자가 같으면 페르소나나 컨텍스트 예산이 달라도 인덱스는 한 번만 로드됩니다.
+    """
+
+    def __init__(self, concurrency=_DEFAULT_CONCURRENCY, rps=_DEFAULT_RPS, retries=_DEFAULT_RETRIES):
+        self.concurrency = concurrency
+        self.retries = retries
+        self._limiter = _RateLimiter(rps)
+        self._chains = {}
+        self._chain_locks = {}
+        self._lock = threading.Lock()
+
+    def _get_chain(self, config):
+        with self._lock:
+            if config in self._chains:
+                return self._chains[config]
+            key_lock = self._chain_locks.setdefault(config, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if config in self._chains:
+                    return self._chains[config]
+            system_prompt, temperature, context_tokens, retrieval_mode, index_type, embedding_provider = config
+            chain = ga.initialize_qa_system(system_prompt, temperature, context_tokens,
+                                            use_memory=False, retrieval_mode=retrieval_mode, index_type=index_type,
+                                            embedding_provider=embedding_provider)
+            if chain is None:
+                raise RuntimeError(f"QA 체인 초기화 실패 (context_tokens={context_tokens}, index_type={index_type}, "
+                                   f"embedding_provider={embedding_provider})")
+            with self._lock:
+                self._chains[config] = chain
+            return chain
+
+    def run_one(self, record):
+        """질문 하나를 실행하고 결과 레코드를 반환합니다 (예외는 error 필드로 기록)."""
+        result = {"id": record.get("id"), "question": record.get("question"), "answer": None,
+                  "error": None, "attempts": 0}
+        start = time.perf_counter()
+        try:
+            config = _chain_config(record)
+            chain = self._get_chain(config)
+            rate_key = record.get("rate_key") or record.get("persona") or "default"
+            for attempt in range(1, self.retries + 2):
+                result["attempts"] = attempt
+                self._limiter.acquire(rate_key)
+                try:
+                    result["answer"] = ga.run_qa(chain, record["question"])
+                    break
+                except _RETRYABLE_ERRORS as e:
+                    if attempt > self.retries:
+                        raise
+                    delay = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** (attempt - 1)) * (0.5 + random.random())
+                    print(f"[{result['id']}] 재시도 {attempt}/{self.retries} ({type(e).__name__}: {e}), {delay:.1f}s 대기",
+                          file=sys.stderr)
+                    time.sleep(delay)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    def run(self, records, out):
+        """records를 동시에 실행하고, 끝나는 순서대로 out(파일 객체)에 JSONL로 기록합니다."""
+        write_lock = threading.Lock()
+        summary = {"total": 0, "ok": 0, "failed": 0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-qa") as executor:
+            futures = [executor.submit(self.run_one, record) for record in records]
+            for future in as_completed(futures):
+                result = future.result()
+                with write_lock:
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+                summary["total"] += 1
+                summary["failed" if result["error"] else "ok"] += 1
+        summary["elapsed_s"] = round(time.perf_counter() - start, 2)
+        return summary
+
+
+def load_records(path):
+    """JSONL 질문 파일을 읽습니다. question이 없는 줄은 건너뜁니다."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get("question"):
+                print(f"{path}:{line_no} question 필드가 없어 건너뜀", file=sys.stderr)
+                continue
+            record.setdefault("id", line_no)
+            records.append(record)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSONL 질문 목록을 동시에 실행해 답변을 JSONL로 기록합니다.")
+    parser.add_argument("input", help="질문 JSONL 파일")
+    parser.add_argument("-o", "--output", default="-", help="답변 JSONL 파일 (기본: 표준 출력)")
+    parser.add_argument("--concurrency", type=int, default=_DEFAULT_CONCURRENCY)
+    parser.add_argument("--rps", type=float, default=_DEFAULT_RPS, help="키별 초당 요청 수 (0이면 제한 없음)")
+    parser.add_argument("--retries", type=int, default=_DEFAULT_RETRIES)
+    parser.add_argument("--no-answer-cache", action="store_true",
+                        help="의미 기반 답변 캐시를 거치지 않고 모든 질문을 체인으로 실행")
+    args = parser.parse_args(argv)
+
+    if args.no_answer_cache:
+        ga.configure_answer_cache(ttl=0)
+    records = load_records(args.input)
+    runner = BatchRunner(args.concurrency, args.rps, args.retries)
+    results = sys.stdout
+    # GetAnswer 등의 진행 로그(print)가 답변 JSONL에 섞이지 않도록 실행 중 표준 출력을 표준 오류로 돌림
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.output == "-":
+            summary = runner.run(records, results)
+        else:
+            with open(args.output, "w", encoding="utf-8") as out:
+                summary = runner.run(records, out)
+    print(f"배치 완료: {summary}", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
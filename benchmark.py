@@ -0,0 +1,778 @@
+# benchmark.py (OpenAI 호출 없이 단계별 지연 시간을 재는 오프라인 종단 간 벤치마크)
+#
+# 임베딩/채팅/TTS를 결정적인 로컬 대역으로 바꾸고, BaseballCSVs 행을 복제해 데이터 크기를 키운 뒤
+# 컨텍스트 토큰 예산 x 데이터 크기 조합마다 인덱스 생성, 인덱스 로드, 검색, 컨텍스트 크기, get_answer를 측정합니다.
+# TTS 정규화와 generate_tts_bytes(캐시 미스/적중)는 컨텍스트 설정과 무관하므로 한 번만 측정합니다.
+# 데이터 크기마다 FAISS 인덱스 종류(flat/sq8/ivf/hnsw/pq)별 학습 시간, 파일 크기,
+# 메모리 매핑 로드 시간, 검색 지연과 flat 대비 recall@k를 함께 기록합니다.
+# ivf/pq는 nprobe별 recall도 재서 목표 recall에 닿는 가장 작은 nprobe를 알려 줍니다 (ONEDAYAI_IVF_NPROBE 보정용).
+# 시즌/투타/팀 조건이 있는 질문은 샤드 검색과 전체 검색의 지연, 샤드가 훑는 벡터 비율을 비교합니다.
+# 답변 캐시는 같은 질문 목록을 반복해 미스/적중 지연과 적중률, 절약한 생성 시간을 기록합니다.
+# 시작 시간은 새 인터프리터에서의 모듈 임포트 시간, app.py 첫 실행(첫 화면) 시간, 첫 체인 준비 시간
+# (예열 없음/prewarm.py 예열 후)을 기록합니다.
+# 동시 사용자 측정은 mock_openai.py 서버에 실제 OpenAI SDK로 요청하며, 세션 스레드가 직접 호출할 때와
+# backend_service를 거칠 때의 턴 지연, 처리량, 합쳐진 요청 수, OpenAI 요청/TCP 연결 수를 비교합니다.
+# 임베딩 제공자(embedding_providers.py)별로 CSV 행에서 만든 고정 질문 목록의 밀집 검색 품질(hit@1, recall@k, MRR)과
+# 인덱스 생성/질의 임베딩/검색 지연을 비교합니다. openai는 기본적으로 대역 임베딩이며,
+# --live-openai-embeddings를 주면 실제 ada-002로 측정합니다 (API 키와 네트워크 필요).
+#
+# 실행: python benchmark.py --context-tokens 600,300 --replicas 1,5 -o benchmark_report.json
+#       python benchmark.py --index-types flat,ivf,pq --recall-queries 200
+#       python benchmark.py --service-users 16 --replicas 1
+#       python benchmark.py --embedding-providers ngram,openai --live-openai-embeddings --replicas 1
+#       python benchmark.py --baseline old_report.json   (20% 이상 느려진 단계가 있으면 종료 코드 1)
+import os
+import re
+import sys
+import csv
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import threading
+import subprocess
+import tempfile
+import statistics
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import GetAnswer as ga
+import SpeakAnswer
+import vector_index as vi
+import index_manifest as im
+import shard_index
+import prewarm
+import openai_http
+import mock_openai
+import backend_service
+import embedding_providers as ep
+from pronunciation import normalize_for_tts
+from tts_pipeline import FakeTTSBackend
+
+_SOURCE_CSV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BaseballCSVs")
+_DEFAULT_CONTEXT_TOKENS = "600,300,1200"
+_DEFAULT_REPLICAS = "1,5,20"
+_DEFAULT_REPORT = "benchmark_report.json"
+_REGRESSION_THRESHOLD = 0.20
+_RECALL_K = 4  # 예산 기본값에서 컨텍스트에 들어가는 대략의 문서 수
+_DEFAULT_RECALL_QUERIES = 100  # 질문 목록 외에 질의로 쓸 문서 샘플 수
+_NPROBE_SWEEP = (1, 2, 4, 8, 16, 32, 64, 128)
+_NPROBE_TARGET_RECALL = 0.95  # nprobe 보정 기준 (flat 대비 recall@k)
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# 새 인터프리터에서 임포트 시간을 잴 모듈 (app.py가 첫 화면 전에 임포트하는 것과 지연 임포트하는 것)
+_STARTUP_IMPORTS = {
+    "app_first_paint": "import streamlit, tracing, prewarm, characters, pronunciation, tts_pipeline",
+    "GetAnswer": "import GetAnswer",
+    "SpeakAnswer": "import SpeakAnswer",
+    "langchain_openai": "import langchain_openai",
+}
+_STARTUP_MAX_RUNS = 3  # 새 프로세스 측정 반복 상한 (회당 수 초)
+_DEFAULT_SERVICE_USERS = 8  # 동시 사용자 측정의 사용자 수 (0이면 생략)
+_SERVICE_SPEECH_LATENCY = 0.3  # mock 서버의 TTS 요청 지연 (초)
+_DEFAULT_EMBEDDING_QUESTIONS = 120  # 임베딩 품질 측정에 쓸 질문 수 (CSV 행에서 고르게 생성)
+_TABLE_WORDS = {"batting": "타자", "pitching": "투수"}
+
+_QUESTIONS = [
+    "문보경 선수의 OPS는 얼마야?",
+    "그 선수 홈런은 몇 개야?",  # 대화 기록이 있어 질문 재구성 LLM을 거침
+    "한화 투수 중에 ERA가 제일 낮은 선수는?",
+    "치리노스의 WHIP 알려줘",
+]
+
+# 시즌/투타/팀 조건이 있어 (파일, 팀) 샤드 일부만 검색하는 질문
+_SHARD_QUESTIONS = [
+    "2025 LG 투수들 요즘 어때?",
+    "한화 타자 중에 눈에 띄는 선수 있어?",
+    "KT 선수들 분위기 알려줘",
+]
+
+_SAMPLE_ANSWER = (
+    "문보경 선수는 20 G 출전해 AVG 0.373, OBP 0.449, SLG 0.613으로 OPS 1.062를 기록했습니다. "
+    "HR 5개와 RBI 20을 더했고 wRC+는 215.6, WAR는 1.62입니다. "
+    "투수 쪽에서는 ERA 2.10, WHIP 1.00으로 안정적인 선수들이 눈에 띕니다. "
+    "이 페이스라면 시즌 후반까지 팀 공격의 중심 역할을 충분히 해낼 것으로 보입니다."
+)
+
+
+class FakeEmbeddings(Embeddings):
+    """텍스트 해시로 시드를 정한 단위 벡터를 돌려주는 결정적 임베딩. OpenAI처럼 1000개씩 묶어 호출 지연을 흉내냅니다."""
+
+    def __init__(self, dim=256, latency_per_call=0.05, latency_per_text=0.0002, batch_size=1000):
+        self.dim = dim
+        self.latency_per_call = latency_per_call
+        self.latency_per_text = latency_per_text
+        self.batch_size = batch_size
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            self.calls += 1
+            self.texts += len(batch)
+            time.sleep(self.latency_per_call + self.latency_per_text * len(batch))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.texts += 1
+        time.sleep(self.latency_per_call)
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    고정 지연 뒤 결정적인 답변을 돌려주는 채팅 모델. streaming=True이면 ChatOpenAI처럼
+    토큰마다 on_llm_new_token 콜백을 호출하므로 stream_answer 경로도 그대로 측정됩니다.
+    질문 재구성 프롬프트에는 후속 질문을 그대로 돌려줍니다.
+    """
+
+    streaming: bool = False
+    first_token_latency: float = 0.3
+    token_latency: float = 0.01
+    answer: str = _SAMPLE_ANSWER
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _respond(self, messages):
+        prompt = messages[-1].content if messages else ""
+        follow_up = re.search(r"Follow Up Input:\s*(.*)", prompt)
+        return follow_up.group(1).strip() if follow_up else self.answer
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._respond(messages)
+        time.sleep(self.first_token_latency)
+        for token in re.findall(r"\S+\s*", text):
+            time.sleep(self.token_latency)
+            if self.streaming and run_manager:
+                run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class _FakeSpeechClient:
+    """SpeakAnswer가 쓰는 client.audio.speech.create(...) 모양만 흉내내는 TTS 클라이언트."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self._create))
+
+    def _create(self, model, voice, input, response_format):
+        data = self.backend(input)
+        return SimpleNamespace(read=lambda: data)
+
+
+def _summarize(samples):
+    """초 단위 측정값 목록을 밀리초 요약으로 바꿉니다."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "min_ms": round(ordered[0] * 1000, 2),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def replicate_csvs(source_dir, target_dir, replicas):
+    """
+    원본 CSV의 각 행을 replicas배로 복제합니다. 복제본은 Name 뒤에 번호를 붙여
+    서로 다른 문서(다른 임베딩, 다른 행 키)가 되도록 합니다. 생성된 행 수를 반환합니다.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    total_rows = 0
+    for file_name in sorted(os.listdir(source_dir)):
+        if not file_name.endswith(".csv"):
+            continue
+        with open(os.path.join(source_dir, file_name), "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))
+        header, body = rows[0], rows[1:]
+        name_col = header.index("Name") if "Name" in header else None
+        with open(os.path.join(target_dir, file_name), "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for replica in range(replicas):
+                for row in body:
+                    if replica and name_col is not None:
+                        row = row[:name_col] + [f"{row[name_col]}{replica + 1}"] + row[name_col + 1:]
+                    writer.writerow(row)
+                    total_rows += 1
+    return total_rows
+
+
+def _bench_cell(backends, data_dir, context_tokens, embeddings, repeat):
+    ga.configure_backends(csv_directory=data_dir, **backends)
+    index_path = os.path.join(backends["index_dir"], vi.index_subdir(vi.DEFAULT_INDEX_TYPE, ep.OPENAI))
+    shutil.rmtree(index_path, ignore_errors=True)
+    cell = {}
+
+    embeddings.calls = embeddings.texts = 0
+    vectorstore, elapsed = _timed(ga._create_or_load_vectorstore, data_dir, vi.DEFAULT_INDEX_TYPE, ep.OPENAI)
+    cell["build"] = {"ms": round(elapsed * 1000, 2), "docs": vectorstore.index.ntotal,
+                     "index_bytes": vi.index_file_bytes(index_path),
+                     "embed_calls": embeddings.calls, "embedded_texts": embeddings.texts}
+
+    _, elapsed = _timed(ga._create_or_load_vectorstore, data_dir, vi.DEFAULT_INDEX_TYPE, ep.OPENAI)
+    cell["reload_unchanged"] = {"ms": round(elapsed * 1000, 2)}
+
+    samples = [_timed(vi.load_vectorstore, index_path, ga._get_embeddings(ep.OPENAI))[1] for _ in range(repeat)]
+    cell["load_local"] = dict(_summarize(samples), docstore_bytes=vi.docstore_file_bytes(index_path))
+
+    samples = [_timed(vectorstore.similarity_search, question, k=4)[1]
+               for _ in range(repeat) for question in _QUESTIONS]
+    cell["retrieval"] = _summarize(samples)
+
+    shards = ga.get_shard_index(embedding_provider=ep.OPENAI)
+    lexical = ga.get_lexical_index(embedding_provider=ep.OPENAI)
+    routed = [(ga._get_embeddings(ep.OPENAI).embed_query(question),
+               shards.route(shard_index.parse_filters(question, lexical.search(question).teams)))
+              for question in _SHARD_QUESTIONS]
+    routed = [(embedding, ranges) for embedding, ranges in routed if ranges]
+    if routed:
+        shard_store = ga.get_vectorstore(embedding_provider=ep.OPENAI)
+        samples = [_timed(shards.search, shard_store, embedding, 4, ranges)[1]
+                   for _ in range(repeat) for embedding, ranges in routed]
+        cell["shard_search"] = _summarize(samples)
+        scanned = sum(end - start for _, ranges in routed for start, end in ranges) / len(routed)
+        cell["shard_search"]["scanned_fraction"] = round(scanned / vectorstore.index.ntotal, 4)
+        samples = [_timed(vectorstore.similarity_search_by_vector, embedding, k=4)[1]
+                   for _ in range(repeat) for embedding, _ in routed]
+        cell["unsharded_search"] = _summarize(samples)
+
+    chain = ga.initialize_qa_system("You are a helpful assistant.", 0.7, context_tokens, embedding_provider=ep.OPENAI)
+    # 프롬프트 {context} 크기: 검색 후보를 예산까지 채운 문서 수와 토큰 수 (통계 엔진이 답하는 질문 제외)
+    packed = [ga.pack_context(chain.retriever.invoke(question), context_tokens)
+              for question in _QUESTIONS + _SHARD_QUESTIONS]
+    cell["context"] = {"docs": round(statistics.mean(len(docs) for docs, _ in packed), 2),
+                       "tokens": round(statistics.mean(tokens for _, tokens in packed), 1)}
+    previous_cache = ga.configure_answer_cache(ttl=0)  # 같은 질문을 반복하므로 답변 생성 지연은 캐시 없이 측정
+    samples = []
+    for _ in range(repeat):
+        chain.memory.clear()
+        samples.extend(_timed(ga.get_answer, chain, question)[1] for question in _QUESTIONS)
+    cell["get_answer"] = _summarize(samples)
+
+    first_token, totals = [], []
+    for _ in range(repeat):
+        chain.memory.clear()
+        for question in _QUESTIONS:
+            timings = {}
+            for _ in ga.stream_answer(chain, question, timings):
+                pass
+            first_token.append(timings["ttft"])
+            totals.append(timings["total"])
+    cell["stream_first_token"] = _summarize(first_token)
+    cell["stream_total"] = _summarize(totals)
+
+    # 답변 캐시: 첫 바퀴에서 저장하고 다음 바퀴부터 적중 (대역 임베딩은 해시 기반이라 같은 문장끼리만 유사)
+    ga.configure_answer_cache(**previous_cache)
+    before = ga.get_answer_cache_stats()
+    misses, hits = [], []
+    for round_index in range(repeat + 1):
+        chain.memory.clear()
+        samples = [_timed(ga.get_answer, chain, question)[1] for question in _QUESTIONS]
+        (misses if round_index == 0 else hits).extend(samples)
+    after = ga.get_answer_cache_stats()
+    lookups = after["lookups"] - before["lookups"]
+    cell["answer_cache_miss"] = _summarize(misses)
+    cell["answer_cache_hit"] = _summarize(hits)
+    cell["answer_cache_hit"].update(
+        hit_rate=round((after["hits"] - before["hits"]) / lookups, 3) if lookups else 0.0,
+        saved_s=round(after["saved_seconds"] - before["saved_seconds"], 3),
+    )
+    return cell
+
+
+def _recall_queries(vectorstore, count):
+    """질문 목록과, 문서 본문 앞부분(질의처럼 짧게 자른 것)을 고르게 뽑아 질의로 사용합니다."""
+    doc_ids = list(vectorstore.index_to_docstore_id.values())
+    step = max(1, len(doc_ids) // count) if count else len(doc_ids) + 1
+    samples = [vectorstore.docstore.search(doc_id).page_content[:80] for doc_id in doc_ids[::step][:count]]
+    return _QUESTIONS + samples
+
+
+def _bench_index_modes(backends, data_dir, index_types, query_count, repeat):
+    """
+    인덱스 종류별 학습/로드/검색 비용과 flat(정확한 검색) 대비 recall@k를 측정합니다.
+    임베딩은 디스크 캐시에서 읽으므로 생성 시간은 학습과 저장 비용입니다.
+    """
+    ga.configure_backends(csv_directory=data_dir, **backends)
+    embeddings = ga._get_embeddings(ep.OPENAI)
+    exact = ga._create_or_load_vectorstore(data_dir, vi.DEFAULT_INDEX_TYPE, ep.OPENAI)
+    queries = _recall_queries(exact, query_count)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+
+    def search_ids(vectorstore):
+        _, positions = vectorstore.index.search(query_vectors, _RECALL_K)
+        return [[vectorstore.index_to_docstore_id[int(i)] for i in row if i >= 0] for row in positions]
+
+    truth = search_ids(exact)
+    modes = {}
+    for index_type in index_types:
+        index_path = os.path.join(backends["index_dir"], vi.index_subdir(index_type, ep.OPENAI))
+        if index_type != vi.DEFAULT_INDEX_TYPE:
+            shutil.rmtree(index_path, ignore_errors=True)
+        vectorstore, elapsed = _timed(ga._create_or_load_vectorstore, data_dir, index_type, ep.OPENAI)
+        mode = {"build": {"ms": round(elapsed * 1000, 2)},
+                "built_as": im.load_manifest(index_path).get("index_type", index_type),
+                "index_bytes": vi.index_file_bytes(index_path),
+                "memory_mapped": getattr(vectorstore, "memory_mapped", False)}
+        mode["mmap_load"] = _summarize([_timed(vi.load_vectorstore, index_path, embeddings)[1] for _ in range(repeat)])
+        samples = [_timed(vectorstore.similarity_search_with_score_by_vector, vector.tolist(), k=_RECALL_K)[1]
+                   for _ in range(repeat) for vector in query_vectors]
+        mode["search"] = _summarize(samples)
+        mode["recall_at_k"] = round(vi.recall_at_k(truth, search_ids(vectorstore)), 4)
+        ivf = vi.extract_ivf(vectorstore.index)
+        if ivf is not None:
+            mode.update(_nprobe_sweep(vectorstore, ivf, truth, search_ids))
+        modes[index_type] = mode
+    return {"k": _RECALL_K, "queries": len(queries), "docs": exact.index.ntotal, "modes": modes}
+
+
+def _nprobe_sweep(vectorstore, ivf, truth, search_ids):
+    """nprobe별 flat 대비 recall@k와, 목표 recall에 닿는 가장 작은 nprobe (검색 후 기본 nprobe로 되돌림)."""
+    default_nprobe = ivf.nprobe
+    sweep = {}
+    for nprobe in sorted({n for n in _NPROBE_SWEEP if n < ivf.nlist} | {ivf.nlist}):
+        vi.tune_search(vectorstore.index, nprobe)
+        sweep[nprobe] = round(vi.recall_at_k(truth, search_ids(vectorstore)), 4)
+    vi.tune_search(vectorstore.index, default_nprobe)
+    calibrated = next((n for n, recall in sweep.items() if recall >= _NPROBE_TARGET_RECALL), ivf.nlist)
+    return {"nlist": ivf.nlist, "nprobe": default_nprobe, "nprobe_recall": sweep, "nprobe_calibrated": calibrated}
+
+
+def embedding_questions(vectorstore, count=_DEFAULT_EMBEDDING_QUESTIONS):
+    """
+    인덱스의 행 문서에서 고르게 골라 만든 고정 질문 목록 [(질문, 정답 문서 ID 집합)].
+    선수 질문은 같은 이름의 행 전체가, 팀 질문은 같은 팀/같은 투타 행 전체가 정답입니다.
+    질문 형식은 행 순서대로 돌아가며 정하므로 같은 CSV면 항상 같은 목록입니다.
+    """
+    docs = [(doc_id, vectorstore.docstore.search(doc_id)) for doc_id in vectorstore.index_to_docstore_id.values()]
+    docs = [(doc_id, doc) for doc_id, doc in docs if isinstance(doc, Document) and doc.metadata.get("Name")]
+    by_name, by_team = {}, {}
+    for doc_id, doc in docs:
+        by_name.setdefault(doc.metadata["Name"], set()).add(doc_id)
+        by_team.setdefault((doc.metadata.get("Team"), doc.metadata.get("table")), set()).add(doc_id)
+    templates = [
+        lambda m: (f"{m['Name']} 선수 기록 알려줘", by_name[m["Name"]]),
+        lambda m: (f"{m['Team']} {m['Name']} 요즘 어때?", by_name[m["Name"]]),
+        lambda m: (f"{m['Name']}의 이번 시즌 성적은?", by_name[m["Name"]]),
+        lambda m: (f"{m['Team']} {_TABLE_WORDS.get(m.get('table'), '선수')} 중에 누가 잘해?",
+                   by_team[(m.get("Team"), m.get("table"))]),
+    ]
+    step = max(1, len(docs) // count) if count else len(docs) + 1
+    return [templates[i % len(templates)](doc.metadata) for i, (_, doc) in enumerate(docs[::step][:count])]
+
+
+def _bench_embeddings(backends, data_dir, providers, repeat, live_openai=False, openai_model=None):
+    """
+    임베딩 제공자별 인덱스 생성 시간, 질의 임베딩/검색 지연, 고정 질문 목록의 검색 품질을 비교합니다.
+    이름 역색인/샤드를 거치지 않은 밀집 검색만 재므로 임베딩 자체의 차이가 드러납니다.
+    """
+    result = {"k": _RECALL_K, "providers": {}}
+    questions = None
+    for provider in providers:
+        ep.check_provider(provider)
+        if provider == ep.OPENAI and live_openai:
+            ga.configure_backends(csv_directory=data_dir, **dict(backends, embeddings=None, embedding_model=openai_model))
+        else:
+            ga.configure_backends(csv_directory=data_dir, **backends)
+        index_path = os.path.join(backends["index_dir"], vi.index_subdir(vi.DEFAULT_INDEX_TYPE, provider))
+        shutil.rmtree(index_path, ignore_errors=True)
+        try:
+            vectorstore, elapsed = _timed(ga._create_or_load_vectorstore, data_dir, vi.DEFAULT_INDEX_TYPE, provider)
+        except Exception as e:
+            result["providers"][provider] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        if questions is None:
+            questions = embedding_questions(vectorstore)  # 모든 제공자가 같은 질문 목록을 씀 (문서 ID가 같음)
+        embeddings = ga._get_embeddings(provider)
+        entry = {
+            "embedding_model": ep.model_name(provider, ga._EMBEDDING_MODEL),
+            "dimensions": vectorstore.index.d,
+            "build": {"ms": round(elapsed * 1000, 2), "docs": vectorstore.index.ntotal,
+                      "index_bytes": vi.index_file_bytes(index_path)},
+        }
+        # 질의 임베딩 캐시(같은 턴 재사용용)에 걸리지 않도록 반복마다 질문 끝에 공백 수를 바꿔 붙임
+        embed_samples, search_samples, rankings = [], [], []
+        for round_index in range(repeat):
+            for question, _ in questions:
+                vector, elapsed = _timed(embeddings.embed_query, question + " " * round_index)
+                embed_samples.append(elapsed)
+                docs, elapsed = _timed(vectorstore.similarity_search_by_vector, vector, k=_RECALL_K)
+                search_samples.append(elapsed)
+                if round_index == 0:
+                    rankings.append([doc.id for doc in docs])
+        entry["embed_query"] = _summarize(embed_samples)
+        entry["search"] = _summarize(search_samples)
+        hits, found, reciprocal = 0, 0, 0.0
+        for (_, relevant), ranking in zip(questions, rankings):
+            ranks = [rank for rank, doc_id in enumerate(ranking, 1) if doc_id in relevant]
+            hits += bool(ranks and ranks[0] == 1)
+            found += bool(ranks)
+            reciprocal += 1.0 / ranks[0] if ranks else 0.0
+        entry["quality"] = {"questions": len(questions), "hit_at_1": round(hits / len(questions), 4),
+                            f"recall_at_{_RECALL_K}": round(found / len(questions), 4),
+                            "mrr": round(reciprocal / len(questions), 4)}
+        result["providers"][provider] = entry
+    ga.configure_backends(**backends)
+    return result
+
+
+def _bench_tts(workspace, repeat):
+    SpeakAnswer.configure_backend(_FakeSpeechClient(FakeTTSBackend()), cache_dir=os.path.join(workspace, "tts_cache"))
+    result = {}
+    samples = [_timed(normalize_for_tts, _SAMPLE_ANSWER)[1] for _ in range(repeat * 50)]
+    result["normalize_for_tts"] = _summarize(samples)
+    text = normalize_for_tts(_SAMPLE_ANSWER)
+    misses = [_timed(SpeakAnswer.generate_tts_bytes, f"{text} ({i})")[1] for i in range(repeat)]
+    hits = [_timed(SpeakAnswer.generate_tts_bytes, f"{text} ({i})")[1] for i in range(repeat)]
+    result["generate_tts_bytes_miss"] = _summarize(misses)
+    result["generate_tts_bytes_hit"] = _summarize(hits)
+    return result
+
+
+def _fresh_process_ms(code, env=None):
+    """새 인터프리터에서 code 실행에 걸린 시간 (인터프리터 시작 제외, ms)."""
+    script = f"import time\n_t = time.perf_counter()\n{code}\nprint('MS', (time.perf_counter() - _t) * 1000)"
+    result = subprocess.run([sys.executable, "-c", script], cwd=_REPO_DIR, env=env, capture_output=True, text=True,
+                            timeout=300)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("MS "):
+            return float(line.split()[1])
+    raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "측정 실패")
+
+
+def _bench_startup(backends, data_dir, context_tokens, repeat):
+    """임포트 시간, app.py 첫 실행 시간, 첫 체인 준비 시간(예열 없음/예열 후)을 측정합니다."""
+    runs = max(1, min(repeat, _STARTUP_MAX_RUNS))
+    result = {}
+    for name, code in _STARTUP_IMPORTS.items():
+        try:
+            result[f"import_{name}"] = _summarize([_fresh_process_ms(code) / 1000 for _ in range(runs)])
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            result[f"import_{name}"] = {"error": str(e)}
+    # 첫 화면: AppTest로 app.py를 한 번 실행 (API 키 없이 실행해 예열/네트워크 없이 스크립트 자체 시간만)
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    code = "from streamlit.testing.v1 import AppTest\nAppTest.from_file('app.py', default_timeout=120).run()"
+    try:
+        result["app_first_run"] = _summarize([_fresh_process_ms(code, env) / 1000 for _ in range(runs)])
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        result["app_first_run"] = {"error": str(e)}
+
+    def first_chain():
+        return ga.initialize_qa_system("You are a baseball assistant.", 0.7, context_tokens,
+                                       embedding_provider=ep.OPENAI)
+
+    ga.configure_backends(csv_directory=data_dir, **backends)
+    cold, warm = [], []
+    for _ in range(repeat):
+        ga.invalidate_vectorstores()
+        cold.append(_timed(first_chain)[1])
+        ga.invalidate_vectorstores()
+        prewarm.start([(vi.DEFAULT_INDEX_TYPE, ep.OPENAI)]).wait()
+        warm.append(_timed(first_chain)[1])
+    result["first_chain_cold"] = _summarize(cold)
+    result["first_chain_prewarmed"] = _summarize(warm)
+    return result
+
+
+def _run_users(chains, rounds, ask):
+    """사용자마다 스레드 하나로 질문 목록을 rounds번 돌며 ask(사용자, 체인, 질문, timings)를 호출합니다."""
+    turns, first_tokens, errors = [], [], []
+    lock = threading.Lock()
+
+    def user(user_id, chain):
+        for _ in range(rounds):
+            for question in _QUESTIONS:
+                timings = {}
+                start = time.perf_counter()
+                try:
+                    ask(user_id, chain, question, timings)
+                except Exception as e:
+                    with lock:
+                        errors.append(type(e).__name__)
+                    continue
+                with lock:
+                    turns.append(time.perf_counter() - start)
+                    if "ttft" in timings:
+                        first_tokens.append(timings["ttft"])
+
+    threads = [threading.Thread(target=user, args=(f"user{i}", chain)) for i, chain in enumerate(chains)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return turns, first_tokens, errors, time.perf_counter() - start
+
+
+def _bench_service(backends, data_dir, workspace, users, repeat, llm_latency, token_latency):
+    """
+    users명이 동시에 질문(스트리밍 답변 + 답변 음성 합성)할 때, 세션 스레드가 직접 호출하는 경우("direct")와
+    backend_service를 거치는 경우("service")를 mock OpenAI 서버로 비교합니다. 임베딩은 대역 그대로 씁니다.
+    """
+    server = mock_openai.serve_mock_openai(0, first_token=llm_latency, token=token_latency, embedding=0.0,
+                                           speech=_SERVICE_SPEECH_LATENCY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    previous_http = openai_http.configure(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    result = {"users": users, "rounds": repeat}
+    try:
+        for mode in ("direct", "service"):
+            # 모드마다 답변/음성 캐시를 비워 같은 조건에서 시작 (LLM/TTS 클라이언트도 새 연결 풀로 다시 만듦)
+            ga.configure_backends(csv_directory=data_dir, **dict(backends, chat_model_factory=None))
+            SpeakAnswer.configure_backend(cache_dir=os.path.join(workspace, f"tts_cache_{mode}"))
+            chains = [ga.initialize_qa_system("You are a baseball assistant.", embedding_provider=ep.OPENAI)
+                      for _ in range(users)]
+            service = backend_service.BackendService() if mode == "service" else None
+
+            def ask(user_id, chain, question, timings):
+                if service is None:
+                    answer = "".join(ga.stream_answer(chain, question, timings))
+                    SpeakAnswer.generate_tts_bytes(f"{question} {answer}")
+                else:
+                    answer = "".join(service.stream_answer(user_id, chain, question, timings))
+                    service.generate_tts_bytes(user_id, f"{question} {answer}")
+
+            before = server.counters.snapshot()
+            try:
+                turns, first_tokens, errors, elapsed = _run_users(chains, repeat, ask)
+                stats = service.stats() if service else {}
+            finally:
+                if service:
+                    service.close()
+            after = server.counters.snapshot()
+            entry = {
+                "turn": _summarize(turns) if turns else {"error": "완료된 턴 없음"},
+                "first_token": _summarize(first_tokens) if first_tokens else {"error": "측정값 없음"},
+                "throughput_turns_per_s": round(len(turns) / elapsed, 2) if elapsed else 0.0,
+                "errors": len(errors),
+                "openai_requests": after["requests"] - before["requests"],
+                "openai_connections": after["connections"] - before["connections"],
+                "openai_max_concurrent": after["max_concurrent"],
+            }
+            if stats:
+                entry.update(coalesced=stats["coalesced"], rejected=stats["rejected"], peak_active=stats["peak_active"])
+            result[mode] = entry
+    finally:
+        openai_http.configure(**previous_http)
+        server.shutdown()
+        server.server_close()
+    return result
+
+
+def run_benchmark(context_budgets, replica_counts, repeat=3, llm_latency=0.3, token_latency=0.01,
+                  embed_latency=0.05, workspace=None, index_types=vi.INDEX_TYPES,
+                  recall_queries=_DEFAULT_RECALL_QUERIES, service_users=_DEFAULT_SERVICE_USERS,
+                  embedding_providers=ep.PROVIDERS, live_openai_embeddings=False):
+    """벤치마크 행렬을 실행하고 보고서 딕셔너리를 반환합니다."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")  # initialize_qa_system의 키 검사 통과용
+    own_workspace = workspace is None
+    workspace = workspace or tempfile.mkdtemp(prefix="onedayai-bench-")
+    embeddings = FakeEmbeddings(latency_per_call=embed_latency)
+    backends = {
+        "embeddings": embeddings,
+        "embedding_model": f"fake-hash-{embeddings.dim}",
+        "chat_model_factory": lambda temperature, model_name, streaming: FakeChatModel(
+            streaming=streaming, first_token_latency=llm_latency, token_latency=token_latency),
+        "index_dir": os.path.join(workspace, "indices"),
+        "embedding_cache_dir": os.path.join(workspace, "embedding_cache"),
+    }
+    previous = ga.configure_backends(**backends)
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "fake_latency": {"llm_first_token_s": llm_latency, "llm_token_s": token_latency,
+                             "embed_call_s": embed_latency},
+        },
+        "cells": [],
+        "index_modes": [],
+        "embeddings": [],
+    }
+    try:
+        for replicas in replica_counts:
+            data_dir = os.path.join(workspace, f"data_x{replicas}")
+            rows = replicate_csvs(_SOURCE_CSV_DIR, data_dir, replicas)
+            for context_tokens in context_budgets:
+                print(f"측정 중: 행 {rows}개 (x{replicas}), context_tokens={context_tokens}")
+                cell = {"replicas": replicas, "rows": rows, "context_tokens": context_tokens}
+                cell["stages"] = _bench_cell(backends, data_dir, context_tokens, embeddings, repeat)
+                report["cells"].append(cell)
+            if index_types:
+                print(f"인덱스 종류별 측정 중: 행 {rows}개 (x{replicas}), {', '.join(index_types)}")
+                entry = {"replicas": replicas, "rows": rows}
+                entry.update(_bench_index_modes(backends, data_dir, index_types, recall_queries, repeat))
+                report["index_modes"].append(entry)
+            if embedding_providers:
+                print(f"임베딩 제공자별 측정 중: 행 {rows}개 (x{replicas}), {', '.join(embedding_providers)}")
+                entry = {"replicas": replicas, "rows": rows}
+                entry.update(_bench_embeddings(backends, data_dir, embedding_providers, repeat,
+                                               live_openai_embeddings, previous["embedding_model"]))
+                report["embeddings"].append(entry)
+        report["tts"] = _bench_tts(workspace, repeat)
+        print("시작 시간 측정 중: 임포트, app.py 첫 실행, 첫 체인 준비 (예열 전/후)")
+        report["startup"] = _bench_startup(backends, data_dir, context_budgets[0], repeat)
+        if service_users:
+            print(f"동시 사용자 측정 중: {service_users}명, 직접 호출 vs backend_service (mock OpenAI 서버)")
+            report["service"] = _bench_service(backends, data_dir, workspace, service_users, repeat,
+                                               llm_latency, token_latency)
+    finally:
+        ga.configure_backends(**previous)
+        SpeakAnswer.configure_backend()
+        if own_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return report
+
+
+def _stage_times(report):
+    """비교용 평면 목록: {(셀 이름, 단계): 대표 ms (p50 또는 ms)}."""
+    times = {}
+    sections = [(f"x{c['replicas']}/k{c['context_tokens']}", c["stages"]) for c in report.get("cells", [])]
+    for entry in report.get("index_modes", []):
+        for index_type, mode in entry["modes"].items():
+            sections.append((f"x{entry['replicas']}/{index_type}", mode))
+    for entry in report.get("embeddings", []):
+        for provider, values in entry["providers"].items():
+            sections.append((f"x{entry['replicas']}/embed-{provider}", values))
+    sections.append(("tts", report.get("tts", {})))
+    sections.append(("startup", report.get("startup", {})))
+    for mode in ("direct", "service"):
+        if mode in report.get("service", {}):
+            sections.append((f"service/{mode}", report["service"][mode]))
+    for name, stages in sections:
+        for stage, values in stages.items():
+            if isinstance(values, dict):
+                times[(name, stage)] = values.get("p50_ms", values.get("ms"))
+    return times
+
+
+def compare_reports(baseline, current, threshold=_REGRESSION_THRESHOLD):
+    """기준 보고서보다 threshold 비율 이상 느려진 단계 목록을 반환합니다."""
+    old_times, regressions = _stage_times(baseline), []
+    for key, new_ms in _stage_times(current).items():
+        old_ms = old_times.get(key)
+        if old_ms and new_ms is not None and new_ms > old_ms * (1 + threshold):
+            regressions.append((key, old_ms, new_ms))
+    return regressions
+
+
+def _print_report(report):
+    for cell in report["cells"]:
+        stages = cell["stages"]
+        print(f"x{cell['replicas']:<3} 행 {cell['rows']:>6} k{cell['context_tokens']:<5} "
+              f"컨텍스트 {stages['context']['docs']:>5.1f}개/{stages['context']['tokens']:>6.0f}토큰  "
+              f"생성 {stages['build']['ms']:>9.1f}ms  재로드 {stages['reload_unchanged']['ms']:>8.1f}ms  "
+              f"load_local {stages['load_local']['p50_ms']:>7.1f}ms  검색 {stages['retrieval']['p50_ms']:>6.1f}ms  "
+              f"get_answer {stages['get_answer']['p50_ms']:>7.1f}ms  첫 토큰 {stages['stream_first_token']['p50_ms']:>7.1f}ms")
+    for entry in report.get("index_modes", []):
+        print(f"x{entry['replicas']:<3} 문서 {entry['docs']:>6} 인덱스 종류별 (질의 {entry['queries']}개, recall@{entry['k']}):")
+        for index_type, mode in entry["modes"].items():
+            print(f"  {index_type:<5} recall {mode['recall_at_k']:.3f}  검색 {mode['search']['p50_ms']:>6.2f}ms  "
+                  f"로드 {mode['mmap_load']['p50_ms']:>7.1f}ms  파일 {mode['index_bytes'] / 1024:>9.1f}KB  "
+                  f"생성 {mode['build']['ms']:>8.1f}ms" + ("" if mode["built_as"] == index_type else f"  ({mode['built_as']}로 생성)"))
+            if "nprobe_recall" in mode:
+                sweep = "  ".join(f"{n}:{recall:.3f}" for n, recall in mode["nprobe_recall"].items())
+                print(f"        nlist {mode['nlist']} nprobe {mode['nprobe']} (recall {_NPROBE_TARGET_RECALL} 이상: "
+                      f"nprobe {mode['nprobe_calibrated']})  nprobe별 recall {sweep}")
+    for entry in report.get("embeddings", []):
+        print(f"x{entry['replicas']:<3} 행 {entry['rows']:>6} 임베딩 제공자별 (밀집 검색만, k={entry['k']}):")
+        for provider, values in entry["providers"].items():
+            if "error" in values:
+                print(f"  {provider:<6} 측정 실패 ({values['error']})")
+                continue
+            quality = values["quality"]
+            recall = quality[f"recall_at_{entry['k']}"]
+            print(f"  {provider:<6} {values['embedding_model']:<24} hit@1 {quality['hit_at_1']:.3f}  "
+                  f"recall@{entry['k']} {recall:.3f}  MRR {quality['mrr']:.3f}  "
+                  f"질의 임베딩 {values['embed_query']['p50_ms']:>7.2f}ms  검색 {values['search']['p50_ms']:>6.2f}ms  "
+                  f"생성 {values['build']['ms']:>8.1f}ms")
+    for stage, values in report.get("tts", {}).items():
+        print(f"{stage}: p50 {values['p50_ms']:.2f}ms (n={values['n']})")
+    for stage, values in report.get("startup", {}).items():
+        print(f"{stage}: " + (f"p50 {values['p50_ms']:.1f}ms (n={values['n']})" if "p50_ms" in values
+                              else f"측정 실패 ({values['error']})"))
+    service = report.get("service")
+    for mode in ("direct", "service") if service else ():
+        entry = service[mode]
+        turn, first_token = entry["turn"], entry["first_token"]
+        print(f"동시 {service['users']}명 {mode:<7} 턴 p50 {turn.get('p50_ms', 0):>7.1f}ms p95 {turn.get('p95_ms', 0):>7.1f}ms  "
+              f"첫 토큰 p50 {first_token.get('p50_ms', 0):>7.1f}ms  처리량 {entry['throughput_turns_per_s']:.1f}턴/초  "
+              f"OpenAI 요청 {entry['openai_requests']} / 연결 {entry['openai_connections']}  오류 {entry['errors']}"
+              + (f"  합침 {entry['coalesced']} 거절 {entry['rejected']} 최대 동시 {entry['peak_active']}"
+                 if "coalesced" in entry else ""))
+
+
+def _parse_ints(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 호출 없이 단계별 지연 시간을 측정합니다.")
+    parser.add_argument("--context-tokens", default=_DEFAULT_CONTEXT_TOKENS, help="컨텍스트 토큰 예산 목록 (쉼표 구분)")
+    parser.add_argument("--replicas", default=_DEFAULT_REPLICAS, help="데이터 복제 배수 목록 (쉼표 구분)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="대역 LLM의 첫 토큰 지연 (초)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="대역 LLM의 토큰당 지연 (초)")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="대역 임베딩의 호출당 지연 (초)")
+    parser.add_argument("--index-types", default=",".join(vi.INDEX_TYPES),
+                        help="recall/지연을 비교할 인덱스 종류 목록 (쉼표 구분, 빈 문자열이면 생략)")
+    parser.add_argument("--recall-queries", type=int, default=_DEFAULT_RECALL_QUERIES,
+                        help="recall 측정에 질문 목록 외에 추가로 쓸 문서 샘플 질의 수")
+    parser.add_argument("--service-users", type=int, default=_DEFAULT_SERVICE_USERS,
+                        help="동시 사용자 측정의 사용자 수 (mock OpenAI 서버, 0이면 생략)")
+    parser.add_argument("--embedding-providers", default=",".join(ep.PROVIDERS),
+                        help="검색 품질/지연을 비교할 임베딩 제공자 목록 (쉼표 구분, 빈 문자열이면 생략)")
+    parser.add_argument("--live-openai-embeddings", action="store_true",
+                        help="openai 제공자를 대역 대신 실제 임베딩 API로 측정 (API 키와 네트워크 필요)")
+    parser.add_argument("-o", "--output", default=_DEFAULT_REPORT)
+    parser.add_argument("--baseline", help="비교할 이전 보고서 (느려진 단계가 있으면 종료 코드 1)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        _parse_ints(args.context_tokens), _parse_ints(args.replicas),
+        repeat=args.repeat, llm_latency=args.llm_latency, token_latency=args.token_latency,
+        embed_latency=args.embed_latency, index_types=[x for x in args.index_types.split(",") if x],
+        recall_queries=args.recall_queries, service_users=args.service_users,
+        embedding_providers=[x for x in args.embedding_providers.split(",") if x],
+        live_openai_embeddings=args.live_openai_embeddings,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    _print_report(report)
+    print(f"보고서 저장: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_reports(json.load(f), report)
+        for (cell, stage), old_ms, new_ms in regressions:
+            print(f"느려짐: {cell} {stage} {old_ms:.1f}ms -> {new_ms:.1f}ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# chain_builder.py (설정 변경 시 QA 체인을 백그라운드에서 다시 만드는 작업 큐: 디바운스, 요청 합치기, 진행률/ETA)
+#
+# 설정을 바꿀 때마다 Streamlit 스크립트 스레드에서 initialize_qa_system을 바로 실행하면 (인덱스가 없으면
+# 전체 생성까지) 화면이 멈췄습니다. 이제 설정 변경은 ChainBuilder.request로 요청만 남깁니다.
+#   - 디바운스: 마지막 요청 후 debounce초 동안 새 요청이 없을 때만 작업을 시작 (슬라이더를 끄는 동안 한 번만 재생성)
+#   - 합치기: 같은 설정의 작업이 진행 중이면 새로 만들지 않고, 가장 오래 걸리는 인덱스 준비는
+#     (인덱스 종류, 임베딩 제공자)별로 모든 세션이 작업 하나를 공유
+#   - 교체: 새 체인이 준비될 때까지 세션은 이전 체인으로 계속 답변하고, 준비되면 한 번에 바꿈
+# 진행률/ETA는 단계(대기 -> 인덱스 준비 -> 체인 생성)별 과거 소요 시간의 지수 이동 평균으로 추정합니다.
+#
+# 환경 변수:
+#   ONEDAYAI_REBUILD_DEBOUNCE  디바운스 시간 (초, 기본 0.8)
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_DEBOUNCE_SECONDS = float(os.environ.get("ONEDAYAI_REBUILD_DEBOUNCE", "0.8"))
+_MAX_CHAIN_WORKERS = 4  # 동시에 만들 체인 수 (세션 수와 무관)
+_MAX_INDEX_WORKERS = 2  # 동시에 준비할 인덱스 종류 수
+_DEFAULT_ESTIMATES = {"index": 10.0, "chain": 0.5}  # 기록이 없을 때 단계별 예상 소요 시간 (초)
+_ESTIMATE_WEIGHT = 0.3  # 새 소요 시간의 지수 이동 평균 가중치
+_STAGE_LABELS = {"debounce": "설정 변경 대기", "index": "인덱스 준비", "chain": "체인 생성"}
+
+
+def index_key(config):
+    """설정 딕셔너리에서 인덱스를 구분하는 (index_type, embedding_provider)."""
+    return config.get("index_type"), config.get("embedding_provider")
+
+
+class ChainSlot:
+    """
+    세션 하나의 활성 체인. chain/config는 지금 답변에 쓰는 체인과 그 설정, wanted는 마지막으로 요청된 설정입니다.
+    generation은 체인이 바뀔 때마다 늘어납니다 (화면 갱신 판단용).
+    """
+
+    def __init__(self):
+        self.chain = None
+        self.config = None
+        self.wanted = None
+        self.requested_at = None
+        self.job = None
+        self.error = None
+        self.generation = 0
+        self._timer = None
+
+    @property
+    def busy(self):
+        return self._timer is not None or self.job is not None
+
+
+class _BuildJob:
+    def __init__(self, config):
+        self.config = config
+        self.stage = "index"
+        self.stage_started = time.perf_counter()
+
+
+class ChainBuilder:
+    """
+    프로세스 전역 체인 재생성 큐 (모든 세션 공유). prepare_index(index_type, embedding_provider)는 인덱스를
+    프로세스 전역 캐시에 올리고, create_chain(config)는 설정 딕셔너리로 체인을 만듭니다 (실패 시 None 또는 예외).
+    is_index_ready(index_type, embedding_provider)가 True면 인덱스 단계를 건너뜁니다.
+    """
+
+    def __init__(self, prepare_index, create_chain, is_index_ready=None, debounce=_DEBOUNCE_SECONDS):
+        self._prepare_index = prepare_index
+        self._create_chain = create_chain
+        self._is_index_ready = is_index_ready or (lambda index_type, embedding_provider: False)
+        self.debounce = debounce
+        self._chain_executor = ThreadPoolExecutor(max_workers=_MAX_CHAIN_WORKERS, thread_name_prefix="chain-build")
+        self._index_executor = ThreadPoolExecutor(max_workers=_MAX_INDEX_WORKERS, thread_name_prefix="index-build")
+        self._lock = threading.Lock()
+        self._index_jobs = {}  # index_key -> 진행 중인 인덱스 준비 Future
+        self._estimates = {}  # (단계, index_key) -> 예상 소요 시간 (초)
+
+    def request(self, slot, config, replace=False, debounce=None):
+        """
+        slot의 체인을 config로 다시 만들도록 요청합니다. replace=True면 이전 체인을 바로 내려놓습니다
+        (다른 캐릭터의 체인으로 답변하면 안 되는 경우). debounce가 0이면 바로 시작합니다.
+        """
+        delay = self.debounce if debounce is None else debounce
+        with self._lock:
+            if replace:
+                slot.chain = slot.config = None
+            slot.wanted = config
+            slot.error = None
+            if slot._timer is not None:
+                slot._timer.cancel()
+                slot._timer = None
+            if config == slot.config or (slot.job is not None and slot.job.config == config):
+                return  # 이미 쓰는 설정으로 되돌렸거나, 같은 설정을 만드는 중 (합치기)
+            slot.requested_at = time.perf_counter()
+            if delay > 0:
+                slot._timer = threading.Timer(delay, self._start, args=(slot, config))
+                slot._timer.daemon = True
+                slot._timer.start()
+                return
+        self._start(slot, config)
+
+    def _start(self, slot, config):
+        with self._lock:
+            if slot.wanted != config:
+                return  # 디바운스 중 다른 설정이 요청됨
+            slot._timer = None
+            if slot.job is not None:
+                return  # 진행 중인 작업이 끝나면 _finish가 wanted를 이어서 시작
+            job = slot.job = _BuildJob(config)
+        self._chain_executor.submit(self._run, slot, job)
+
+    def _run(self, slot, job):
+        chain, error = None, None
+        try:
+            key = index_key(job.config)
+            if not self._is_index_ready(*key):
+                self._index_future(key).result()
+            job.stage, job.stage_started = "chain", time.perf_counter()
+            chain = self._create_chain(job.config)
+            if chain is None:
+                raise RuntimeError("QA 체인 생성 실패 (터미널 로그 확인)")
+            self._record("chain", key, time.perf_counter() - job.stage_started)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"[chain_builder] 체인 재생성 실패 {index_key(job.config)}: {error}")
+        self._finish(slot, job, chain, error)
+
+    def _finish(self, slot, job, chain, error):
+        restart = None
+        with self._lock:
+            slot.job = None
+            if slot.wanted == job.config:
+                if chain is not None:
+                    slot.chain, slot.config = chain, job.config
+                    slot.generation += 1
+                else:
+                    slot.error = error  # 이전 체인은 그대로 계속 사용
+            elif slot._timer is None and slot.wanted is not None and slot.wanted != slot.config:
+                restart = slot.wanted  # 작업 중 바뀐 설정 (디바운스는 이미 지남)
+        if restart is not None:
+            self._start(slot, restart)
+
+    def _index_future(self, key):
+        """인덱스 준비 작업 (같은 인덱스를 요청한 세션들이 하나를 공유)."""
+        with self._lock:
+            future = self._index_jobs.get(key)
+            if future is None:
+                future = self._index_executor.submit(self._prepare_index_timed, key)
+                self._index_jobs[key] = future
+        return future
+
+    def _prepare_index_timed(self, key):
+        start = time.perf_counter()
+        try:
+            self._prepare_index(*key)
+            self._record("index", key, time.perf_counter() - start)
+        finally:
+            with self._lock:
+                self._index_jobs.pop(key, None)
+
+    def _record(self, stage, key, seconds):
+        with self._lock:
+            previous = self._estimates.get((stage, key))
+            self._estimates[(stage, key)] = seconds if previous is None else (
+                _ESTIMATE_WEIGHT * seconds + (1 - _ESTIMATE_WEIGHT) * previous)
+
+    def _estimate(self, stage, key):
+        return self._estimates.get((stage, key), _DEFAULT_ESTIMATES[stage])
+
+    def progress(self, slot):
+        """
+        재생성 진행 상황 {"stage", "label", "fraction", "eta"(초)}. 진행 중인 작업이 없으면 None.
+        인덱스 준비는 다른 세션이 시작한 작업일 수 있어, 경과 시간은 요청 시각부터 셉니다.
+        """
+        with self._lock:
+            if not slot.busy:
+                return None
+            job, wanted, requested_at = slot.job, slot.wanted, slot.requested_at
+        now = time.perf_counter()
+        key = index_key(wanted or {})
+        index_left = 0.0 if self._is_index_ready(*key) else self._estimate("index", key)
+        chain_left = self._estimate("chain", key)
+        if job is None:
+            stage = "debounce"
+            remaining = max(0.0, self.debounce - (now - requested_at)) + index_left + chain_left
+        elif job.stage == "index":
+            stage = "index"
+            remaining = max(0.0, index_left - (now - job.stage_started)) + chain_left
+        else:
+            stage = "chain"
+            remaining = max(0.0, chain_left - (now - job.stage_started))
+        elapsed = now - (requested_at or now)
+        fraction = min(0.95, elapsed / (elapsed + remaining)) if elapsed + remaining > 0 else 0.0
+        return {"stage": stage, "label": _STAGE_LABELS[stage], "fraction": fraction, "eta": remaining}
@@ -0,0 +1,206 @@
+# chat_memory.py (토큰 예산이 있는 대화 메모리: 최근 N턴은 그대로, 오래된 턴은 백그라운드에서 요약)
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from pydantic import Field, PrivateAttr
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import SystemMessage, get_buffer_string
+
+import tracing
+
+_DEFAULT_TOKEN_LIMIT = 1200  # 프롬프트에 넣을 대화 기록의 최대 토큰 수
+_DEFAULT_KEEP_TURNS = 3  # 요약하지 않고 그대로 유지할 최근 턴 수 (1턴 = 질문 + 답변)
+_TOKENIZER_ENCODING = "o200k_base"  # gpt-4o 계열 토크나이저
+
+_SUMMARY_PROMPT = """다음은 사용자와 야구 데이터 챗봇의 이전 대화 요약과, 요약에 새로 합칠 대화입니다.
+선수/팀 이름, 언급된 수치, 사용자가 관심을 보인 주제를 보존하여 한국어로 간결하게 갱신된 요약만 작성하세요.
+
+이전 요약:
+{summary}
+
+새 대화:
+{new_lines}
+
+갱신된 요약:"""
+
+# 갱신된 요약이 예산(max_token_limit의 절반)을 넘으면 잘라내지 않고 더 짧게 다시 요약
+_COMPACT_PROMPT = """다음은 사용자와 야구 데이터 챗봇의 대화 요약입니다. 너무 길어 약 {max_tokens}토큰 이내로 줄여야 합니다.
+선수/팀 이름과 언급된 수치를 우선 보존하고, 덜 중요한 세부 사항은 빼서 한국어로 다시 요약하세요.
+
+요약:
+{summary}
+
+줄인 요약:"""
+_MAX_COMPACT_ATTEMPTS = 2
+
+# 요약은 답변 경로 밖에서 실행 (프로세스 전체 공유)
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """tiktoken으로 토큰 수를 셉니다. 토크나이저를 쓸 수 없으면 글자 수로 근사합니다 (한국어 기준 약 2자당 1토큰)."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(_TOKENIZER_ENCODING)
+                except Exception as e:
+                    print(f"토크나이저 로드 실패, 글자 수로 토큰 수를 근사합니다: {e}")
+                    _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 1) // 2
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    ConversationBufferMemory 대체용 메모리. 프롬프트에 들어가는 대화 기록을 max_token_limit 토큰 이하로 제한합니다.
+    최근 keep_last_turns 턴은 원문 그대로 두고, 그보다 오래된 턴은 요약되지 않은 기록이 예산의 절반을 넘을 때
+    백그라운드 스레드에서 누적 요약에 합칩니다. 요약이 끝나기 전에도 예산을 넘는 오래된 메시지는 프롬프트에서 빼므로
+    답변 지연에는 영향을 주지 않습니다. 요약이 반영되면 요약에 합쳐진 메시지는 chat_memory에서 지워
+    세션 메모리가 대화 길이와 상관없이 (요약 + 최근 몇 턴) 크기로 유지됩니다.
+    메시지별 토큰 수는 save_context에서 한 번만 세어 두고, last_stats에 직전 턴에서 절약한 토큰 수를 기록합니다.
+    """
+
+    llm: BaseLanguageModel
+    memory_key: str = "chat_history"
+    max_token_limit: int = _DEFAULT_TOKEN_LIMIT
+    keep_last_turns: int = _DEFAULT_KEEP_TURNS
+    summary: str = ""
+    summarized_messages: int = 0  # 요약에 합쳐져 chat_memory에서 지운 메시지 수 (누적)
+    last_stats: dict = Field(default_factory=dict)
+
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _message_tokens: list = PrivateAttr(default_factory=list)  # chat_memory.messages와 같은 순서의 메시지별 토큰 수
+    _history_tokens: int = PrivateAttr(default=0)  # 지금까지 저장된 모든 메시지(요약된 것 포함)의 토큰 합
+    _summary_tokens: int = PrivateAttr(default=0)
+    _pending: Optional[Any] = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)  # clear() 이후 끝난 이전 요약 결과를 버리기 위한 세대 번호
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def _message_token_counts(self):
+        """메시지별 토큰 수 (lock 안에서 호출). chat_memory를 밖에서 직접 고쳤으면 다시 셉니다."""
+        messages = self.chat_memory.messages
+        if len(self._message_tokens) != len(messages):
+            self._message_tokens = [count_tokens(message.content) for message in messages]
+        return self._message_tokens
+
+    def load_memory_variables(self, inputs):
+        with self._lock:
+            messages = list(self.chat_memory.messages)
+            token_counts = list(self._message_token_counts())
+            summary, summary_tokens, folded = self.summary, self._summary_tokens, self.summarized_messages
+            full_tokens = max(self._history_tokens, sum(token_counts))
+
+        budget = self.max_token_limit
+        selected = []
+        if summary:
+            summary_message = SystemMessage(content=f"이전 대화 요약: {summary}")
+            used = summary_tokens
+        else:
+            summary_message, used = None, 0
+
+        for message, tokens in zip(reversed(messages), reversed(token_counts)):
+            if used + tokens > budget:
+                break
+            selected.append(message)
+            used += tokens
+        selected.reverse()
+        if summary_message is not None:
+            selected.insert(0, summary_message)
+
+        self.last_stats = {
+            "history_tokens": full_tokens,
+            "prompt_tokens": used,
+            "saved_tokens": max(0, full_tokens - used),
+            "summarized_turns": folded // 2,
+        }
+        tracing.annotate(memory_tokens=used, memory_tokens_saved=self.last_stats["saved_tokens"])
+
+        if self.return_messages:
+            return {self.memory_key: selected}
+        return {self.memory_key: get_buffer_string(selected)}
+
+    def save_context(self, inputs, outputs):
+        with self._lock:
+            token_counts = self._message_token_counts()
+            added = len(self.chat_memory.messages)
+            super().save_context(inputs, outputs)
+            for message in self.chat_memory.messages[added:]:
+                tokens = count_tokens(message.content)
+                token_counts.append(tokens)
+                self._history_tokens += tokens
+        self._maybe_summarize()
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self.summarized_messages = 0
+            self.last_stats = {}
+            self._message_tokens = []
+            self._history_tokens = 0
+            self._summary_tokens = 0
+            self._generation += 1
+            self._pending = None
+
+    def _maybe_summarize(self):
+        """최근 N턴보다 오래된 요약 전 기록이 예산의 절반을 넘으면 백그라운드 요약을 시작합니다 (동시에 한 건)."""
+        with self._lock:
+            if self._pending is not None:
+                return
+            messages = self.chat_memory.messages
+            fold_end = len(messages) - self.keep_last_turns * 2
+            if fold_end <= 0:
+                return
+            if sum(self._message_token_counts()) <= self.max_token_limit // 2:
+                return
+            to_fold = messages[:fold_end]
+            generation = self._generation
+            pending = self._pending = _summary_executor.submit(self._summarize, self.summary, to_fold)
+        pending.add_done_callback(lambda future: self._on_summary_done(future, generation, fold_end))
+
+    def _summarize(self, summary, messages):
+        prompt = _SUMMARY_PROMPT.format(summary=summary or "(없음)", new_lines=get_buffer_string(messages))
+        new_summary = self._invoke(prompt)
+        limit = self.max_token_limit // 2
+        for _ in range(_MAX_COMPACT_ATTEMPTS):
+            if count_tokens(new_summary) <= limit:
+                break
+            new_summary = self._invoke(_COMPACT_PROMPT.format(max_tokens=limit, summary=new_summary))
+        return new_summary
+
+    def _invoke(self, prompt):
+        result = self.llm.invoke(prompt)
+        return getattr(result, "content", result).strip()
+
+    def _on_summary_done(self, future, generation, fold_end):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending = None
+            try:
+                new_summary = future.result()
+            except Exception as e:
+                print(f"대화 요약 실패 (다음 턴에 재시도): {e}")
+                return
+            # 요약 중에는 뒤에 메시지가 붙기만 하므로 앞쪽 fold_end개가 요약에 합친 메시지
+            token_counts = self._message_token_counts()
+            self.chat_memory.messages = self.chat_memory.messages[fold_end:]
+            self._message_tokens = token_counts[fold_end:]
+            self.summary = new_summary
+            self._summary_tokens = count_tokens(f"이전 대화 요약: {new_summary}")
+            self.summarized_messages += fold_end
+            print(f"대화 요약 갱신: {self.summarized_messages // 2}턴 요약됨 ({self._summary_tokens}토큰)")
+        self._maybe_summarize()
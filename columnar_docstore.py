@@ -0,0 +1,122 @@
+# columnar_docstore.py (pickle 없는 열 단위 docstore: 문서 ID/본문/메타데이터를 오프셋 색인 UTF-8 블롭으로 저장)
+#
+# 파일 구조 (docstore.bin, 리틀 엔디언):
+#   매직 8바이트 | 문서 수 n (uint64) | 오프셋 int64[3][n+1] | ID 블롭 | 본문 블롭 | 메타데이터(JSON) 블롭
+# 문서 i의 열 c는 파일의 [offsets[c][i], offsets[c][i+1]) 구간입니다. 문서 순서는 FAISS 인덱스의 벡터 순서와 같습니다.
+# 파일은 읽기 전용 메모리 매핑으로 열고 본문/메타데이터는 검색 결과로 필요할 때만 디코딩하므로,
+# 로드 시간과 메모리는 Python 객체 수가 아니라 문서 ID 목록 크기에 비례하고, 역직렬화로 코드가 실행될 위험도 없습니다.
+import os
+import json
+import mmap
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+_MAGIC = b"ODAIDOC1"
+_COLUMNS = 3  # ID, 본문, 메타데이터
+_ID, _TEXT, _METADATA = range(_COLUMNS)
+_HEADER_BYTES = len(_MAGIC) + 8
+
+
+def write_docstore(path, doc_ids, documents):
+    """doc_ids 순서대로 문서를 열 단위 파일로 씁니다 (원자적 교체는 호출자가)."""
+    columns = [
+        [doc_id.encode("utf-8") for doc_id in doc_ids],
+        [doc.page_content.encode("utf-8") for doc in documents],
+        [json.dumps(doc.metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for doc in documents],
+    ]
+    count = len(doc_ids)
+    offsets = np.zeros((_COLUMNS, count + 1), dtype="<i8")
+    position = _HEADER_BYTES + offsets.nbytes
+    for c, values in enumerate(columns):
+        offsets[c, 0] = position
+        offsets[c, 1:] = position + np.cumsum([len(value) for value in values], dtype=np.int64)
+        position = int(offsets[c, -1])
+    with open(path, "wb") as f:
+        f.write(_MAGIC)
+        f.write(np.uint64(count).astype("<u8").tobytes())
+        f.write(offsets.tobytes())
+        for values in columns:
+            f.writelines(values)
+
+
+class ColumnarDocstore(Docstore, AddableMixin):
+    """
+    메모리 매핑한 docstore.bin 위에 변경분(추가 문서, 삭제 ID)을 얹은 LangChain docstore.
+    증분 갱신 후 write_docstore로 다시 쓰면 변경분이 파일에 합쳐집니다.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._mmap = None
+        self._offsets = np.zeros((_COLUMNS, 1), dtype="<i8")
+        self._rows = {}  # 문서 ID -> 파일 안의 행 번호
+        self._added = {}  # 파일에 없는 (증분 갱신으로 추가된) 문서
+        self._deleted = set()
+        if path is not None:
+            self._open(path)
+
+    def _open(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < _HEADER_BYTES:
+                raise ValueError(f"docstore 파일이 손상되었습니다: {path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"docstore 파일 형식이 다릅니다: {path}")
+        count = int(np.frombuffer(self._mmap, dtype="<u8", count=1, offset=len(_MAGIC))[0])
+        self._offsets = np.frombuffer(self._mmap, dtype="<i8", count=_COLUMNS * (count + 1),
+                                      offset=_HEADER_BYTES).reshape(_COLUMNS, count + 1)
+        if int(self._offsets[-1, -1]) != len(self._mmap):
+            raise ValueError(f"docstore 파일 길이가 맞지 않습니다: {path}")
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._column_values(_ID))}
+
+    def _column_values(self, column):
+        bounds = self._offsets[column].tolist()
+        data = self._mmap
+        return [data[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+    def _value(self, column, row):
+        return self._mmap[int(self._offsets[column, row]):int(self._offsets[column, row + 1])].decode("utf-8")
+
+    def doc_ids(self):
+        """파일에 저장된 순서(인덱스 벡터 순서)의 문서 ID 목록 (변경분 제외)."""
+        return self._column_values(_ID) if self._mmap is not None else []
+
+    def search(self, search):
+        if search in self._added:
+            return self._added[search]
+        row = self._rows.get(search)
+        if row is None or search in self._deleted:
+            return f"ID {search} not found."
+        return Document(page_content=self._value(_TEXT, row), metadata=json.loads(self._value(_METADATA, row)),
+                        id=search)
+
+    def add(self, texts):
+        overlapping = {doc_id for doc_id in texts if doc_id in self._added
+                       or (doc_id in self._rows and doc_id not in self._deleted)}
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, doc in texts.items():
+            self._deleted.discard(doc_id)
+            self._added[doc_id] = doc
+
+    def delete(self, ids):
+        existing = [doc_id for doc_id in ids if doc_id in self._added
+                    or (doc_id in self._rows and doc_id not in self._deleted)]
+        if not existing:
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for doc_id in existing:
+            if self._added.pop(doc_id, None) is None:
+                self._deleted.add(doc_id)
+
+    def __len__(self):
+        return len(self._rows) - len(self._deleted) + len(self._added)
+
+    def resident_bytes(self):
+        """프로세스 메모리에 올라와 있는 대략의 크기 (문서 ID 색인 + 추가된 문서 본문). 매핑된 블롭은 제외."""
+        id_bytes = int(self._offsets[_ID, -1] - self._offsets[_ID, 0])
+        return id_bytes + sum(len(doc.page_content.encode("utf-8")) for doc in self._added.values())
+
+    def mapped_bytes(self):
+        return len(self._mmap) if self._mmap is not None else 0
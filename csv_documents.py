@@ -0,0 +1,61 @@
+# csv_documents.py (CSV 행 -> 검색 문서: 선수 한 명(행)당 문서 하나, 필요한 컬럼만 압축 직렬화)
+#
+# 예전에는 CSVLoader가 행마다 "컬럼: 값" 줄로 된 문서를 만들고 CharacterTextSplitter가 글자 수로 다시 잘라,
+# 청크 설정에 따라 한 선수가 여러 조각으로 나뉘거나 겹치는 조각이 중복 색인되었습니다.
+# 여기서는 행 하나가 문서 하나이고, 본문은 키 컬럼을 머리에 한 번만 쓰고 나머지는 "컬럼=값" 쌍으로 이어 붙입니다.
+#   문보경 (LG, 3B) 2025 타자 | G=20 oWAR=1.36 ... WAR=1.62
+# 빈 값과 WAR 계산용 중간값 컬럼(_OMIT_COLUMNS)은 넣지 않습니다 (통계 엔진은 CSV 전체를 그대로 씀).
+# 메타데이터는 Name/Team/Position/file(문자열)과 season/row(정수), table("batting"/"pitching")입니다.
+import os
+import csv
+
+from langchain_core.documents import Document
+
+import index_manifest as im
+import shard_index
+import stats_engine
+
+_KEY_COLUMNS = ("Name", "Team", "Position")
+# 답변에 거의 쓰이지 않고 WAR/wRC+로 요약되는 보정 중간값 (문서 길이만 늘림)
+_OMIT_COLUMNS = frozenset({"ePA", "R/ePA", "rRA", "rRA9", "rRA9pf"})
+_TABLE_LABELS = {"batting": "타자", "pitching": "투수"}
+_HEAD_SEPARATOR = " | "
+
+
+def serialize_row(fields, season=None, table=None):
+    """행(컬럼 -> 값)을 한 줄 문서 본문으로 직렬화합니다."""
+    name = fields.get("Name", "")
+    details = ", ".join(fields[column] for column in _KEY_COLUMNS[1:] if fields.get(column))
+    head = f"{name} ({details})" if details else name
+    context = " ".join(str(part) for part in (season, _TABLE_LABELS.get(table)) if part)
+    if context:
+        head = f"{head} {context}"
+    stats = " ".join(f"{column}={value}" for column, value in fields.items()
+                     if value and column not in _KEY_COLUMNS and column not in _OMIT_COLUMNS)
+    return f"{head.strip()}{_HEAD_SEPARATOR}{stats}" if stats else head.strip()
+
+
+def read_rows(csv_path):
+    """CSV를 (컬럼 -> 값) 딕셔너리 목록으로 읽습니다 (헤더/값 앞뒤 공백 제거)."""
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader, [])]
+        return [{column: value.strip() for column, value in zip(header, row)} for row in reader if any(row)]
+
+
+def load_row_documents(csv_path, file_name=None):
+    """
+    CSV 파일 하나를 [(행 키, Document)] 목록으로 만듭니다. 행 키는 index_manifest.row_keys_from_fields와 같으므로
+    순위가 바뀌어 행 순서가 달라져도 같은 선수는 같은 키(와 같은 docstore ID)를 가집니다.
+    """
+    file_name = file_name or os.path.basename(csv_path)
+    season = shard_index.file_season(file_name)
+    table = stats_engine.table_of_file(file_name)
+    rows = read_rows(csv_path)
+    keys = im.row_keys_from_fields((fields, i) for i, fields in enumerate(rows))
+    documents = []
+    for row_number, (key, fields) in enumerate(zip(keys, rows)):
+        metadata = {column: fields.get(column, "") for column in _KEY_COLUMNS}
+        metadata.update(file=file_name, source=csv_path, row=row_number, season=season, table=table)
+        documents.append((key, Document(page_content=serialize_row(fields, season, table), metadata=metadata)))
+    return documents
@@ -0,0 +1,38 @@
+# data_source.py (CSV 데이터 폴더 경로와 설명 문구)
+#
+# app.py가 데이터 봇 설명을 그릴 때 GetAnswer(LangChain 스택)를 임포트하지 않도록 폴더 경로와 CSV 개수 설명을
+# 이 가벼운 모듈에 둡니다. GetAnswer.configure_backends()가 폴더를 바꾸면 set_directory()로 함께 갱신합니다.
+import os
+import glob
+import functools
+
+DEFAULT_DIRECTORY = r"C:\Users\skku07\Documents\GitHub\OneDayAI\BaseballCSVs" # 실제 경로로 수정 필요
+_directory = DEFAULT_DIRECTORY
+
+
+def get_directory():
+    return _directory
+
+
+def set_directory(directory_path):
+    global _directory
+    _directory = directory_path
+
+
+def describe(directory_path=None):
+    """데이터 소스 디렉토리에 대한 설명을 반환합니다. 폴더가 바뀌지 않았으면(mtime) 이전 결과를 재사용합니다."""
+    directory_path = directory_path or _directory
+    try:
+        mtime = os.stat(directory_path).st_mtime_ns
+    except OSError:
+        return "CSV 데이터 폴더 기반 (경로 확인 필요)"
+    return _describe(directory_path, mtime)
+
+
+@functools.lru_cache(maxsize=4)
+def _describe(directory_path, mtime):
+    try:
+        csv_count = len(glob.glob(os.path.join(directory_path, '*.csv')))
+        return f"'{os.path.basename(directory_path)}' 폴더 내 {csv_count}개 CSV 데이터 기반"
+    except Exception:
+         return f"'{os.path.basename(directory_path)}' 폴더 데이터 기반"
@@ -0,0 +1,217 @@
+# embedding_cache.py (청크 설정이 달라도 재사용되는 디스크 임베딩 캐시)
+import os
+import json
+import time
+import atexit
+import weakref
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_DEFAULT_CACHE_DIR = "embedding_cache"
+_DEFAULT_MAX_ENTRIES = 200_000  # ada-002(1536차원) 기준 약 1.2GB
+_QUERY_MEMO_SIZE = 256  # 최근 질의 임베딩 (답변 캐시 조회와 검색기가 같은 질의를 두 번 임베딩하지 않도록)
+_GROW_ROWS = 1024  # 벡터 파일을 늘릴 때 최소 증가 단위(행)
+_VECTORS_FILENAME = "vectors.f32"
+_INDEX_FILENAME = "index.json"
+_LRU_FLUSH_INTERVAL = 60.0  # 적중만 있었던 호출의 LRU 순서 변경은 모아서 이 간격(초)마다, 그리고 종료 시 저장
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    임베딩 객체를 감싸 (모델 이름, 텍스트 해시) 기준으로 벡터를 디스크에 캐시합니다.
+    벡터는 memory-mapped float32 행렬(vectors.f32)에, 해시 -> 행 번호는 index.json에
+    LRU 순서로 저장되며, max_entries를 넘으면 가장 오래 쓰이지 않은 행을 재사용합니다.
+    index.json은 새 벡터가 저장됐을 때 바로 쓰고, 적중으로 바뀐 LRU 순서만 있으면 _LRU_FLUSH_INTERVAL마다
+    (또는 flush()/프로세스 종료 시) 씁니다. 파일 쓰기는 조회 잠금 밖에서 하므로 동시 조회를 막지 않습니다.
+    """
+
+    def __init__(self, underlying, model_name, cache_dir=_DEFAULT_CACHE_DIR, max_entries=_DEFAULT_MAX_ENTRIES):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        safe_name = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in model_name)
+        self._dir = os.path.join(cache_dir, safe_name)
+        self._vectors_path = os.path.join(self._dir, _VECTORS_FILENAME)
+        self._index_path = os.path.join(self._dir, _INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # index.json 쓰기 순서 보장 (조회 잠금과 분리)
+        self._dirty = False  # 저장되지 않은 LRU 순서 변경이 있는지
+        self._last_save = time.monotonic()
+        self._dim = None
+        self._slots = OrderedDict()  # 키 -> 행 번호 (앞쪽일수록 오래 전에 사용)
+        self._free_slots = []
+        self._next_slot = 0
+        self._matrix = None
+        self._queries = OrderedDict()  # 질의 텍스트 -> 벡터 (메모리에만 보관)
+        self._load_index()
+        atexit.register(_flush_on_exit, weakref.ref(self))
+
+    # --- Embeddings 인터페이스 ---
+    def embed_documents(self, texts):
+        return self._embed(texts)
+
+    def embed_query(self, text):
+        # 질의는 매번 달라 디스크에 남기지 않고, 같은 턴 안의 재사용만 메모리에서 처리
+        with self._lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                return list(vector)
+        vector = self.underlying.embed_query(text)
+        with self._lock:
+            self._queries[text] = vector
+            while len(self._queries) > _QUERY_MEMO_SIZE:
+                self._queries.popitem(last=False)
+        return list(vector)
+
+    def flush(self):
+        """저장되지 않은 LRU 순서 변경을 index.json에 씁니다."""
+        if self._dirty:
+            self._save_index()
+
+    def stats(self):
+        """캐시 적중/미스 횟수와 적중률을 반환합니다."""
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # --- 내부 구현 ---
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _embed(self, texts):
+        keys = [self._key(text) for text in texts]
+        results = [None] * len(texts)
+        missing = OrderedDict()  # 키 -> 텍스트 (배치 내 중복 제거)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is not None:
+                    self._slots.move_to_end(key)
+                    results[i] = self._matrix[slot].tolist()
+                elif key not in missing:
+                    missing[key] = texts[i]
+            hit_count = sum(result is not None for result in results)
+            self.hits += hit_count
+            self.misses += len(texts) - hit_count
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            with self._lock:
+                for key, vector in fresh.items():
+                    self._store(key, vector)
+            self._save_index()
+            for i, key in enumerate(keys):
+                if results[i] is None:
+                    results[i] = list(fresh[key])
+        elif texts:
+            # 모두 적중: LRU 순서만 바뀌었으므로 매번 쓰지 않고 모아서 저장
+            self._dirty = True
+            if time.monotonic() - self._last_save >= _LRU_FLUSH_INTERVAL:
+                self._save_index()
+
+        if len(texts) > 1:
+            print(f"임베딩 캐시: 적중 {hit_count}개, 신규 임베딩 {len(missing)}개 (누적 적중률 {self.stats()['hit_rate']:.0%})")
+        return results
+
+    def _store(self, key, vector):
+        if self._dim is None:
+            self._dim = len(vector)
+        if len(vector) != self._dim:
+            raise ValueError(f"임베딩 차원이 캐시({self._dim})와 다릅니다: {len(vector)}")
+        if len(self._slots) >= self.max_entries:
+            _, evicted_slot = self._slots.popitem(last=False)
+            self._free_slots.append(evicted_slot)
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self._next_slot
+            self._next_slot += 1
+            self._ensure_rows(self._next_slot)
+        self._matrix[slot] = np.asarray(vector, dtype=np.float32)
+        self._slots[key] = slot
+
+    def _ensure_rows(self, rows):
+        """벡터 파일이 rows개 행을 담을 수 있도록 늘리고 memmap을 다시 엽니다."""
+        if self._matrix is not None and self._matrix.shape[0] >= rows:
+            return
+        current = self._matrix.shape[0] if self._matrix is not None else 0
+        target = min(max(rows, current * 2, _GROW_ROWS), max(self.max_entries, rows))
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        os.makedirs(self._dir, exist_ok=True)
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(target * self._dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(target, self._dim))
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("model") != self.model_name or not os.path.exists(self._vectors_path):
+            return
+        self._dim = data["dim"]
+        rows = os.path.getsize(self._vectors_path) // (self._dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self._dim))
+        self._slots = OrderedDict((key, slot) for key, slot in data["slots"] if slot < rows)
+        self._next_slot = min(data.get("next_slot", len(self._slots)), rows)
+        used = set(self._slots.values())
+        self._free_slots = [slot for slot in range(self._next_slot) if slot not in used]
+        # max_entries가 줄어든 경우 오래된 항목부터 정리
+        while len(self._slots) > self.max_entries:
+            _, evicted_slot = self._slots.popitem(last=False)
+            self._free_slots.append(evicted_slot)
+
+    def _save_index(self):
+        """벡터를 flush한 뒤 인덱스를 임시 파일 교체 방식으로 원자적으로 저장합니다 (잠금 밖에서 호출)."""
+        with self._save_lock:
+            with self._lock:
+                if self._matrix is None:
+                    return
+                self._matrix.flush()
+                data = {
+                    "model": self.model_name,
+                    "dim": self._dim,
+                    "next_slot": self._next_slot,
+                    "slots": list(self._slots.items()),
+                }
+                self._dirty = False
+                self._last_save = time.monotonic()
+            self._write_index(data)
+
+    def _write_index(self, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir, prefix=".index-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _flush_on_exit(ref):
+    cache = ref()
+    if cache is not None:
+        try:
+            cache.flush()
+        except OSError:
+            pass
@@ -0,0 +1,67 @@
+# embedding_providers.py (인덱스별로 고르는 임베딩 제공자: OpenAI API 또는 프로세스 안의 CPU 임베딩)
+#
+#   openai  text-embedding-ada-002 (인덱스 생성과 질문마다 API 호출, 디스크 임베딩 캐시 사용)
+#   ngram   해시 문자 n-gram (ngram_embeddings.py, 네트워크 없이 질문당 1ms 이하, 캐시 불필요)
+# 제공자는 인덱스 폴더 이름(vector_index.index_subdir)과 매니페스트("embedding_provider")에 기록되므로
+# 같은 인덱스 종류라도 제공자마다 따로 만들어지고, 검색 질의는 항상 인덱스를 만든 제공자로 임베딩됩니다.
+# 이 모듈은 이름/설정만 다루고 무거운 임포트(langchain_openai, numpy)는 create()에서 합니다 (app.py 첫 화면용).
+#
+# 환경 변수:
+#   ONEDAYAI_EMBEDDING_PROVIDER  기본 임베딩 제공자 (openai 또는 ngram, 기본 openai)
+#   ONEDAYAI_NGRAM_DIMENSIONS    ngram 임베딩 차원 수 (기본 1024)
+import os
+
+OPENAI = "openai"
+NGRAM = "ngram"
+PROVIDERS = (OPENAI, NGRAM)
+LABELS = {OPENAI: "OpenAI ada-002 (API)", NGRAM: "n-gram 해시 (로컬 CPU)"}
+
+# 답변 캐시 적중 기준 (질의 임베딩 코사인 유사도). 제공자마다 유사도 분포가 달라 따로 정합니다:
+# ada-002는 다른 질문도 0.8~0.9대라 0.95, n-gram은 글자가 겹치면 높게 나와 "한화 투수/타자" 같은 질문이 0.86이므로 0.92
+_CACHE_THRESHOLDS = {OPENAI: 0.95, NGRAM: 0.92}
+
+_NGRAM_DIMENSIONS = int(os.environ.get("ONEDAYAI_NGRAM_DIMENSIONS", "1024"))
+DEFAULT_PROVIDER = os.environ.get("ONEDAYAI_EMBEDDING_PROVIDER", OPENAI)
+if DEFAULT_PROVIDER not in PROVIDERS:
+    print(f"[embedding_providers] 알 수 없는 ONEDAYAI_EMBEDDING_PROVIDER={DEFAULT_PROVIDER}, {OPENAI} 사용")
+    DEFAULT_PROVIDER = OPENAI
+
+
+def check_provider(provider):
+    if provider not in PROVIDERS:
+        raise ValueError(f"알 수 없는 embedding_provider: {provider} (가능한 값: {', '.join(PROVIDERS)})")
+
+
+def resolve(provider=None):
+    """None이면 기본 제공자, 아니면 이름을 확인해 그대로 반환합니다."""
+    provider = provider or DEFAULT_PROVIDER
+    check_provider(provider)
+    return provider
+
+
+def is_remote(provider):
+    """API를 호출하는 제공자인지 (디스크 임베딩 캐시와 benchmark.py 대역 교체 대상)."""
+    return provider == OPENAI
+
+
+def cache_threshold(provider):
+    """이 제공자 임베딩으로 답변 캐시를 조회할 때의 유사도 기준."""
+    check_provider(provider)
+    return _CACHE_THRESHOLDS[provider]
+
+
+def model_name(provider, openai_model):
+    """인덱스 스키마/임베딩 캐시에서 쓰는 모델 이름 (차원이 바뀌면 이름도 바뀌어 인덱스를 다시 만듦)."""
+    if provider == NGRAM:
+        return f"hashed-ngram-{_NGRAM_DIMENSIONS}"
+    return openai_model
+
+
+def create(provider, openai_model, client_kwargs=None):
+    """제공자의 LangChain Embeddings 객체를 만듭니다. client_kwargs는 OpenAIEmbeddings에 넘길 연결 설정입니다."""
+    check_provider(provider)
+    if provider == NGRAM:
+        from ngram_embeddings import HashedNgramEmbeddings
+        return HashedNgramEmbeddings(dim=_NGRAM_DIMENSIONS)
+    from langchain_openai import OpenAIEmbeddings  # 첫 사용 시 임포트 (langchain_openai는 임포트만 약 2초)
+    return OpenAIEmbeddings(model=openai_model, **(client_kwargs or {}))
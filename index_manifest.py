@@ -0,0 +1,105 @@
+# index_manifest.py (FAISS 인덱스 옆에 저장되는 CSV 콘텐츠 지문 매니페스트)
+import os
+import csv
+import json
+import hashlib
+import tempfile
+
+MANIFEST_FILENAME = "manifest.json"
+# 문서 생성 방식(로더/분할/메타데이터)이 바뀌면 올려서 전체 재생성을 유도
+MANIFEST_VERSION = 2  # 2: 행당 문서 하나 (csv_documents), 청크 분할 없음
+
+# 행 식별에 사용할 컬럼 (순위가 바뀌어 행 순서가 달라져도 같은 선수로 인식)
+_ROW_KEY_COLUMNS = ("Name", "Team", "Position")
+
+
+def text_sha256(text):
+    """문자열의 SHA-256 해시(hex)를 반환합니다."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def ids_digest(doc_ids):
+    """문서 ID 집합의 지문. 인덱스 옆 부가 파일(이름 역색인, 샤드)이 인덱스와 맞는지 확인할 때 씁니다."""
+    return text_sha256("\n".join(sorted(doc_ids)))
+
+
+def file_sha256(path):
+    """파일 전체 내용의 SHA-256 해시(hex)를 반환합니다."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv_columns(path):
+    """CSV 헤더(컬럼 이름 목록)를 읽어 반환합니다."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), [])
+    return [column.strip() for column in header]
+
+
+def scan_csv_files(csv_files):
+    """CSV 파일별 해시와 컬럼 정보를 {파일명: {...}} 형태로 반환합니다."""
+    scanned = {}
+    for path in sorted(csv_files):
+        scanned[os.path.basename(path)] = {
+            "path": path,
+            "sha256": file_sha256(path),
+            "columns": read_csv_columns(path),
+        }
+    return scanned
+
+
+def schema_signature(scanned_files, embedding_model):
+    """전체 재생성이 필요한지 판단하는 스키마 지문을 계산합니다."""
+    schema = {
+        "version": MANIFEST_VERSION,
+        "embedding_model": embedding_model,
+        "columns": {name: info["columns"] for name, info in sorted(scanned_files.items())},
+    }
+    return text_sha256(json.dumps(schema, ensure_ascii=False, sort_keys=True))
+
+
+def row_keys_from_fields(rows):
+    """(컬럼 -> 값 딕셔너리, 행 번호) 목록의 행 키를 계산합니다 (CSV를 직접 읽거나 쓸 때 인덱스와 같은 키를 얻기 위함)."""
+    keys = []
+    seen = {}
+    for fields, row_number in rows:
+        if all(column in fields for column in _ROW_KEY_COLUMNS):
+            base = "|".join(fields[column] for column in _ROW_KEY_COLUMNS)
+        else:
+            base = f"row{row_number}"
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        keys.append(f"{base}#{occurrence}")
+    return keys
+
+
+def chunk_ids(file_name, key, count):
+    """행 하나에서 나온 문서들의 docstore ID를 결정적으로 생성합니다 (행당 문서 하나면 "::0" 하나)."""
+    return [f"{file_name}::{key}::{i}" for i in range(count)]
+
+
+def load_manifest(index_path):
+    """인덱스 폴더의 매니페스트를 읽습니다. 없거나 손상되었으면 None."""
+    manifest_path = os.path.join(index_path, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(index_path, manifest):
+    """매니페스트를 임시 파일에 쓴 뒤 교체하여 원자적으로 저장합니다."""
+    os.makedirs(index_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=index_path, prefix=".manifest-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(index_path, MANIFEST_FILENAME))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,206 @@
+# lexical_index.py (선수/팀 이름 역색인: 이름이 들어간 질문은 임베딩 호출 없이 해당 행을 바로 찾음)
+import os
+import re
+import json
+import tempfile
+from collections import defaultdict
+
+import index_manifest as im
+
+LEXICAL_FILENAME = "lexical.json"
+LEXICAL_VERSION = 1
+
+_MIN_FUZZY_NAME_CHARS = 3  # 이보다 짧은 이름은 n-gram 근사 매칭에서 제외 (오탐 방지)
+_FUZZY_MIN_COVERAGE = 0.5  # 이름의 한글 bigram 중 질문에 들어 있어야 하는 비율
+_MAX_FUZZY_NAMES = 3  # 근사 매칭 동점 후보가 이보다 많으면 모호하다고 보고 버림
+_HANGUL = re.compile(r"[가-힣]+")
+_LATIN = re.compile(r"[A-Za-z]")
+# 영문 이름/별칭은 원문에서 앞뒤가 글자가 아닐 때만 (stats_engine.parse_query와 같은 경계 규칙: "nc"가 "since" 안에서 맞지 않도록)
+LATIN_BOUNDARY = r"(?<![A-Za-z가-힣])(?:{})(?![A-Za-z])"
+# 한글 이름/팀은 어절 맨 앞에서 시작하고, 바로 뒤가 어절 끝이거나 조사/호칭일 때만
+# ("박진감 넘치는"의 박진, "국민주권"의 주권, "정훈련"의 정훈은 이름이 아님)
+_PARTICLES = ("에게서", "에게", "한테", "에서", "이랑", "까지", "부터", "보다", "처럼", "으로", "선수", "감독",
+              "의", "는", "은", "가", "이", "도", "랑", "와", "과", "를", "을", "에", "만", "로", "요", "야", "아", "팀")
+HANGUL_BOUNDARY = (r"(?<![가-힣A-Za-z0-9])(?:{})"
+                   r"(?=(?:" + "|".join(_PARTICLES) + r"){{0,2}}(?![가-힣A-Za-z0-9]))")
+
+
+def _normalize(text):
+    """이름 비교용 표기: 공백을 빼고 소문자로."""
+    return re.sub(r"\s+", "", text).lower()
+
+
+def compile_names(keys, template="{}"):
+    """이름 목록을 긴 이름 우선 정규식 하나로 (template은 LATIN_BOUNDARY/HANGUL_BOUNDARY). 이름이 없으면 None."""
+    keys = sorted(keys, key=len, reverse=True)
+    return re.compile(template.format("|".join(re.escape(key) for key in keys)), re.IGNORECASE) if keys else None
+
+
+def _hangul_bigrams(text):
+    grams = set()
+    for run in _HANGUL.findall(text):
+        grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def _parse_doc_id(doc_id):
+    """'파일::Name|Team|Position#n::i' 형식의 문서 ID에서 (선수 이름, 팀)을 꺼냅니다."""
+    parts = doc_id.split("::")
+    if len(parts) != 3:
+        return None, None
+    fields = parts[1].rsplit("#", 1)[0].split("|")
+    if len(fields) != 3:
+        return None, None
+    return fields[0] or None, fields[1] or None
+
+
+def _chunk_order(doc_id):
+    """같은 행의 청크가 번호 순서(0, 1, ..., 10)대로 오도록 하는 정렬 키."""
+    head, sep, index = doc_id.rpartition("::")
+    return (head, int(index)) if sep and index.isdigit() else (doc_id, -1)
+
+
+def doc_team(doc_id):
+    """문서 ID에 들어 있는 팀 이름 (없으면 None)."""
+    return _parse_doc_id(doc_id)[1]
+
+
+class LexicalMatch:
+    """질문에서 찾은 선수/팀과, 선수 이름으로 바로 찾은 문서 ID 목록."""
+
+    def __init__(self, names, teams, doc_ids, fuzzy=False):
+        self.names = names
+        self.teams = teams
+        self.doc_ids = doc_ids
+        self.fuzzy = fuzzy
+
+    def __bool__(self):
+        return bool(self.names or self.teams)
+
+
+class LexicalIndex:
+    """
+    Name/Team 컬럼 값 -> 문서(청크) ID 역색인. 문서 ID에 행 키가 들어 있으므로 본문을 다시 읽지 않고 만듭니다.
+    정확한 이름은 한 번에 컴파일한 정규식으로 원문에서 찾고 (한글 이름은 어절 맨 앞 + 조사 경계, 영문 이름/별칭은
+    글자 경계를 확인해서), 정확히 일치하는 선수가 없으면
+    한글 bigram 역색인으로 오타/줄임("문보겸", "보경이")을 근사 매칭합니다.
+    """
+
+    def __init__(self, names, teams, id_digest, aliases=None):
+        self.names = names  # 이름 -> [문서 ID]
+        self.teams = teams  # 팀 -> [문서 ID]
+        self.id_digest = id_digest
+        self.aliases = {_normalize(alias): team for alias, team in (aliases or {}).items() if team in teams}
+        self._grams = defaultdict(set)  # bigram -> 이름 집합
+        for name in names:
+            if len(name) >= _MIN_FUZZY_NAME_CHARS:
+                for gram in _hangul_bigrams(name):
+                    self._grams[gram].add(name)
+        surface = {_normalize(name): ("name", name) for name in names}
+        surface.update({_normalize(team): ("team", team) for team in teams})
+        surface.update({alias: ("team", team) for alias, team in self.aliases.items()})
+        self._surface = surface
+        self._pattern = compile_names((key for key in surface if not _LATIN.search(key)), HANGUL_BOUNDARY)
+        self._latin_pattern = compile_names((key for key in surface if _LATIN.search(key)), LATIN_BOUNDARY)
+
+    @classmethod
+    def from_doc_ids(cls, doc_ids, aliases=None):
+        names, teams = defaultdict(list), defaultdict(list)
+        for doc_id in sorted(doc_ids, key=_chunk_order):
+            name, team = _parse_doc_id(doc_id)
+            if name:
+                names[name].append(doc_id)
+            if team:
+                teams[team].append(doc_id)
+        return cls(dict(names), dict(teams), im.ids_digest(doc_ids), aliases)
+
+    def search(self, query):
+        """질문에서 선수/팀 이름을 찾아 LexicalMatch를 반환합니다. 팀만 언급된 경우 doc_ids는 비어 있습니다."""
+        names, teams = [], []
+        for pattern in (self._pattern, self._latin_pattern):
+            if pattern is None:
+                continue
+            for match in pattern.finditer(query.lower()):
+                kind, value = self._surface[_normalize(match.group(0))]
+                bucket = names if kind == "name" else teams
+                if value not in bucket:
+                    bucket.append(value)
+        fuzzy = False
+        if not names:
+            names = self._fuzzy_names(query)
+            fuzzy = bool(names)
+        doc_ids = [doc_id for name in names for doc_id in self.names[name]]
+        if teams and doc_ids:
+            # 이름과 팀이 함께 나오면 (동명이인 구분) 해당 팀 행을 앞으로
+            doc_ids.sort(key=lambda doc_id: _parse_doc_id(doc_id)[1] not in teams)
+        return LexicalMatch(names, teams, doc_ids, fuzzy)
+
+    def _fuzzy_names(self, query):
+        query_grams = _hangul_bigrams(query)
+        candidates = defaultdict(int)
+        for gram in query_grams:
+            for name in self._grams.get(gram, ()):
+                candidates[name] += 1
+        scored = []
+        for name, hits in candidates.items():
+            coverage = hits / len(_hangul_bigrams(name))
+            if coverage >= _FUZZY_MIN_COVERAGE:
+                scored.append((coverage, name))
+        if not scored:
+            return []
+        best = max(coverage for coverage, _ in scored)
+        top = sorted(name for coverage, name in scored if coverage == best)
+        return top if len(top) <= _MAX_FUZZY_NAMES else []
+
+    def save(self, index_path):
+        """인덱스 폴더에 원자적으로 저장합니다."""
+        os.makedirs(index_path, exist_ok=True)
+        payload = {"version": LEXICAL_VERSION, "id_digest": self.id_digest, "names": self.names, "teams": self.teams}
+        fd, tmp_path = tempfile.mkstemp(dir=index_path, prefix=".lexical-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, os.path.join(index_path, LEXICAL_FILENAME))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, index_path, aliases=None):
+        """저장된 역색인을 읽습니다. 없거나 형식이 다르면 None."""
+        try:
+            with open(os.path.join(index_path, LEXICAL_FILENAME), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != LEXICAL_VERSION:
+            return None
+        return cls(payload["names"], payload["teams"], payload["id_digest"], aliases)
+
+
+def load_or_build(index_path, vectorstore, aliases=None):
+    """
+    저장된 역색인이 벡터스토어의 문서 ID 집합과 일치하면 그대로 쓰고,
+    아니면 docstore의 문서 ID로 다시 만들어 저장합니다 (임베딩 호출 없음).
+    """
+    doc_ids = list(vectorstore.index_to_docstore_id.values())
+    lexical = LexicalIndex.load(index_path, aliases)
+    if lexical is not None and lexical.id_digest == im.ids_digest(doc_ids):
+        return lexical
+    lexical = LexicalIndex.from_doc_ids(doc_ids, aliases)
+    try:
+        lexical.save(index_path)
+    except OSError as e:
+        print(f"이름 역색인 저장 실패 (메모리에서만 사용): {e}")
+    print(f"이름 역색인 생성: 선수 {len(lexical.names)}명, 팀 {len(lexical.teams)}개")
+    return lexical
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """여러 순위 목록(문서 ID 리스트)을 RRF 점수로 합쳐 하나의 순위로 만듭니다."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
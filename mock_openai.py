@@ -0,0 +1,206 @@
+# mock_openai.py (네트워크/API 키 없이 전체 경로를 시험하는 로컬 OpenAI 호환 서버)
+#
+# openai_http의 base_url을 이 서버(http://127.0.0.1:<port>/v1)로 바꾸면 ChatOpenAI/OpenAIEmbeddings/TTS가
+# 실제 SDK와 HTTP 연결 풀을 그대로 거쳐 여기로 요청합니다 (benchmark.py의 서비스 측정).
+#   POST /v1/chat/completions  고정 답변 (stream=true면 SSE로 토큰마다 한 조각)
+#   POST /v1/embeddings        입력 해시로 만든 정규화 벡터 (같은 입력 -> 같은 벡터)
+#   POST /v1/audio/speech      가짜 MP3 바이트
+#   GET  /stats                요청 수, 최대 동시 처리 수, 연 TCP 연결 수 (연결 재사용 확인용)
+# 지연은 첫 토큰/토큰/임베딩/TTS별로 설정합니다 (실제 API와 비슷한 대기 시간을 흉내).
+#
+# 실행: python mock_openai.py --port 8700
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_EMBEDDING_DIMENSIONS = 64
+_ANSWER = "좋은 질문이에요! 올 시즌 기록을 보면 꾸준히 좋은 활약을 하고 있어요. 다음 경기도 기대해 봐요."
+_FAKE_MP3 = b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" * 256
+
+
+class _Latency:
+    def __init__(self, first_token=0.2, token=0.01, embedding=0.05, speech=0.3):
+        self.first_token = first_token
+        self.token = token
+        self.embedding = embedding
+        self.speech = speech
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"requests": 0, "connections": 0, "active": 0, "max_concurrent": 0}
+        self.paths = {}
+
+    def add(self, key, delta=1):
+        with self._lock:
+            self.values[key] += delta
+            if key == "active":
+                self.values["max_concurrent"] = max(self.values["max_concurrent"], self.values["active"])
+
+    def hit(self, path):
+        with self._lock:
+            self.values["requests"] += 1
+            self.paths[path] = self.paths.get(path, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.values, paths=dict(self.paths))
+
+
+def _hash_vector(text):
+    digest = hashlib.sha256(str(text).encode("utf-8")).digest()
+    values = [(digest[i % len(digest)] ^ (i * 31 & 0xFF)) / 255.0 - 0.5 for i in range(_EMBEDDING_DIMENSIONS)]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+def _answer_tokens():
+    # 어절 단위 토큰 (공백을 앞에 붙여 이어 붙이면 원문)
+    words = _ANSWER.split(" ")
+    return [words[0]] + [" " + word for word in words[1:]]
+
+
+class _MockOpenAIHandler(BaseHTTPRequestHandler):
+    """OpenAI API 일부를 흉내 내는 핸들러 (keep-alive 지원, 스트리밍은 chunked 전송)."""
+
+    protocol_version = "HTTP/1.1"
+    latency = _Latency()
+    counters = _Counters()
+
+    def setup(self):
+        super().setup()
+        self.counters.add("connections")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(self.counters.snapshot())
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        request = self._read_json()
+        self.counters.hit(path)
+        self.counters.add("active")
+        try:
+            if path.endswith("/chat/completions"):
+                self._chat(request)
+            elif path.endswith("/embeddings"):
+                self._embeddings(request)
+            elif path.endswith("/audio/speech"):
+                time.sleep(self.latency.speech)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(_FAKE_MP3)))
+                self.end_headers()
+                self.wfile.write(_FAKE_MP3)
+            else:
+                self._send_json({"error": {"message": f"unsupported path {path}"}}, status=404)
+        finally:
+            self.counters.add("active", -1)
+
+    def _chat(self, request):
+        model = request.get("model", "mock")
+        created = int(time.time())
+        tokens = _answer_tokens()
+        time.sleep(self.latency.first_token)
+        if not request.get("stream"):
+            time.sleep(self.latency.token * (len(tokens) - 1))
+            self._send_json({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": _ANSWER},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self._send_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        event({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.latency.token)
+            event({"content": token})
+        event({}, finish_reason="stop")
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _embeddings(self, request):
+        inputs = request.get("input", [])
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]  # 문자열 하나 또는 토큰 ID 목록 하나
+        time.sleep(self.latency.embedding)
+        self._send_json({
+            "object": "list", "model": request.get("model", "mock"),
+            "data": [{"object": "embedding", "index": i, "embedding": _hash_vector(item)} for i, item in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def log_message(self, format, *args):
+        pass  # 부하 측정 중 요청마다 출력하지 않음
+
+
+def serve_mock_openai(port=8700, host="127.0.0.1", first_token=0.2, token=0.01, embedding=0.05, speech=0.3):
+    """mock 서버를 만듭니다 (serve_forever()는 호출자가). 서버의 counters.snapshot()으로 통계를 읽습니다."""
+    handler = type("MockOpenAIHandler", (_MockOpenAIHandler,), {
+        "latency": _Latency(first_token, token, embedding, speech),
+        "counters": _Counters(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.counters = handler.counters
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 OpenAI 호환 mock 서버 (채팅/임베딩/TTS)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--first-token", type=float, default=0.2, help="첫 토큰 지연 (초)")
+    parser.add_argument("--token", type=float, default=0.01, help="토큰 사이 지연 (초)")
+    parser.add_argument("--embedding", type=float, default=0.05, help="임베딩 요청 지연 (초)")
+    parser.add_argument("--speech", type=float, default=0.3, help="TTS 요청 지연 (초)")
+    args = parser.parse_args(argv)
+    server = serve_mock_openai(args.port, args.host, args.first_token, args.token, args.embedding, args.speech)
+    print(f"[mock_openai] http://{args.host}:{server.server_address[1]}/v1 (ONEDAYAI_OPENAI_BASE_URL로 지정)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# ngram_embeddings.py (API 호출 없이 프로세스 안에서 계산하는 해시 문자 n-gram 임베딩)
+#
+# 한국어 이름/팀/조사는 형태소 분석 없이도 음절 n-gram으로 잘 맞춰집니다 ("문보경의" -> "문보", "보경", "경의").
+# 텍스트를 단어(한글/영문 연속, 4자리 연도)로 나눠 단어 안의 1~3음절 n-gram을 만들고, 해시로 dim개 버킷에
+# 부호(+/-)를 붙여 더한 뒤(signed feature hashing), log1p로 빈도를 눌러 L2 정규화합니다.
+# 소수/기록 숫자는 버립니다 (모든 행에 있어 유사도만 흐리고, 숫자 질문은 통계 엔진이 처리).
+# 학습/어휘 사전이 없어 같은 텍스트는 어느 프로세스에서나 같은 벡터이고, 배치는 텍스트를 코드 포인트 배열 하나로
+# 이어 붙여 n-gram 해시와 버킷 합산을 numpy로 한 번에 계산합니다.
+import re
+import unicodedata
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DIMENSIONS = 1024
+_NGRAM_WEIGHTS = {1: 0.5, 2: 1.0, 3: 1.0}  # 한 음절은 흔해서 절반만
+_WORD = re.compile(r"[^\W\d_]+|(?<![\d.])\d{4}(?![\d.])")  # 글자 연속 또는 시즌 같은 4자리 숫자
+_SEPARATOR = 0x20  # 단어 경계 (경계를 넘는 3-gram은 버리고, "␣문"/"경␣" 같은 경계 2-gram은 씀)
+_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def _words(text):
+    return _WORD.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def _mix(values):
+    """splitmix64 마무리 단계 (해시 비트를 고르게 섞음, uint64 오버플로는 의도된 것)."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """해시 문자 n-gram 벡터 (dim차원, L2 정규화). 상태가 없어 여러 스레드가 공유해도 됩니다."""
+
+    def __init__(self, dim=DEFAULT_DIMENSIONS):
+        self.dim = dim
+
+    @property
+    def model_name(self):
+        return f"hashed-ngram-{self.dim}"
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+    def encode(self, texts):
+        """텍스트 목록을 (len(texts), dim) float32 행렬로 만듭니다."""
+        # 문서마다 [경계, 단어, 경계, 단어, ...] 순서로 이어 붙이고, 위치별 문서 번호를 함께 기록
+        pieces = []
+        for words in map(_words, texts):
+            pieces.append(" " + " ".join(words))
+        joined = "".join(pieces) + " "
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        lengths = np.fromiter((len(piece) for piece in pieces), dtype=np.int64, count=len(pieces))
+        owner = np.repeat(np.arange(len(pieces), dtype=np.int64), lengths)
+        owner = np.append(owner, max(len(pieces) - 1, 0))  # 마지막 경계는 마지막 문서 몫
+        is_separator = codes == _SEPARATOR
+
+        counts = np.zeros(len(pieces) * self.dim, dtype=np.float32)
+        for n, weight in _NGRAM_WEIGHTS.items():
+            starts = len(codes) - n + 1
+            if starts <= 0:
+                continue
+            hashed = np.full(starts, n, dtype=np.uint64)
+            for offset in range(n):
+                hashed = hashed + codes[offset:offset + starts] * _MULTIPLIERS[offset]
+            if n == 1:
+                valid = ~is_separator[:starts]
+            else:
+                valid = ~(is_separator[:starts] & is_separator[n - 1:n - 1 + starts])
+                for middle in range(1, n - 1):  # 가운데가 경계면 두 단어에 걸친 n-gram
+                    valid &= ~is_separator[middle:middle + starts]
+            hashed = _mix(hashed[valid])
+            signs = np.where(hashed >> np.uint64(63), -weight, weight).astype(np.float32)
+            buckets = owner[:starts][valid] * self.dim + (hashed % np.uint64(self.dim)).astype(np.int64)
+            counts += np.bincount(buckets, weights=signs, minlength=counts.size).astype(np.float32)
+
+        matrix = counts.reshape(len(pieces), self.dim)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return (matrix / np.where(norms > 0, norms, 1.0)).astype(np.float32, copy=False)
@@ -0,0 +1,65 @@
+# openai_http.py (OpenAI 호환 API 호출이 함께 쓰는 HTTP 연결 풀과 서버 주소)
+#
+# 채팅(ChatOpenAI), 임베딩(OpenAIEmbeddings), TTS(OpenAI SDK) 클라이언트가 httpx.Client 하나를 공유하므로
+# 동시 사용자가 늘어도 열린 소켓 수는 max_connections를 넘지 않고, keep-alive 연결을 재사용합니다.
+# base_url을 mock_openai.py 같은 로컬 OpenAI 호환 서버로 바꾸면 네트워크/요금 없이 전체 경로를 시험할 수 있습니다.
+#
+# 환경 변수:
+#   ONEDAYAI_OPENAI_BASE_URL       OpenAI 호환 서버 주소 (예: http://127.0.0.1:8700/v1, 없으면 OPENAI_BASE_URL 또는 기본값)
+#   ONEDAYAI_HTTP_MAX_CONNECTIONS  공유 풀의 최대 연결 수 (기본 64)
+import os
+import threading
+
+_MAX_CONNECTIONS = int(os.environ.get("ONEDAYAI_HTTP_MAX_CONNECTIONS", "64"))
+_KEEPALIVE_CONNECTIONS = max(1, _MAX_CONNECTIONS // 2)
+_CONNECT_TIMEOUT = 10.0  # 초
+_READ_TIMEOUT = 120.0  # 초 (스트리밍 답변/긴 TTS)
+
+_base_url = os.environ.get("ONEDAYAI_OPENAI_BASE_URL") or os.environ.get("OPENAI_BASE_URL") or None
+_http_client = None
+_lock = threading.Lock()
+
+
+def base_url():
+    """OpenAI 호환 서버 주소. None이면 각 SDK의 기본값(api.openai.com)."""
+    return _base_url
+
+
+def http_client():
+    """프로세스 전체가 공유하는 httpx.Client (첫 호출 때 생성)."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx  # openai/langchain_openai와 같은 시점에 임포트 (앱 첫 화면을 늦추지 않도록)
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=_MAX_CONNECTIONS, max_keepalive_connections=_KEEPALIVE_CONNECTIONS),
+                timeout=httpx.Timeout(_READ_TIMEOUT, connect=_CONNECT_TIMEOUT),
+            )
+        return _http_client
+
+
+def client_kwargs():
+    """OpenAI/ChatOpenAI/OpenAIEmbeddings 생성자에 넘길 공통 인자 (base_url, http_client)."""
+    kwargs = {"http_client": http_client()}
+    if _base_url:
+        kwargs["base_url"] = _base_url
+    return kwargs
+
+
+def configure(base_url=None, max_connections=None):
+    """
+    서버 주소와 연결 풀 크기를 바꿉니다 (benchmark.py의 mock 서버 측정 등). 기존 풀은 닫고 다음 호출 때 새로 만듭니다.
+    이미 만들어진 클라이언트는 이전 풀을 쓰므로 GetAnswer.configure_backends/SpeakAnswer.configure_backend로 함께 비워야 합니다.
+    이전 설정을 반환합니다.
+    """
+    global _base_url, _http_client, _MAX_CONNECTIONS, _KEEPALIVE_CONNECTIONS
+    with _lock:
+        previous = {"base_url": _base_url, "max_connections": _MAX_CONNECTIONS}
+        _base_url = base_url
+        if max_connections:
+            _MAX_CONNECTIONS = max_connections
+            _KEEPALIVE_CONNECTIONS = max(1, max_connections // 2)
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+    return previous
@@ -0,0 +1,101 @@
+# prewarm.py (서버 시작 시 백그라운드 예열: LangChain/OpenAI 스택 임포트와 자주 쓰는 인덱스 로드/생성)
+#
+# app.py는 첫 화면을 그리기 전에 GetAnswer를 임포트하지 않고, 이 모듈의 start()로 예열 스레드를 한 번 띄웁니다.
+# 스레드는 GetAnswer를 임포트한 뒤 기본 인덱스 설정과 최근 trace에서 많이 쓰인 (인덱스 종류, 임베딩 제공자)의
+# 벡터스토어/이름 역색인/샤드를 프로세스 전역 캐시에 올려 두므로, 첫 캐릭터 클릭이 인덱스 로드를 기다리지 않습니다.
+# (컨텍스트 토큰 예산은 체인 설정일 뿐 인덱스와 무관하므로 예열 대상이 아닙니다.)
+# 사용자가 예열 중인 설정을 고르면 LRURegistry가 같은 키의 생성을 한 번만 하므로 끝나기를 기다렸다 공유합니다.
+#
+# 환경 변수:
+#   ONEDAYAI_PREWARM_PRESETS  기본 인덱스 설정 외에 예열할 인기 인덱스 설정 수 (기본 2, 0이면 기본만)
+import os
+import time
+import threading
+from collections import Counter
+
+import tracing
+import embedding_providers as ep
+
+DEFAULT_PRESET = ("flat", ep.DEFAULT_PROVIDER)  # app.py의 인덱스 종류/임베딩 선택 상자 기본값
+DEFAULT_TEMPERATURE = 0.7
+_POPULAR_PRESETS = int(os.environ.get("ONEDAYAI_PREWARM_PRESETS", "2"))
+_TRACE_WINDOW = 2000  # 인기 설정을 셀 때 읽을 최근 턴 수
+
+
+def popular_presets(limit=_POPULAR_PRESETS, traces=None):
+    """
+    최근 턴 trace의 (인덱스 종류, 임베딩 제공자)를 사용 횟수순으로 limit개 반환합니다 (기본 설정 제외).
+    임베딩 제공자를 기록하기 전의 trace는 OpenAI 임베딩으로 셉니다.
+    """
+    if limit <= 0:
+        return []
+    records = tracing.read_traces(limit=_TRACE_WINDOW) if traces is None else traces
+    counts = Counter()
+    for record in records:
+        attrs = record.get("attrs", {})
+        if record.get("name") != "turn" or not attrs.get("index_type"):
+            continue
+        preset = (attrs["index_type"], attrs.get("embedding_provider") or ep.OPENAI)
+        if preset != DEFAULT_PRESET and preset[1] in ep.PROVIDERS:
+            counts[preset] += 1
+    return [preset for preset, _ in counts.most_common(limit)]
+
+
+class Prewarm:
+    """예열 진행 상황. 화면 표시용으로 여러 스레드에서 읽습니다."""
+
+    def __init__(self, presets):
+        self.presets = presets
+        self.ready = []  # 준비된 설정 목록
+        self.errors = {}  # 설정 -> 오류 메시지
+        self.import_seconds = None
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.done = threading.Event()
+        self._thread = None
+
+    def run(self):
+        try:
+            start = time.perf_counter()
+            import GetAnswer as ga  # 가장 오래 걸리는 임포트를 사용자 클릭 전에 끝냄
+            import SpeakAnswer  # noqa: F401 (OpenAI 클라이언트 모듈)
+            self.import_seconds = time.perf_counter() - start
+            for streaming in (False, True):
+                ga.get_llm(DEFAULT_TEMPERATURE, streaming=streaming)  # langchain_openai 지연 임포트 포함
+            for preset in self.presets:
+                try:
+                    ga.get_vectorstore(*preset)
+                    ga.get_lexical_index(*preset)
+                    ga.get_shard_index(*preset)
+                    self.ready.append(preset)
+                except Exception as e:
+                    self.errors[preset] = f"{type(e).__name__}: {e}"
+                    print(f"[prewarm] {preset} 예열 실패: {e}")
+        except Exception as e:
+            self.errors[None] = f"{type(e).__name__}: {e}"
+            print(f"[prewarm] 예열 중단: {e}")
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self.done.set()
+            print(f"[prewarm] 완료 {len(self.ready)}/{len(self.presets)}개 설정, {self.elapsed:.1f}초 "
+                  f"(GetAnswer 임포트 {self.import_seconds or 0:.1f}초)")
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def summary(self):
+        if not self.done.is_set():
+            return f"⏳ 인덱스 예열 중 ({len(self.ready)}/{len(self.presets)})"
+        if self.errors:
+            return f"⚠️ 인덱스 예열 일부 실패 ({len(self.ready)}/{len(self.presets)})"
+        return None
+
+
+def start(presets=None):
+    """예열 스레드를 시작하고 Prewarm을 반환합니다. presets가 없으면 기본 설정 + 인기 설정."""
+    if presets is None:
+        presets = [DEFAULT_PRESET] + popular_presets()
+    prewarm = Prewarm(presets)
+    prewarm._thread = threading.Thread(target=prewarm.run, name="prewarm", daemon=True)
+    prewarm._thread.start()
+    return prewarm
@@ -0,0 +1,138 @@
+# pronunciation.py (TTS 입력용 야구 약어 발음 변환: 사전을 한 번 컴파일해 한 번의 패스로 치환)
+import os
+import re
+import sys
+import time
+
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+_LEXICON_PATH = os.path.join(_MODULE_DIR, "pronunciation_lexicon.tsv")
+_GOLDEN_PATH = os.path.join(_MODULE_DIR, "pronunciation_golden.tsv")
+
+
+def load_lexicon(path=_LEXICON_PATH):
+    """사전 파일을 읽어 (원문, 읽는 법, standalone 여부) 목록을 파일 순서대로 반환합니다."""
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.split("\t")
+            if len(parts) < 2:
+                raise ValueError(f"잘못된 발음 사전 줄: {line!r}")
+            entries.append((parts[0], parts[1], len(parts) > 2 and parts[2] == "standalone"))
+    return entries
+
+
+def _trie_regex(words):
+    """단어 목록을 문자 트라이 모양의 정규식으로 만듭니다 (공통 접두사를 한 번만 검사, 긴 매칭 우선)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class PronunciationNormalizer:
+    """
+    사전 전체를 문자 트라이 모양의 단일 정규식으로 한 번 컴파일해 텍스트를 한 번만 훑습니다.
+    각 위치에서 가장 긴 항목이 매칭되고 치환 결과는 다시 검사하지 않으므로 규칙 순서에 영향받지 않습니다.
+    경계 조건: 영문 약어는 앞뒤가 영문자가 아닐 때만, standalone 항목은 앞이 공백(또는 시작)이고
+    뒤가 공백/문장부호(또는 끝)일 때만 치환 ("S급"의 S는 세이브가 아님).
+    """
+
+    def __init__(self, entries):
+        self._replacements = {source: target for source, target, _ in entries}
+        self._standalone = {source for source, _, standalone in entries if standalone}
+        # 첫 글자 집합으로 시작하는 패턴이어야 정규식 엔진이 한글 구간을 빠르게 건너뜀 (왼쪽 경계는 콜백에서 확인)
+        self._pattern = re.compile(_trie_regex(self._replacements) + r"(?![A-Za-z])")
+
+    def __call__(self, text):
+        def replace(match):
+            source = match.group(0)
+            before = text[match.start() - 1] if match.start() else " "
+            if source in self._standalone:
+                after = text[match.end()] if match.end() < len(text) else " "
+                if not before.isspace() or after.isalnum():
+                    return source
+            elif before.isascii() and before.isalpha() and source[0].isascii() and source[0].isalnum():
+                return source
+            return self._replacements[source]
+
+        return self._pattern.sub(replace, text)
+
+
+_default_normalizer = None
+
+
+def normalize_for_tts(text):
+    """TTS가 야구 약어를 한국어로 읽도록 텍스트를 변환합니다 (사전은 처음 호출 시 한 번만 컴파일)."""
+    global _default_normalizer
+    if _default_normalizer is None:
+        _default_normalizer = PronunciationNormalizer(load_lexicon())
+    return _default_normalizer(text)
+
+
+def _sequential_replace(entries, text):
+    """비교용: 기존 app.py 방식처럼 규칙마다 str.replace를 차례로 적용합니다."""
+    for source, target, standalone in entries:
+        if standalone:
+            text = text.replace(f" {source}", f" {target}")
+        else:
+            text = text.replace(source, target)
+    return text
+
+
+def check_golden(path=_GOLDEN_PATH):
+    """골든 입력/기대 출력 목록과 비교하여 불일치 목록을 반환합니다."""
+    failures = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            source, expected = line.split("\t")
+            actual = normalize_for_tts(source)
+            if actual != expected:
+                failures.append((source, expected, actual))
+    return failures
+
+
+def _benchmark(repeat=2000):
+    entries = load_lexicon()
+    normalizer = PronunciationNormalizer(entries)
+    samples = {
+        "약어 밀집": ("문보경(LG, 3B)은 20 G 출전해 AVG 0.373, OBP 0.449, SLG 0.613, OPS 1.062, wRC+ 215.6, "
+                   "HR 5개와 RBI 20을 기록했고 WAR는 1.62입니다. 투수 치리노스는 ERA 2.10, FIP 2.10, WHIP 1.00, "
+                   "rRA9pf 2.53으로 KT 위즈와 SSG 랜더스를 상대로 호투했습니다. ") * 4,
+        "일반 답변": ("오늘 경기에서 문보경 선수는 중요한 순간마다 집중력을 보여주며 팀 승리에 크게 기여했습니다. "
+                   "특히 후반 찬스에서 적시타를 때려내며 팬들의 환호를 받았고, 시즌 OPS도 꾸준히 오르고 있습니다. ") * 20,
+    }
+    for label, text in samples.items():
+        for name, fn in (("순차 str.replace", lambda t: _sequential_replace(entries, t)), ("단일 패스 정규식", normalizer)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn(text)
+            elapsed = time.perf_counter() - start
+            print(f"[{label}] {name}: {elapsed / repeat * 1e6:.1f}µs/회 (텍스트 {len(text)}자, 규칙 {len(entries)}개)")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        _benchmark()
+    else:
+        mismatches = check_golden()
+        for source, expected, actual in mismatches:
+            print(f"불일치: {source!r}\n  기대: {expected!r}\n  실제: {actual!r}")
+        print(f"골든 세트 검사 {'통과' if not mismatches else f'실패 ({len(mismatches)}건)'}")
+        sys.exit(1 if mismatches else 0)
@@ -0,0 +1,116 @@
+# resource_registry.py (프로세스 전역 리소스 캐시: 벡터스토어, LLM 클라이언트 등)
+import threading
+from collections import OrderedDict
+
+
+class LRURegistry:
+    """
+    키별로 한 번만 생성되는 리소스를 보관하는 스레드 안전 LRU 캐시입니다.
+    모듈 전역으로 두면 같은 프로세스의 모든 Streamlit 세션이 공유합니다.
+    max_entries(개수) 또는 max_bytes(sizeof로 추정한 메모리) 한도를 넘으면
+    가장 오래 쓰이지 않은 항목부터 제거합니다.
+    invalidate()는 키별 세대 번호를 올리므로, 그 전에 시작된 생성 결과는 캐시에 넣지 않습니다.
+    """
+
+    def __init__(self, name, max_entries=None, max_bytes=None, sizeof=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 키 -> (값, 추정 바이트)
+        self._key_locks = {}  # 생성 중인 키 -> 잠금 (생성이 끝나면 성공/실패와 관계없이 제거)
+        self._generations = {}  # 키 -> invalidate()된 횟수
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key, factory):
+        """캐시된 값을 반환하고, 없으면 factory()로 생성합니다 (같은 키는 동시에 한 번만 생성)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            try:
+                # 다른 스레드가 먼저 생성을 마쳤을 수 있음
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return self._entries[key][0]
+                    generation = self._generations.get(key, 0)
+                value = factory()
+                if value is None:
+                    return None
+                size = self._sizeof(value)
+                with self._lock:
+                    self.misses += 1
+                    if self._generations.get(key, 0) != generation:
+                        # 생성 도중 invalidate()됨: 이전 설정으로 만든 값이므로 캐시하지 않음
+                        print(f"[{self.name}] 생성 중 무효화되어 캐시하지 않음: {key}")
+                        return value
+                    self._entries[key] = (value, size)
+                    self._entries.move_to_end(key)
+                    self._evict(keep=key)
+                return value
+            finally:
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        self._key_locks.pop(key)
+
+    def peek(self, key):
+        """LRU 순서를 바꾸지 않고 캐시된 값을 반환합니다. 없으면 None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def invalidate(self, key=None):
+        """특정 키(또는 전체)를 캐시에서 제거합니다."""
+        with self._lock:
+            if key is None:
+                keys = set(self._entries) | set(self._key_locks) | set(self._generations)
+                self._entries.clear()
+            else:
+                keys = [key]
+                self._entries.pop(key, None)
+            for stale_key in keys:
+                self._generations[stale_key] = self._generations.get(stale_key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": sum(size for _, size in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _evict(self, keep):
+        def over_budget():
+            if self.max_entries is not None and len(self._entries) > self.max_entries:
+                return True
+            if self.max_bytes is not None and sum(size for _, size in self._entries.values()) > self.max_bytes:
+                return True
+            return False
+
+        while over_budget() and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._entries.pop(oldest)
+            print(f"[{self.name}] 메모리 한도 초과로 캐시에서 제거: {oldest}")
+
+
+def estimate_vectorstore_bytes(vectorstore):
+    """FAISS 벡터스토어의 메모리 사용량(벡터 + 문서 텍스트)을 대략 추정합니다. 메모리 매핑된 벡터/문서는 세지 않습니다."""
+    index = vectorstore.index
+    vector_bytes = 0 if getattr(vectorstore, "memory_mapped", False) else index.ntotal * index.d * 4
+    docstore = vectorstore.docstore
+    if hasattr(docstore, "resident_bytes"):
+        return vector_bytes + docstore.resident_bytes()
+    text_bytes = sum(len(doc.page_content.encode("utf-8")) for doc in getattr(docstore, "_dict", {}).values())
+    return vector_bytes + text_bytes
@@ -0,0 +1,261 @@
+# session_store.py (Streamlit 세션 밖으로 옮긴 세션 데이터: 내용 주소 음성 블롭 저장소와 윈도우 대화 기록)
+#
+# AudioStore: 답변 음성(MP3)을 내용 해시(sha256)를 이름으로 디스크에 저장하고, 메시지는 audio_id만 들고 있습니다.
+#   세션별 용량 한도를 넘으면 그 세션의 가장 오래된 음성 참조부터 놓으며, 어느 세션도 참조하지 않는 블롭은 지웁니다.
+#   오래 쓰이지 않은(ttl) 블롭과 대화 기록 보관 파일은 주기적으로 정리합니다.
+# ChatHistory: 최근 keep개 메시지만 메모리에 두고 그 이전은 세션/캐릭터별 JSON Lines 파일에 보관했다가
+#   "이전 대화 더 보기"를 누를 때만 파일 끝에서부터 필요한 만큼 읽습니다. 대화를 지우면 그 메시지들의 음성 참조도 놓습니다.
+#   (답변 체인의 대화 메모리는 chat_memory.TokenBudgetMemory가 요약 + 최근 몇 턴으로 따로 제한합니다.)
+#
+# 환경 변수:
+#   ONEDAYAI_AUDIO_SESSION_BYTES  세션당 음성 보관 한도 (바이트, 기본 32MB)
+#   ONEDAYAI_SESSION_TTL          음성/대화 기록 보관 기간 (초, 기본 24시간)
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+_STORE_DIR = "session_store"
+_AUDIO_FORMAT = "mp3"
+_SESSION_AUDIO_BYTES = int(os.environ.get("ONEDAYAI_AUDIO_SESSION_BYTES", str(32 * 1024 * 1024)))
+_SESSION_TTL = float(os.environ.get("ONEDAYAI_SESSION_TTL", str(24 * 3600)))
+_CLEANUP_INTERVAL = 10 * 60  # 초 (저장 시 이 간격이 지났으면 정리)
+_HISTORY_KEEP = 40  # 메모리에 둘 최근 메시지 수 (질문+답변 20턴)
+_TAIL_BLOCK = 64 * 1024  # 보관 파일 끝에서부터 읽는 단위 (바이트)
+
+
+def _atomic_write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".blob-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class AudioStore:
+    """
+    프로세스 전역 음성 블롭 저장소 (스레드 안전). 같은 음성은 세션이 달라도 파일 하나를 공유합니다.
+    세션별 참조 목록은 메모리에만 있으므로 서버를 다시 시작하면 남은 블롭은 ttl 정리로 지워집니다.
+    """
+
+    def __init__(self, root=_STORE_DIR, max_session_bytes=_SESSION_AUDIO_BYTES, ttl=_SESSION_TTL):
+        self.root = root
+        self.blob_dir = os.path.join(root, "audio")
+        self.history_dir = os.path.join(root, "history")
+        self.max_session_bytes = max_session_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}  # 세션 ID -> OrderedDict(audio_id -> 바이트 수), 오래된 순
+        self._session_seen = {}  # 세션 ID -> 마지막 사용 시각
+        self._refs = {}  # audio_id -> 참조하는 세션 ID 집합
+        self._last_cleanup = 0.0
+
+    def _path(self, audio_id):
+        return os.path.join(self.blob_dir, audio_id[:2], f"{audio_id}.{_AUDIO_FORMAT}")
+
+    def put(self, session_id, data):
+        """음성을 저장하고 audio_id를 반환합니다. 세션 한도를 넘으면 그 세션의 오래된 음성부터 놓습니다."""
+        if not data:
+            return None
+        audio_id = hashlib.sha256(data).hexdigest()
+        path = self._path(audio_id)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            _atomic_write_bytes(path, data)
+        released = []
+        with self._lock:
+            owned = self._sessions.setdefault(session_id, OrderedDict())
+            owned[audio_id] = len(data)
+            owned.move_to_end(audio_id)
+            self._refs.setdefault(audio_id, set()).add(session_id)
+            self._session_seen[session_id] = time.time()
+            while len(owned) > 1 and sum(owned.values()) > self.max_session_bytes:
+                oldest, _ = owned.popitem(last=False)
+                released.append(oldest)
+            orphans = [blob for blob in released if self._release(blob, session_id)]
+            due = time.time() - self._last_cleanup > _CLEANUP_INTERVAL
+        for blob in orphans:
+            self._remove_blob(blob)
+        if due:
+            self.cleanup()
+        return audio_id
+
+    def release(self, session_id, audio_ids):
+        """세션이 들고 있던 음성 참조를 놓고, 어느 세션도 참조하지 않게 된 블롭은 지웁니다 (대화 기록을 지울 때)."""
+        orphans = []
+        with self._lock:
+            owned = self._sessions.get(session_id, {})
+            for blob in set(audio_ids):
+                if owned.pop(blob, None) is not None and self._release(blob, session_id):
+                    orphans.append(blob)
+        for blob in orphans:
+            self._remove_blob(blob)
+        return len(orphans)
+
+    def get(self, audio_id):
+        """audio_id의 음성 바이트. 한도/기간 초과로 지워졌으면 None."""
+        if not audio_id:
+            return None
+        try:
+            with open(self._path(audio_id), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _release(self, audio_id, session_id):
+        """참조를 놓고, 더 이상 참조하는 세션이 없으면 True (잠금 안에서 호출)."""
+        holders = self._refs.get(audio_id)
+        if holders is None:
+            return False
+        holders.discard(session_id)
+        if holders:
+            return False
+        del self._refs[audio_id]
+        return True
+
+    def _remove_blob(self, audio_id):
+        try:
+            os.remove(self._path(audio_id))
+        except OSError:
+            pass
+
+    def session_bytes(self, session_id):
+        with self._lock:
+            return sum(self._sessions.get(session_id, {}).values())
+
+    def history_path(self, session_id, name):
+        key = hashlib.sha256(name.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.history_dir, session_id, f"{key}.jsonl")
+
+    def cleanup(self):
+        """ttl 동안 쓰이지 않은 세션 참조, 참조 없는 오래된 블롭, 오래된 대화 기록 폴더를 지웁니다."""
+        now = time.time()
+        cutoff = now - self.ttl
+        with self._lock:
+            self._last_cleanup = now
+            for session_id in [s for s, seen in self._session_seen.items() if seen < cutoff]:
+                owned = self._sessions.pop(session_id, {})
+                self._session_seen.pop(session_id, None)
+                for blob in owned:
+                    self._release(blob, session_id)
+            referenced = set(self._refs)
+        removed = 0
+        for root, _, files in os.walk(self.blob_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                audio_id = name.split(".", 1)[0]
+                try:
+                    if audio_id not in referenced and os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if os.path.isdir(self.history_dir):
+            for session_id in os.listdir(self.history_dir):
+                path = os.path.join(self.history_dir, session_id)
+                try:
+                    # 보관 파일에 덧붙여도 폴더 mtime은 바뀌지 않으므로 가장 최근에 쓴 파일 기준
+                    newest = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, name))
+                                                             for name in os.listdir(path)])
+                except OSError:
+                    continue
+                if newest < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+        if removed:
+            print(f"[session_store] 오래된 음성 {removed}개 정리")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "blobs": len(self._refs),
+                    "bytes": sum(sum(owned.values()) for owned in self._sessions.values())}
+
+
+def _read_last_lines(path, count):
+    """파일의 마지막 count줄을 끝에서부터 블록 단위로 읽습니다 (파일 전체를 읽지 않음)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(_TAIL_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    return [line.decode("utf-8") for line in lines[-count:] if line.strip()] if count > 0 else []
+
+
+def _iter_lines(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+    except OSError:
+        return
+
+
+class ChatHistory:
+    """
+    한 세션/캐릭터의 대화 기록. 최근 keep개 메시지만 메모리에 두고, 넘친 이전 메시지는 archive_path
+    (JSON Lines)에 덧붙입니다. 메시지는 {"role", "content", "audio_id"} 딕셔너리입니다.
+    store와 session_id를 주면 clear()할 때 지운 메시지들의 음성 참조를 store에서 놓습니다.
+    """
+
+    def __init__(self, archive_path, keep=_HISTORY_KEEP, store=None, session_id=None):
+        self.archive_path = archive_path
+        self.keep = keep
+        self.store = store
+        self.session_id = session_id
+        self.recent = []
+        self.archived = 0
+
+    def __len__(self):
+        return self.archived + len(self.recent)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def append(self, message):
+        self.recent.append(message)
+        overflow = len(self.recent) - self.keep
+        if overflow > 0:
+            spilled, self.recent = self.recent[:overflow], self.recent[overflow:]
+            os.makedirs(os.path.dirname(self.archive_path), exist_ok=True)
+            with open(self.archive_path, "a", encoding="utf-8") as f:
+                for item in spilled:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self.archived += len(spilled)
+
+    def tail(self, count):
+        """마지막 count개 메시지 (메모리에 없는 부분은 보관 파일에서 읽음)."""
+        if count <= len(self.recent):
+            return self.recent[len(self.recent) - count:] if count > 0 else []
+        older = count - len(self.recent)
+        try:
+            lines = _read_last_lines(self.archive_path, older)
+        except OSError:
+            lines = []  # 기간이 지나 정리된 보관 파일
+        return [json.loads(line) for line in lines] + self.recent
+
+    def clear(self):
+        if self.store is not None and self.session_id is not None:
+            audio_ids = [message.get("audio_id") for message in self.recent]
+            if self.archived:
+                audio_ids += [json.loads(line).get("audio_id") for line in _iter_lines(self.archive_path) if line.strip()]
+            self.store.release(self.session_id, [audio_id for audio_id in audio_ids if audio_id])
+        self.recent = []
+        self.archived = 0
+        try:
+            os.remove(self.archive_path)
+        except OSError:
+            pass
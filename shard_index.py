@@ -0,0 +1,191 @@
+# shard_index.py (파일/시즌/팀 단위 샤드: 질문의 시즌·투타·팀 조건에 해당하는 행만 검색)
+#
+# 샤드는 벡터를 따로 복사하지 않고 주 인덱스(flat/sq8/ivf/hnsw/pq 어느 것이든)의 벡터 위치를 가리킵니다.
+# shards.json에는 샤드별로 (CSV 파일, 팀) 행이 주 인덱스에서 차지하는 위치 구간 [start, end) 목록과
+# 파일에서 얻은 시즌/스탯 종류가 기록되고, 검색은 그 위치들만 고르는 IDSelector를 주 인덱스 검색에 넘깁니다.
+# 따라서 압축 인덱스(sq8/pq)의 메모리/디스크 절약이 그대로 유지되고, 검색 정확도도 주 인덱스와 같습니다.
+import os
+import re
+import json
+
+import faiss
+import numpy as np
+
+import stats_engine
+import index_manifest as im
+import vector_index as vi
+from lexical_index import doc_team
+
+SHARDS_INDEX_FILENAME = "shards.faiss"  # 예전 형식(flat 벡터 사본)의 파일 이름: 새로 저장할 때 지움
+SHARDS_FILENAME = "shards.json"
+SHARDS_VERSION = 2
+
+_SEASON = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+
+
+def file_season(file_name):
+    """파일 이름의 연도(예: kbo_batting_stats_2025.csv -> 2025). 없으면 None."""
+    match = _SEASON.search(file_name)
+    return int(match.group(1)) if match else None
+
+
+def shard_key(doc_id):
+    """'파일::Name|Team|Position#n::i' 문서 ID의 샤드 키 (파일, 팀)."""
+    return doc_id.split("::", 1)[0], doc_team(doc_id) or ""
+
+
+def content_digest(id_map, manifest):
+    """
+    샤드가 인덱스와 맞는지 확인하는 지문. 샤드는 벡터 위치를 가리키므로 위치 순서의 문서 ID를 쓰고,
+    행 내용이 바뀌어도 문서 ID는 그대로이므로 (ID가 행 키로 정해짐) 매니페스트의 파일 해시도 함께 넣습니다.
+    """
+    file_hashes = sorted(info["sha256"] for info in (manifest or {}).get("files", {}).values())
+    ordered = "\n".join(id_map[position] for position in sorted(id_map))
+    return im.text_sha256(im.text_sha256(ordered) + "\n" + "\n".join(file_hashes))
+
+
+def _runs(positions):
+    """정렬된 위치 목록을 연속 구간 [[start, end), ...]으로 묶습니다."""
+    runs = []
+    for position in positions:
+        if runs and runs[-1][1] == position:
+            runs[-1][1] = position + 1
+        else:
+            runs.append([position, position + 1])
+    return runs
+
+
+def search_parameters(index, selector):
+    """인덱스 종류에 맞는 검색 파라미터 (IVF는 nprobe, HNSW는 efSearch를 그대로 유지하며 selector 적용)."""
+    ivf = vi.extract_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+class ShardFilter:
+    """질문에서 찾은 샤드 조건. 비어 있는 항목은 제한하지 않음을 뜻합니다."""
+
+    def __init__(self, seasons=(), tables=(), teams=()):
+        self.seasons = set(seasons)
+        self.tables = set(tables)
+        self.teams = set(teams)
+
+    def __bool__(self):
+        return bool(self.seasons or self.tables or self.teams)
+
+    def __repr__(self):
+        return f"ShardFilter(seasons={sorted(self.seasons)}, tables={sorted(self.tables)}, teams={sorted(self.teams)})"
+
+
+def parse_filters(query, teams=()):
+    """질문의 연도와 투수/타자 표현을 찾아 ShardFilter를 만듭니다. 팀은 이름 역색인 결과를 그대로 받습니다."""
+    seasons = [int(year) for year in _SEASON.findall(query)]
+    table = stats_engine.detect_table(query)
+    return ShardFilter(seasons, [table] if table else [], teams)
+
+
+class ShardIndex:
+    """(파일, 팀) 샤드별로 주 인덱스의 벡터 위치 구간을 기록한 라우팅 표 (벡터는 주 인덱스에만 있음)."""
+
+    def __init__(self, shards, total, id_digest):
+        self.shards = shards  # [{"file", "season", "table", "team", "ranges": [[start, end), ...]}]
+        self.total = total  # 주 인덱스의 벡터 수
+        self.id_digest = id_digest
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, digest):
+        """벡터스토어의 문서 ID(위치 -> ID)만으로 만듭니다 (벡터를 읽거나 복사하지 않음)."""
+        id_map = vectorstore.index_to_docstore_id
+        by_shard = {}
+        for position in sorted(id_map):
+            by_shard.setdefault(shard_key(id_map[position]), []).append(position)
+        shards = [{"file": file_name, "season": file_season(file_name),
+                   "table": stats_engine.table_of_file(file_name), "team": team, "ranges": _runs(positions)}
+                  for (file_name, team), positions in sorted(by_shard.items())]
+        return cls(shards, len(id_map), digest)
+
+    def route(self, shard_filter):
+        """
+        조건에 맞는 샤드들의 주 인덱스 위치 구간 목록(정렬, 인접 구간은 합침)을 반환합니다.
+        조건이 없거나, 맞는 샤드가 없거나, 전체를 훑어야 하면 None (전체 인덱스 검색).
+        """
+        if not shard_filter:
+            return None
+        selected = []
+        for shard in self.shards:
+            if shard_filter.seasons and shard["season"] not in shard_filter.seasons:
+                continue
+            if shard_filter.tables and shard["table"] not in shard_filter.tables:
+                continue
+            if shard_filter.teams and shard["team"] not in shard_filter.teams:
+                continue
+            selected.extend(shard["ranges"])
+        ranges = []
+        for start, end in sorted(selected):
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        if not ranges or sum(end - start for start, end in ranges) >= self.total:
+            return None
+        return ranges
+
+    def search(self, vectorstore, embedding, k, ranges):
+        """주 인덱스에서 ranges 위치의 벡터만 골라 검색한 상위 k개 문서 ID를 반환합니다."""
+        index = vectorstore.index
+        if len(ranges) == 1:
+            selector = faiss.IDSelectorRange(ranges[0][0], ranges[0][1])
+        else:
+            positions = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+            selector = faiss.IDSelectorBatch(positions)
+        vector = np.asarray([embedding], dtype=np.float32)
+        count = sum(end - start for start, end in ranges)
+        _, positions = index.search(vector, min(k, count), params=search_parameters(index, selector))
+        id_map = vectorstore.index_to_docstore_id
+        return [id_map[int(position)] for position in positions[0] if position >= 0]
+
+    def save(self, index_path):
+        os.makedirs(index_path, exist_ok=True)
+        legacy = os.path.join(index_path, SHARDS_INDEX_FILENAME)
+        if os.path.exists(legacy):
+            os.remove(legacy)
+        payload = {"version": SHARDS_VERSION, "id_digest": self.id_digest, "total": self.total, "shards": self.shards}
+
+        def write_payload(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+
+        vi.atomic_write(index_path, SHARDS_FILENAME, write_payload)
+
+    @classmethod
+    def load(cls, index_path):
+        """저장된 샤드 표를 읽습니다. 없거나 형식이 다르면 None."""
+        try:
+            with open(os.path.join(index_path, SHARDS_FILENAME), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != SHARDS_VERSION:
+            return None
+        return cls(payload["shards"], payload["total"], payload["id_digest"])
+
+
+def load_or_build(index_path, vectorstore, manifest):
+    """
+    저장된 샤드가 벡터스토어의 (위치 순서) 문서 ID와 매니페스트의 파일 해시에 맞으면 그대로 쓰고,
+    아니면 벡터스토어의 문서 ID로 다시 만들어 저장합니다.
+    """
+    digest = content_digest(vectorstore.index_to_docstore_id, manifest)
+    shards = ShardIndex.load(index_path)
+    if shards is not None and shards.id_digest == digest:
+        return shards
+    shards = ShardIndex.from_vectorstore(vectorstore, digest)
+    try:
+        shards.save(index_path)
+    except OSError as e:
+        print(f"샤드 저장 실패 (메모리에서만 사용): {e}")
+    print(f"샤드 생성: {len(shards.shards)}개 (파일 x 팀), 문서 {shards.total}개")
+    return shards
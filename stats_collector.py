@@ -0,0 +1,392 @@
+# stats_collector.py (statiz KBO 기록 수집기: data_collection.ipynb 대체)
+#
+# 시즌 x 스탯 페이지(타자/투수)를 연결 풀을 쓰는 세션 하나로 동시에 받아, 페이지당 한 번만 파싱해
+# 헤더와 행을 함께 얻고, CSV를 원자적으로 교체하며 행 단위 변경 내역(추가/변경/삭제)을 보고합니다.
+# 이전 응답의 ETag/Last-Modified를 기억해 조건부 요청을 보내므로 바뀌지 않은 페이지는 304로 건너뜁니다.
+# 변경된 행 키는 인덱스 문서 ID의 행 키(Name|Team|Position#n)와 같아, 인덱스 증분 갱신이 다시 임베딩할 행과 일치합니다.
+#
+# 실행: python stats_collector.py collect --seasons 2024,2025 -o BaseballCSVs --concurrency 4
+#       python stats_collector.py collect --save-pages saved_pages          (받은 HTML 저장)
+#       python stats_collector.py serve saved_pages --port 8765              (저장한 페이지를 로컬에서 제공)
+#       python stats_collector.py collect --base-url http://127.0.0.1:8765  (로컬 서버로 수집 시험)
+import os
+import re
+import sys
+import csv
+import json
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import index_manifest as im
+
+_BASE_URL = "https://statiz.sporki.com"
+_DEFAULT_OUTPUT_DIR = "BaseballCSVs"
+_DEFAULT_SEASONS = "2025"
+_DEFAULT_TABLES = "batting,pitching"
+_DEFAULT_CONCURRENCY = 4
+_TIMEOUT = 20  # 초
+_STATE_FILENAME = ".collector_state.json"  # URL별 ETag/Last-Modified
+
+# 스탯 페이지 경로 (노트북의 URL에서 year만 바꿔 씀)
+_STAT_PAGES = {
+    "batting": "/stats/?m=main&m2=batting&m3=default&so=&ob=&year={season}&sy=&ey=&te=&po=&lt=10100&reg=A&pe=&ds=&de=&we=&hr=&ha=&ct=&st=&vp=&bo=&pt=&pp=&ii=&vc=&um=&oo=&rr=&sc=&bc=&ba=&li=&as=&ae=&pl=&gc=&lr=&pr=300&ph=&hs=&us=&na=&ls=1&sf1=G&sk1=&sv1=&sf2=G&sk2=&sv2=",
+    "pitching": "/stats/?m=main&m2=pitching&m3=default&so=G&ob=DESC&year={season}&sy=&ey=&te=&po=&lt=10100&reg=A&pe=&ds=&de=&we=&hr=&ha=&ct=&st=&vp=&bo=&pt=&pp=&ii=&vc=&um=&oo=&rr=&sc=&bc=&ba=&li=&as=&ae=&pl=&gc=&lr=&pr=300&ph=&hs=&us=&na=&ls=1&sf1=G&sk1=&sv1=&sf2=G&sk2=&sv2=",
+}
+
+# 팀 로고 파일 이름 -> 팀명 (로고 경로의 연도 폴더는 시즌마다 달라 파일 이름만 비교)
+_TEAM_LOGOS = {
+    "5002.svg": "LG", "1001.svg": "삼성", "9002.svg": "SSG", "2002.svg": "기아", "10001.svg": "키움",
+    "6002.svg": "두산", "3001.svg": "롯데", "11001.svg": "엔씨", "12001.svg": "KT", "7002.svg": "한화",
+}
+_SKIP_HEADERS = ("Sort", "비율")
+
+
+def csv_filename(table, season):
+    return f"kbo_{table}_stats_{season}.csv"
+
+
+def page_url(base_url, table, season):
+    return base_url.rstrip("/") + _STAT_PAGES[table].format(season=season)
+
+
+def make_session(concurrency=_DEFAULT_CONCURRENCY, retries=3):
+    """동시 요청 수만큼 연결을 유지하고 일시적 오류(429/5xx)는 재시도하는 세션."""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "OneDayAI-stats-collector"
+    return session
+
+
+# --- 파싱 (노트북의 get_data/get_header를 한 번의 파싱으로 합침) ---
+def _team_name(logo_src):
+    return _TEAM_LOGOS.get(logo_src.rsplit("/", 1)[-1], logo_src)
+
+
+def _parse_header(header_rows):
+    stats = []
+    war = None
+    for th in (th for row in header_rows for th in row.find_all("th")):
+        text = th.text.strip()
+        title = th.find("div", class_="th_tit")
+        if "tooltip" in th.attrs or (title is not None and "tooltip" in title.attrs):
+            abbreviation = text.replace("▼", "").strip()
+        elif text and text not in ("Rank", "Name", "Team", "Sort▼", "비율"):
+            abbreviation = text
+        else:
+            continue
+        if not abbreviation or abbreviation in _SKIP_HEADERS:
+            continue
+        if abbreviation == "WAR":
+            war = abbreviation
+        else:
+            stats.append(abbreviation)
+    header = ["Name", "Team", "Position"] + list(OrderedDict.fromkeys(stats))
+    if war:
+        header.append(war)
+    return header
+
+
+def _parse_row(row):
+    cols = row.find_all("td")
+    if not cols:
+        return None
+    values = []
+    for i, col in enumerate(cols[1:]):  # Rank 컬럼 제외
+        if i == 2:  # 네 번째 컬럼 스킵
+            continue
+        if "teams" in col.decode():
+            img_tag = col.find("img")
+            spans = col.find_all("span")
+            values.append(_team_name(img_tag.get("src")) if img_tag else "")
+            values.append(spans[-1].text.strip() if img_tag and spans else "")
+        else:
+            values.append(col.text.strip())
+    return values
+
+
+def parse_page(html):
+    """statiz 기록 페이지에서 (헤더, 행 목록)을 꺼냅니다. 표가 없으면 ValueError."""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table")
+    tbody = table.find("tbody") if table else None
+    if tbody is None:
+        raise ValueError("웹 페이지에서 테이블 본문을 찾을 수 없습니다.")
+    rows = tbody.find_all("tr")
+    header = _parse_header(rows[:2])
+    data = [values for values in map(_parse_row, rows[2:]) if values is not None]
+    width = len(header)
+    bad = [values for values in data if len(values) != width]
+    if bad:
+        raise ValueError(f"헤더({width}개)와 컬럼 수가 다른 행이 {len(bad)}개 있습니다: {bad[0][:3]}")
+    return header, data
+
+
+# --- CSV 쓰기와 행 단위 변경 내역 ---
+def _keyed_rows(header, rows):
+    fields = [({column: value.strip() for column, value in zip(header, values)}, i) for i, values in enumerate(rows)]
+    return OrderedDict(zip(im.row_keys_from_fields(fields), rows))
+
+
+def read_csv(path):
+    """기존 CSV의 (헤더, 행 목록). 없으면 ([], [])."""
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))
+    except FileNotFoundError:
+        return [], []
+    return (rows[0], rows[1:]) if rows else ([], [])
+
+
+def diff_rows(old_header, old_rows, header, rows):
+    """행 키 기준 변경 내역 {"added", "changed", "removed": [행 키], "columns_changed": bool}."""
+    old, new = _keyed_rows(old_header, old_rows), _keyed_rows(header, rows)
+    return {
+        "added": [key for key in new if key not in old],
+        "changed": [key for key in new if key in old and new[key] != old[key]],
+        "removed": [key for key in old if key not in new],
+        "columns_changed": bool(old_header) and old_header != header,
+    }
+
+
+def write_csv_atomic(path, header, rows):
+    """임시 파일에 쓴 뒤 교체합니다 (앱이 읽는 도중 반쯤 쓰인 CSV를 보지 않도록). 노트북과 같은 utf-8-sig 형식."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".collect-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(header)
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --- 수집 ---
+class StatsCollector:
+    """
+    (스탯 종류, 시즌) 페이지들을 동시에 수집합니다. 조건부 요청 상태는 출력 폴더의 .collector_state.json에 저장하며,
+    CSV 파일이 없으면 조건부 헤더를 보내지 않습니다.
+    """
+
+    def __init__(self, output_dir=_DEFAULT_OUTPUT_DIR, base_url=_BASE_URL, concurrency=_DEFAULT_CONCURRENCY,
+                 session=None, save_pages_dir=None):
+        self.output_dir = output_dir
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.session = session or make_session(concurrency)
+        self.save_pages_dir = save_pages_dir
+        self._state_path = os.path.join(output_dir, _STATE_FILENAME)
+        self._state = self._load_state()
+        self._lock = threading.Lock()
+
+    def _load_state(self):
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix=".state-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self._state_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def collect_one(self, table, season):
+        """페이지 하나를 받아 CSV를 갱신하고 결과 딕셔너리를 반환합니다 (예외는 error로 기록)."""
+        url = page_url(self.base_url, table, season)
+        path = os.path.join(self.output_dir, csv_filename(table, season))
+        result = {"table": table, "season": season, "file": os.path.basename(path), "status": None, "error": None}
+        try:
+            headers = {}
+            with self._lock:
+                cached = self._state.get(url, {}) if os.path.exists(path) else {}
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+            response = self.session.get(url, headers=headers, timeout=_TIMEOUT)
+            result["status"] = response.status_code
+            if response.status_code == 304:
+                result["unchanged"] = True
+                return result
+            response.raise_for_status()
+            body_sha = hashlib.sha256(response.content).hexdigest()
+            if self.save_pages_dir:
+                os.makedirs(self.save_pages_dir, exist_ok=True)
+                with open(os.path.join(self.save_pages_dir, f"{table}_{season}.html"), "wb") as f:
+                    f.write(response.content)
+            if body_sha == cached.get("sha256"):
+                result["unchanged"] = True  # 검증 헤더가 없는 서버: 본문이 같으면 파싱 생략
+            else:
+                header, rows = parse_page(response.text)
+                old_header, old_rows = read_csv(path)
+                changes = diff_rows(old_header, old_rows, header, rows)
+                result.update(changes, rows=len(rows))
+                result["unchanged"] = os.path.exists(path) and not (
+                    changes["added"] or changes["changed"] or changes["removed"] or changes["columns_changed"])
+                if not result["unchanged"]:
+                    write_csv_atomic(path, header, rows)
+            with self._lock:
+                self._state[url] = {"etag": response.headers.get("ETag"),
+                                    "last_modified": response.headers.get("Last-Modified"), "sha256": body_sha}
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    def collect(self, tables, seasons):
+        """모든 (스탯 종류, 시즌) 조합을 동시에 수집합니다. 결과 목록을 요청 순서대로 반환합니다."""
+        targets = [(table, season) for season in seasons for table in tables]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="collect") as executor:
+            results = list(executor.map(lambda target: self.collect_one(*target), targets))
+        with self._lock:
+            self._save_state()
+        return results
+
+
+def changed_files(results):
+    """CSV 내용이 실제로 바뀐 파일 이름 목록."""
+    return [result["file"] for result in results if not result["error"] and not result.get("unchanged")]
+
+
+def collect(seasons, tables=("batting", "pitching"), output_dir=_DEFAULT_OUTPUT_DIR, base_url=_BASE_URL,
+            concurrency=_DEFAULT_CONCURRENCY, save_pages_dir=None, refresh_index=True):
+    """
+    수집 후 결과 목록을 반환합니다. 바뀐 CSV가 있고 refresh_index=True이면 같은 프로세스의
+    캐시된 벡터스토어/답변 캐시를 비워 다음 접근 시 바뀐 행만 증분 임베딩하도록 합니다.
+    """
+    collector = StatsCollector(output_dir, base_url, concurrency, save_pages_dir=save_pages_dir)
+    results = collector.collect(list(tables), list(seasons))
+    for result in results:
+        print(format_result(result))
+    if refresh_index and changed_files(results):
+        import GetAnswer as ga  # 수집만 할 때는 LangChain을 불러오지 않음
+        ga.invalidate_vectorstores()
+        print(f"인덱스 갱신 예정: {', '.join(changed_files(results))}")
+    return results
+
+
+def format_result(result):
+    name = f"{result['file']} ({result['table']} {result['season']})"
+    if result["error"]:
+        return f"[실패] {name}: {result['error']}"
+    if result.get("unchanged"):
+        return f"[변경 없음] {name} (HTTP {result['status']})"
+    return (f"[갱신] {name}: 행 {result['rows']}개, 추가 {len(result['added'])} / 변경 {len(result['changed'])} / "
+            f"삭제 {len(result['removed'])}" + (" (컬럼 변경)" if result["columns_changed"] else ""))
+
+
+# --- 저장한 페이지를 제공하는 로컬 HTTP 서버 (수집기 시험용) ---
+class _SavedPageHandler(BaseHTTPRequestHandler):
+    """?m2=<스탯 종류>&year=<시즌> 요청에 <스탯 종류>_<시즌>.html을 돌려주고, ETag/Last-Modified 조건부 요청을 지원합니다."""
+
+    pages_dir = "."
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        name = f"{query.get('m2', [''])[0]}_{query.get('year', [''])[0]}.html"
+        path = os.path.join(self.pages_dir, os.path.basename(name))
+        if not re.fullmatch(r"\w+_\d{4}\.html", name) or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        mtime = int(os.path.getmtime(path))
+        since = self.headers.get("If-Modified-Since")
+        not_modified = self.headers.get("If-None-Match") == etag
+        if not not_modified and since and not self.headers.get("If-None-Match"):
+            try:
+                not_modified = parsedate_to_datetime(since).timestamp() >= mtime
+            except (TypeError, ValueError):
+                pass
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[serve] {self.address_string()} {format % args}")
+
+
+def serve_saved_pages(pages_dir, port=8765, host="127.0.0.1"):
+    """저장한 페이지 폴더를 제공하는 서버를 만듭니다 (serve_forever()는 호출자가)."""
+    handler = type("SavedPageHandler", (_SavedPageHandler,), {"pages_dir": pages_dir})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def _parse_list(text):
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="statiz KBO 기록을 수집해 BaseballCSVs를 갱신합니다.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collect_parser = commands.add_parser("collect", help="기록 페이지를 받아 CSV 갱신")
+    collect_parser.add_argument("--seasons", default=_DEFAULT_SEASONS, help="시즌 목록 (쉼표 구분)")
+    collect_parser.add_argument("--tables", default=_DEFAULT_TABLES, help=f"스탯 종류 ({', '.join(_STAT_PAGES)})")
+    collect_parser.add_argument("-o", "--output-dir", default=_DEFAULT_OUTPUT_DIR)
+    collect_parser.add_argument("--base-url", default=_BASE_URL, help="기록 사이트 주소 (로컬 시험 서버 등)")
+    collect_parser.add_argument("--concurrency", type=int, default=_DEFAULT_CONCURRENCY)
+    collect_parser.add_argument("--save-pages", help="받은 HTML을 저장할 폴더 (serve로 다시 제공 가능)")
+    collect_parser.add_argument("--report", help="결과(행 단위 변경 내역 포함)를 저장할 JSON 파일")
+    serve_parser = commands.add_parser("serve", help="저장한 페이지를 로컬 HTTP 서버로 제공")
+    serve_parser.add_argument("pages_dir")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = serve_saved_pages(args.pages_dir, args.port)
+        print(f"저장된 페이지 제공 중: http://127.0.0.1:{args.port} ({args.pages_dir})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    tables = _parse_list(args.tables)
+    unknown = [table for table in tables if table not in _STAT_PAGES]
+    if unknown:
+        parser.error(f"알 수 없는 스탯 종류: {', '.join(unknown)}")
+    results = collect([int(season) for season in _parse_list(args.seasons)], tables, args.output_dir,
+                      args.base_url, args.concurrency, args.save_pages, refresh_index=False)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if any(result["error"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
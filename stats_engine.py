@@ -0,0 +1,365 @@
+# stats_engine.py (BaseballCSVs 집계/순위 질문을 LLM 검색 없이 정확히 계산하는 컬럼형 질의 엔진)
+import os
+import re
+import glob
+import fnmatch
+import functools
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from lexical_index import HANGUL_BOUNDARY, LATIN_BOUNDARY, compile_names
+
+# 파일 이름으로 구분하는 스탯 종류
+_TABLE_PATTERNS = {"batting": "*batting*.csv", "pitching": "*pitching*.csv"}
+_TABLE_LABELS = {"batting": "타자", "pitching": "투수"}
+_QUALIFY_LABELS = {"batting": "규정 타석", "pitching": "규정 이닝"}
+
+# 낮을수록 좋은 지표 ("상위"/"최고" 질문 시 오름차순 정렬)
+_LOWER_IS_BETTER = {
+    "batting": {"SO", "GDP", "CS"},
+    "pitching": {"ERA", "FIP", "WHIP", "RA9", "rRA9", "rRA9pf", "rRA", "ER", "R", "H", "HR", "BB", "HP", "WP", "BK", "L"},
+}
+
+# 규정 타석/이닝을 적용할 비율 지표 (표본이 작은 선수가 상위를 차지하지 않도록)
+_RATE_STATS = {
+    "batting": {"AVG", "OBP", "SLG", "OPS", "wRC+", "R/ePA"},
+    "pitching": {"ERA", "FIP", "WHIP", "RA9", "rRA9", "rRA9pf"},
+}
+_QUALIFY_PA_PER_GAME = 3.1
+_QUALIFY_IP_PER_GAME = 1.0
+# 팀 비율 지표는 선수별 값의 평균이 아니라 구성 요소 합으로 계산 (분자 컬럼 -> 가중치, 분모 컬럼, 배율)
+# 구성 요소가 CSV에 없는 지표(wRC+, FIP 등)는 타석/이닝 가중 평균
+_TEAM_RATE_FORMULAS = {
+    "batting": {
+        "AVG": (("H",), ("AB",), 1),
+        "OBP": (("H", "BB", "HP"), ("AB", "BB", "HP", "SF"), 1),
+        "SLG": (("TB",), ("AB",), 1),
+    },
+    "pitching": {
+        "ERA": (("ER",), ("IP",), 9),
+        "RA9": (("R",), ("IP",), 9),
+        "WHIP": (("H", "BB"), ("IP",), 1),
+    },
+}
+_RATE_WEIGHTS = {"batting": "PA", "pitching": "IP"}
+# 팀별 선수 평균(비율이 아닌 지표)에서 뺄 작은 표본 (몇 타석/이닝만 뛴 선수가 평균을 흔들지 않도록)
+_GROUP_MIN_SAMPLE = {"batting": ("PA", 10), "pitching": ("IP", 5.0)}
+
+# 한글/영문 지표 별칭 -> 컬럼 이름 (긴 별칭 먼저 매칭)
+_METRIC_ALIASES = {
+    "평균자책점": "ERA", "평균자책": "ERA", "방어율": "ERA",
+    "승리기여도": "WAR", "대체선수대비": "WAR",
+    "출루율": "OBP", "장타율": "SLG", "타율": "AVG",
+    "홈런": "HR", "타점": "RBI", "도루": "SB", "안타": "H", "볼넷": "BB", "삼진": "SO",
+    "득점": "R", "타석": "PA", "타수": "AB", "2루타": "2B", "3루타": "3B", "루타": "TB",
+    "다승": "W", "승리": "W", "세이브": "S", "홀드": "HD", "이닝": "IP", "패전": "L",
+    "탈삼진": "SO", "피안타": "H", "피홈런": "HR",
+}
+
+TEAM_ALIASES = {
+    "엘지": "LG", "lg": "LG", "kia": "기아", "nc": "엔씨", "ssg": "SSG", "kt": "KT",
+    "케이티": "KT", "쓱": "SSG",
+}
+
+_POSITION_ALIASES = {
+    "포수": "C", "1루수": "1B", "2루수": "2B", "3루수": "3B", "유격수": "SS",
+    "좌익수": "LF", "중견수": "CF", "우익수": "RF", "지명타자": "DH",
+}
+
+# 순위 방향: 글자 그대로의 높고 낮음 / 평가(좋고 나쁨, 지표에 따라 정렬 방향이 달라짐)
+_HIGH_WORDS = re.compile(r"(highest|most|높은|많은|최다|최대)", re.IGNORECASE)
+_LOW_WORDS = re.compile(r"(lowest|least|낮은|적은|최저|최소)", re.IGNORECASE)
+_WORST_WORDS = re.compile(r"(worst|최하위|하위|꼴찌|최악)", re.IGNORECASE)
+_RANK_WORDS = re.compile(r"(top|best|상위|최고|가장|제일|1위|순위|랭킹|리더|선두)", re.IGNORECASE)
+_BEST_WORDS = re.compile(r"(best|top|최고|1위|(?<!하)상위|잘하는|잘한)", re.IGNORECASE)
+_SINGLE_WORDS = re.compile(r"(가장|제일|1위|최고|최저|최다|최소|best|worst|highest|lowest|most|least)", re.IGNORECASE)
+_MEAN_WORDS = re.compile(r"(평균|average|mean)", re.IGNORECASE)
+_SUM_WORDS = re.compile(r"(합계|총합|합산|총|total|sum)", re.IGNORECASE)
+_COUNT_PATTERN = re.compile(r"(?:top\s*(\d+)|(?:상위|하위)\s*(\d+)|(\d+)\s*(?:명|위|개))", re.IGNORECASE)
+_PITCHING_WORDS = re.compile(r"(투수|pitcher|pitching|선발|불펜|마무리)", re.IGNORECASE)
+_BATTING_WORDS = re.compile(r"(타자|batter|hitter|batting|야수)", re.IGNORECASE)
+
+_DEFAULT_LIMIT = 5
+_MAX_LIMIT = 30
+
+
+@dataclass
+class StatsQuery:
+    """구조화된 통계 질의 (필터 -> 정렬/Top-N 또는 그룹 집계)."""
+    table: str
+    metric: str
+    ascending: bool = False
+    limit: int = _DEFAULT_LIMIT
+    filters: dict = field(default_factory=dict)
+    group_by: str = None
+    agg: str = None  # "mean" | "sum" (group_by 사용 시)
+    qualified: bool = True
+
+
+class StatsEngine:
+    """CSV를 타입이 지정된 pandas 컬럼으로 적재하고 StatsQuery를 실행합니다."""
+
+    def __init__(self, directory_path):
+        self.tables = {}
+        for table, pattern in _TABLE_PATTERNS.items():
+            frames = []
+            for csv_file in sorted(glob.glob(os.path.join(directory_path, pattern))):
+                frame = pd.read_csv(csv_file, encoding="utf-8-sig")
+                season = re.search(r"(\d{4})", os.path.basename(csv_file))
+                frame["Season"] = int(season.group(1)) if season else None
+                frames.append(frame)
+            if frames:
+                frame = pd.concat(frames, ignore_index=True)
+                if "IP" in frame.columns:
+                    # 8.2이닝 = 8과 2/3이닝
+                    whole = frame["IP"].fillna(0).astype(int)
+                    frame["IP"] = whole + (frame["IP"].fillna(0) - whole).round(1) * 10 / 3
+                self.tables[table] = frame
+        self.teams = sorted({team for frame in self.tables.values() for team in frame["Team"].dropna().unique()})
+        self.players = sorted({name for frame in self.tables.values() for name in frame["Name"].dropna().unique()})
+        # 선수/팀 이름 언급 여부 확인용 (이름 역색인과 같은 경계 규칙: 영문 약어는 글자 경계, 한글은 어절 앞 + 조사)
+        entities = {entity for entity in (*self.players, *self.teams, *TEAM_ALIASES) if entity}
+        latin = {entity for entity in entities if re.search(r"[A-Za-z]", entity)}
+        self._entity_patterns = [pattern for pattern in (compile_names(entities - latin, HANGUL_BOUNDARY),
+                                                         compile_names(latin, LATIN_BOUNDARY)) if pattern is not None]
+
+    def mentions_entity(self, text):
+        """텍스트에 CSV의 선수 이름이나 팀 이름(별칭 포함)이 들어 있으면 True."""
+        return any(pattern.search(text) for pattern in self._entity_patterns)
+
+    def columns(self, table):
+        return [column for column in self.tables[table].columns if column not in ("Name", "Team", "Position", "Season")]
+
+    def execute(self, query):
+        """질의를 실행하여 결과 DataFrame을 반환합니다."""
+        frame = self.tables[query.table]
+        for column, value in query.filters.items():
+            frame = frame[frame[column] == value]
+
+        if query.group_by:
+            if query.metric in _RATE_STATS[query.table]:
+                result = self._group_rate(query.table, frame, query.group_by, query.metric)
+            elif query.agg == "mean":
+                column, minimum = _GROUP_MIN_SAMPLE[query.table]
+                result = frame[frame[column] >= minimum].groupby(query.group_by)[query.metric].mean()
+            else:
+                result = frame.groupby(query.group_by)[query.metric].sum()
+            result = result.dropna().sort_values(ascending=query.ascending).reset_index()
+            return result.head(query.limit) if query.limit else result
+
+        if query.qualified and query.metric in _RATE_STATS[query.table]:
+            frame = frame[self._qualified_mask(query.table, frame)]
+        frame = frame.dropna(subset=[query.metric])
+        frame = frame.sort_values(query.metric, ascending=query.ascending, kind="mergesort")
+        return frame.head(query.limit)[["Name", "Team", "Position", query.metric]]
+
+    @staticmethod
+    def _group_rate(table, frame, group_by, metric):
+        """팀(그룹) 비율 지표: 구성 요소 합의 비율 (ERA = 자책점 합 * 9 / 이닝 합), OPS는 OBP + SLG."""
+        formulas = _TEAM_RATE_FORMULAS[table]
+        grouped = frame.groupby(group_by)
+
+        def ratio(name):
+            numerator, denominator, scale = formulas[name]
+            totals = grouped[list(set(numerator + denominator))].sum()
+            bottom = totals[list(denominator)].sum(axis=1)
+            return (totals[list(numerator)].sum(axis=1) * scale / bottom.where(bottom > 0)).rename(metric)
+
+        if metric in formulas:
+            return ratio(metric)
+        if metric == "OPS":
+            return (ratio("OBP") + ratio("SLG")).rename(metric)
+        weight = _RATE_WEIGHTS[table]
+        weighted = frame.assign(_weighted=frame[metric] * frame[weight]).dropna(subset=[metric])
+        totals = weighted.groupby(group_by)[["_weighted", weight]].sum()
+        return (totals["_weighted"] / totals[weight].where(totals[weight] > 0)).rename(metric)
+
+    def describe(self, query, result):
+        """실행 결과를 LLM 컨텍스트로 쓸 수 있는 짧은 텍스트로 정리합니다."""
+        label = _TABLE_LABELS[query.table]
+        conditions = ", ".join(f"{column}={value}" for column, value in query.filters.items())
+        scope = f"{conditions} " if conditions else ""
+        if query.group_by:
+            if query.metric in _RATE_STATS[query.table]:
+                agg_label = "팀 기록 (구성 요소 합산)"
+            elif query.agg == "mean":
+                column, minimum = _GROUP_MIN_SAMPLE[query.table]
+                agg_label = f"선수 평균 ({column} {minimum:g} 이상)"
+            else:
+                agg_label = "합계"
+            lines = [f"[통계 엔진 결과] {scope}{label} 팀별 {query.metric} {agg_label} ({len(result)}개 팀)"]
+            for rank, row in enumerate(result.itertuples(index=False), start=1):
+                lines.append(f"{rank}. {row[0]}: {query.metric} {self._format(row[1])}")
+            return "\n".join(lines)
+
+        order = "낮은" if query.ascending else "높은"
+        note = f" ({_QUALIFY_LABELS[query.table]} 이상)" if query.qualified and query.metric in _RATE_STATS[query.table] else ""
+        lines = [f"[통계 엔진 결과] {scope}{label} {query.metric} {order} 순 상위 {len(result)}명{note}"]
+        for rank, row in enumerate(result.itertuples(index=False), start=1):
+            lines.append(f"{rank}. {row.Name} ({row.Team}, {row.Position}) - {query.metric} {self._format(row[3])}")
+        if result.empty:
+            lines.append("조건에 맞는 선수가 없습니다.")
+        return "\n".join(lines)
+
+    def _qualified_mask(self, table, frame):
+        full = self.tables[table]
+        if table == "batting":
+            return frame["PA"] >= full["G"].max() * _QUALIFY_PA_PER_GAME
+        return frame["IP"] >= full["G"].max() * _QUALIFY_IP_PER_GAME
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, float):
+            return f"{value:.3f}".rstrip("0").rstrip(".")
+        return str(value)
+
+
+def detect_table(text):
+    """질문이 투수/타자 중 어느 쪽을 묻는지 ("pitching" / "batting" / None)."""
+    if _PITCHING_WORDS.search(text):
+        return "pitching"
+    if _BATTING_WORDS.search(text):
+        return "batting"
+    return None
+
+
+def question_intent(text):
+    """
+    답변 캐시가 섞으면 안 되는 질문 의도: (투수/타자, 순위 방향 표현들).
+    "타율 가장 높은"과 "타율 가장 낮은", "1위"와 "꼴찌"는 임베딩이 가까워도 답이 반대입니다.
+    """
+    directions = (("high", _HIGH_WORDS), ("low", _LOW_WORDS), ("worst", _WORST_WORDS), ("best", _BEST_WORDS))
+    return detect_table(text), tuple(name for name, pattern in directions if pattern.search(text))
+
+
+def table_of_file(file_name):
+    """CSV 파일 이름으로 스탯 종류를 구분합니다 (_TABLE_PATTERNS 기준, 해당 없으면 None)."""
+    for table, pattern in _TABLE_PATTERNS.items():
+        if fnmatch.fnmatch(file_name.lower(), pattern):
+            return table
+    return None
+
+
+def parse_query(engine, text):
+    """
+    자연어 질문에서 지표/필터/정렬/집계 의도를 추출합니다.
+    지표와 순위·집계 의도가 모두 있어야 StatsQuery를 반환하고, 아니면 None (RAG로 처리).
+    """
+    remaining = text
+    metric = None
+    for alias in sorted(_METRIC_ALIASES, key=len, reverse=True):
+        # 숫자 바로 뒤의 별칭은 다른 지표의 일부 ("2루타" 안의 "루타")
+        match = re.search(rf"(?<!\d){re.escape(alias)}", remaining)
+        if match:
+            metric = _METRIC_ALIASES[alias]
+            remaining = remaining[:match.start()] + " " + remaining[match.end():]
+            break
+
+    table = detect_table(text)
+
+    if metric is None:
+        # 영문 컬럼명 직접 언급 (ERA 안의 ER 같은 부분 매칭 방지를 위해 긴 이름 먼저, 영문 경계 확인)
+        candidates = set()
+        for name in engine.tables:
+            candidates.update(engine.columns(name))
+        for column in sorted(candidates, key=len, reverse=True):
+            if len(column) < 2:
+                continue
+            match = re.search(rf"(?<![A-Za-z]){re.escape(column)}(?![A-Za-z])", remaining)
+            if match:
+                metric = column
+                remaining = remaining[:match.start()] + " " + remaining[match.end():]
+                break
+    if metric is None:
+        return None
+
+    if table is None or metric not in engine.tables.get(table, pd.DataFrame()).columns:
+        in_batting = "batting" in engine.tables and metric in engine.tables["batting"].columns
+        table = "batting" if in_batting else "pitching"
+    if table not in engine.tables or metric not in engine.tables[table].columns:
+        return None
+
+    query = StatsQuery(table=table, metric=metric)
+    lowered = remaining.lower()
+    for team in engine.teams:
+        if team in remaining or team.lower() in lowered:
+            query.filters["Team"] = team
+            break
+    else:
+        for alias, team in TEAM_ALIASES.items():
+            if re.search(rf"(?<![A-Za-z가-힣]){re.escape(alias)}(?![A-Za-z])", lowered):
+                query.filters["Team"] = team
+                break
+    for alias, position in _POSITION_ALIASES.items():
+        if alias in remaining and table == "batting":
+            query.filters["Position"] = position
+            break
+
+    is_group = re.search(r"(팀별|팀 |구단|team)", remaining, re.IGNORECASE)
+    is_ranking = any(pattern.search(remaining) for pattern in (_HIGH_WORDS, _LOW_WORDS, _WORST_WORDS, _RANK_WORDS, _COUNT_PATTERN))
+    if is_group and (_MEAN_WORDS.search(remaining) or _SUM_WORDS.search(remaining)):
+        query.group_by = "Team"
+        query.agg = "mean" if _MEAN_WORDS.search(remaining) else "sum"
+        query.limit = None
+    elif not is_ranking:
+        return None
+
+    lower_better = metric in _LOWER_IS_BETTER[table]
+    if _LOW_WORDS.search(remaining):
+        query.ascending = True
+    elif _HIGH_WORDS.search(remaining):
+        query.ascending = False
+    elif _WORST_WORDS.search(remaining):
+        query.ascending = not lower_better
+    else:
+        query.ascending = lower_better
+    if query.group_by:
+        return query
+
+    count = _COUNT_PATTERN.search(remaining)
+    if count:
+        query.limit = min(int(next(group for group in count.groups() if group)), _MAX_LIMIT)
+    elif _SINGLE_WORDS.search(remaining):
+        query.limit = 1
+    return query
+
+
+def _csv_fingerprint(directory_path):
+    paths = sorted(glob.glob(os.path.join(directory_path, "*.csv")))
+    return tuple((path, os.path.getmtime(path)) for path in paths)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_engine(directory_path, fingerprint):
+    return StatsEngine(directory_path)
+
+
+def get_engine(directory_path):
+    """CSV가 바뀌지 않았다면 프로세스 내에서 로드된 엔진을 재사용합니다."""
+    return _load_engine(directory_path, _csv_fingerprint(directory_path))
+
+
+def mentions_entity(directory_path, text):
+    """질문에 선수/팀 이름이 들어 있는지 확인합니다. 데이터 폴더가 없으면 False."""
+    if not os.path.isdir(directory_path):
+        return False
+    return get_engine(directory_path).mentions_entity(text)
+
+
+def handles(directory_path, text):
+    """질문이 통계 엔진으로 처리되는지 (계산 없이 해석만 확인). 데이터 폴더가 없으면 False."""
+    if not os.path.isdir(directory_path):
+        return False
+    return parse_query(get_engine(directory_path), text) is not None
+
+
+def answer(directory_path, text):
+    """질문이 집계/순위 질의이면 계산 결과 텍스트를, 아니면 None을 반환합니다."""
+    if not os.path.isdir(directory_path):
+        return None
+    engine = get_engine(directory_path)
+    query = parse_query(engine, text)
+    if query is None:
+        return None
+    return engine.describe(query, engine.execute(query))
@@ -0,0 +1,70 @@
+# trace_callbacks.py (LangChain LLM 호출을 tracing span으로 기록하는 콜백)
+#
+# langchain_core 임포트(pydantic 포함 약 170ms)가 필요하므로 tracing.py와 분리해 GetAnswer에서만 임포트합니다.
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+import tracing
+
+
+class LangChainSpanHandler(BaseCallbackHandler):
+    """
+    LangChain 콜백으로 LLM 호출을 span으로 기록합니다. StuffDocumentsChain 아래에서 호출된 LLM은
+    답변 LLM(answer_llm), 그 밖의 LLM은 질문 재구성 LLM(condense_llm)으로 구분합니다.
+    생성 시점의 현재 trace에 기록하므로 체인을 다른 스레드에서 실행해도 됩니다.
+    """
+
+    def __init__(self, trace=None):
+        self.trace = trace or tracing.current_trace()
+        self._chains = {}  # run_id -> (체인 이름, 부모 run_id)
+        self._llm_runs = {}  # run_id -> 진행 중인 LLM 호출 정보
+
+    def _enabled(self):
+        return self.trace is not None and self.trace.sampled
+
+    def _span_name(self, parent_run_id):
+        while parent_run_id is not None:
+            chain_name, parent_run_id = self._chains.get(parent_run_id, (None, None))
+            if chain_name == "StuffDocumentsChain":
+                return "answer_llm"
+        return "condense_llm"
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if self._enabled():
+            self._chains[run_id] = (kwargs.get("name"), parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        if not self._enabled():
+            return
+        prompt_chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        self._llm_runs[run_id] = {"name": self._span_name(parent_run_id), "start": time.perf_counter(),
+                                  "prompt_chars": prompt_chars, "streamed_tokens": 0, "first_token": None}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._llm_runs.get(run_id)
+        if run is not None:
+            run["streamed_tokens"] += 1
+            if run["first_token"] is None:
+                run["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._llm_runs.pop(run_id, None)
+        if run is None:
+            return
+        attrs = {"prompt_chars": run["prompt_chars"]}
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        if generation is not None:
+            attrs["completion_chars"] = len(generation.text)
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                attrs["prompt_tokens"] = usage.get("input_tokens")
+                attrs["completion_tokens"] = usage.get("output_tokens")
+        if "completion_tokens" not in attrs and run["streamed_tokens"]:
+            attrs["completion_tokens"] = run["streamed_tokens"]
+        if run["first_token"] is not None:
+            attrs["ttft_ms"] = round((run["first_token"] - run["start"]) * 1000, 2)
+        self.trace.add_span(run["name"], run["start"], time.perf_counter(), **attrs)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._llm_runs.pop(run_id, None)
+        if run is not None:
+            self.trace.add_span(run["name"], run["start"], time.perf_counter(), error=type(error).__name__)
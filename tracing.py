@@ -0,0 +1,155 @@
+# tracing.py (대화 한 턴의 단계별 소요 시간을 span으로 기록해 JSON Lines로 내보내는 경량 트레이서)
+#
+# 한 턴(trace) 안에서 질문 재구성 LLM, 질의 임베딩, FAISS 검색, 답변 LLM, TTS 정규화/합성, 화면 재실행 렌더링을
+# span으로 기록합니다. 현재 trace는 contextvars로 전달되므로 워커 스레드에서는 contextvars.copy_context()로 넘겨야 합니다.
+#
+# 환경 변수:
+#   ONEDAYAI_TRACE_SAMPLE_RATE  기록할 턴의 비율 (0.0~1.0, 기본 1.0). 샘플링되지 않은 턴의 span은 아무 일도 하지 않음
+#   ONEDAYAI_TRACE_FILE         JSON Lines 출력 파일 (기본 traces.jsonl, 빈 문자열이면 파일로 내보내지 않음)
+# app.py가 첫 화면 전에 임포트하므로 LangChain 임포트는 하지 않습니다. LLM 호출 span 콜백은 trace_callbacks.py에 있습니다.
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import contextlib
+import contextvars
+
+_SAMPLE_RATE = float(os.environ.get("ONEDAYAI_TRACE_SAMPLE_RATE", "1.0"))
+_TRACE_FILE = os.environ.get("ONEDAYAI_TRACE_FILE", "traces.jsonl")
+
+_current_trace = contextvars.ContextVar("onedayai_trace", default=None)
+_write_lock = threading.Lock()
+
+
+class Trace:
+    """한 턴의 span 목록. 여러 스레드(답변 체인, TTS 워커)에서 동시에 span을 추가할 수 있습니다."""
+
+    def __init__(self, name, sampled=True, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.sampled = sampled
+        self.attrs = attrs
+        self.spans = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.total_ms = None
+
+    def add_span(self, name, start, end, **attrs):
+        """perf_counter 기준 시작/종료 시각으로 span을 추가합니다."""
+        if not self.sampled:
+            return
+        record = {
+            "name": name,
+            "start_ms": round((start - self._start) * 1000, 2),
+            "duration_ms": round((end - start) * 1000, 2),
+            "thread": threading.current_thread().name,
+        }
+        record.update(attrs)
+        with self._lock:
+            self.spans.append(record)
+
+    def breakdown(self):
+        """span 이름별 (합계 ms, 횟수) 목록을 처음 나타난 순서대로 반환합니다."""
+        totals = {}
+        with self._lock:
+            for record in self.spans:
+                total, count = totals.get(record["name"], (0.0, 0))
+                totals[record["name"]] = (total + record["duration_ms"], count + 1)
+        return [(name, total, count) for name, (total, count) in totals.items()]
+
+    def finish(self, **attrs):
+        """trace를 끝내고 JSON 한 줄로 내보냅니다 (샘플링된 경우만). 기록 딕셔너리를 반환합니다."""
+        self.attrs.update(attrs)
+        self.total_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": round(self.started_at, 3),
+            "total_ms": self.total_ms,
+            "attrs": self.attrs,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+        if self.sampled and _TRACE_FILE:
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            try:
+                with _write_lock, open(_TRACE_FILE, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                print(f"trace 기록 실패 (무시): {e}")
+        return record
+
+
+def start_trace(name, sample_rate=None, **attrs):
+    """새 trace를 만듭니다 (샘플링 여부는 여기서 결정). 현재 trace로 지정하려면 use_trace()를 사용하세요."""
+    rate = _SAMPLE_RATE if sample_rate is None else sample_rate
+    return Trace(name, sampled=rate >= 1.0 or random.random() < rate, **attrs)
+
+
+@contextlib.contextmanager
+def use_trace(trace):
+    """블록 안에서 trace를 현재 trace로 지정합니다."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def annotate(**attrs):
+    """현재 trace의 속성(턴 단위 정보: 검색 경로 등)을 추가합니다. trace가 없으면 무시합니다."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    현재 trace에 span을 기록합니다. yield되는 딕셔너리에 토큰 수/바이트 수 등을 채우면 함께 기록됩니다.
+    현재 trace가 없거나 샘플링되지 않았으면 시간도 재지 않습니다.
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        trace.add_span(name, start, time.perf_counter(), **attrs)
+
+
+def format_breakdown(trace, labels=None):
+    """설정 화면 표시용 '이름 ms' 문자열 목록을 반환합니다."""
+    labels = labels or {}
+    lines = []
+    for name, total_ms, count in trace.breakdown():
+        suffix = f" ×{count}" if count > 1 else ""
+        lines.append(f"{labels.get(name, name)}: {total_ms:,.0f}ms{suffix}")
+    return lines
+
+
+def read_traces(path=None, limit=None):
+    """내보낸 trace 기록(JSON Lines)을 읽습니다. limit이 있으면 마지막 limit개만. 파일이 없으면 빈 목록."""
+    path = path or _TRACE_FILE
+    if not path:
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    records = []
+    for line in lines[-limit:] if limit else lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # 쓰는 도중의 마지막 줄 등
+    return records
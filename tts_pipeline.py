@@ -0,0 +1,158 @@
+# tts_pipeline.py (LLM 토큰 스트림을 문장 단위로 잘라 TTS를 병렬로 미리 합성하는 파이프라인)
+import re
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+_MAX_TTS_WORKERS = 4  # 프로세스 전체에서 동시에 진행할 TTS 호출 수
+_MIN_SEGMENT_CHARS = 12  # 이보다 짧은 문장은 다음 문장과 합쳐 호출 수를 줄임
+
+# 문장 끝: 종결 부호 뒤에 공백/줄바꿈이 오거나, 줄바꿈 자체 ("0.373" 같은 소수점은 끊지 않음)
+_SENTENCE_END = re.compile(r"(?<=[.!?。…])\s+|\n+")
+
+_shared_executor = ThreadPoolExecutor(max_workers=_MAX_TTS_WORKERS, thread_name_prefix="tts")
+
+
+class SentenceSegmenter:
+    """스트리밍 텍스트 조각을 받아 완성된 문장 단위로 돌려줍니다."""
+
+    def __init__(self, min_chars=_MIN_SEGMENT_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """새 텍스트를 추가하고, 확정된 문장 목록을 반환합니다."""
+        self._buffer += text
+        segments = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            if len(candidate) >= self.min_chars:
+                segments.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return segments
+
+    def flush(self):
+        """남은 텍스트를 마지막 문장으로 반환합니다."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+class TTSPipeline:
+    """
+    문장이 확정되는 즉시 synthesize(문장)을 제한된 스레드 풀에서 실행하고,
+    결과는 제출 순서대로 돌려줍니다. LLM 생성과 음성 합성이 겹쳐 진행됩니다.
+    """
+
+    def __init__(self, synthesize, executor=None, min_chars=_MIN_SEGMENT_CHARS):
+        self._synthesize = synthesize
+        self._executor = executor or _shared_executor
+        self._segmenter = SentenceSegmenter(min_chars)
+        self._futures = []
+        self.segments = []
+
+    def feed(self, text):
+        for segment in self._segmenter.feed(text):
+            self._submit(segment)
+
+    def close(self):
+        """스트림이 끝났을 때 남은 텍스트를 제출합니다."""
+        for segment in self._segmenter.flush():
+            self._submit(segment)
+
+    def tee(self, tokens):
+        """토큰 이터레이터를 그대로 흘려보내면서 파이프라인에 공급합니다."""
+        for token in tokens:
+            self.feed(token)
+            yield token
+        self.close()
+
+    def cancel(self):
+        """아직 시작하지 않은 합성 작업을 취소합니다 (오류 응답 등)."""
+        for future in self._futures:
+            future.cancel()
+
+    def iter_audio(self):
+        """합성된 오디오를 문장 순서대로 yield 합니다 (실패한 문장은 None)."""
+        for future in self._futures:
+            if future.cancelled():
+                yield None
+                continue
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"TTS 문장 합성 실패: {e}")
+                yield None
+
+    def result_bytes(self):
+        """모든 문장의 오디오를 순서대로 이어 붙입니다 (MP3 프레임은 연결해도 재생 가능)."""
+        chunks = [audio for audio in self.iter_audio() if audio]
+        return b"".join(chunks) if chunks else None
+
+    def _submit(self, segment):
+        self.segments.append(segment)
+        # 호출한 쪽의 contextvars(현재 trace 등)를 워커 스레드로 넘김
+        self._futures.append(self._executor.submit(contextvars.copy_context().run, self._synthesize, segment))
+
+
+class FakeTTSBackend:
+    """
+    오프라인 테스트/벤치마크용 TTS 대역. 글자 수에 비례해 지연한 뒤 결정적인 바이트를 돌려주고,
+    각 호출의 시작/종료 시각을 기록해 겹침과 순서를 확인할 수 있게 합니다.
+    """
+
+    def __init__(self, base_latency=0.15, latency_per_char=0.004):
+        self.base_latency = base_latency
+        self.latency_per_char = latency_per_char
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, text):
+        started = time.perf_counter()
+        time.sleep(self.base_latency + self.latency_per_char * len(text))
+        with self._lock:
+            self.calls.append((text, started, time.perf_counter()))
+        return f"<audio:{text}>".encode("utf-8")
+
+
+def _fake_token_stream(text, token_delay):
+    for token in re.findall(r"\S+\s*", text):
+        time.sleep(token_delay)
+        yield token
+
+
+def _benchmark(text, token_delay=0.03):
+    """순차(LLM 완료 후 전체 TTS) 방식과 문장 파이프라인 방식의 첫 오디오/전체 시간을 비교합니다."""
+    backend = FakeTTSBackend()
+    start = time.perf_counter()
+    full_text = "".join(_fake_token_stream(text, token_delay))
+    backend(full_text)
+    sequential = time.perf_counter() - start
+
+    backend = FakeTTSBackend()
+    start = time.perf_counter()
+    pipeline = TTSPipeline(backend)
+    for _ in pipeline.tee(_fake_token_stream(text, token_delay)):
+        pass
+    audio = list(pipeline.iter_audio())
+    pipelined = time.perf_counter() - start
+    first_audio_at = next(end for segment, _, end in backend.calls if segment == pipeline.segments[0]) - start
+
+    ordered = audio == [f"<audio:{segment}>".encode("utf-8") for segment in pipeline.segments]
+    overlapped = any(begin < end_other and begin_other < end
+                     for i, (_, begin, end) in enumerate(backend.calls)
+                     for _, begin_other, end_other in backend.calls[i + 1:])
+    print(f"문장 수: {len(pipeline.segments)}, 순서 유지: {ordered}, TTS 병렬 겹침: {overlapped}")
+    print(f"순차 방식: 첫 오디오 {sequential:.2f}s / 전체 {sequential:.2f}s")
+    print(f"파이프라인: 첫 오디오 {first_audio_at:.2f}s / 전체 {pipelined:.2f}s")
+
+
+if __name__ == "__main__":
+    _benchmark(
+        "문보경 선수는 올 시즌 20경기에서 타율 0.373을 기록했습니다. 홈런은 5개, 타점은 20개입니다! "
+        "OPS는 1.062로 리그 상위권이에요. 수비에서도 dWAR 0.26으로 안정적인 모습입니다. "
+        "이 페이스라면 시즌 MVP 후보로도 손색이 없겠네요? 앞으로의 활약이 정말 기대됩니다."
+    )
@@ -0,0 +1,202 @@
+# vector_index.py (FAISS 인덱스 종류 선택/학습과 메모리 매핑 로드)
+#
+# 인덱스 종류:
+#   flat  정확한 L2 검색 (벡터당 d*4 바이트, 기본값)
+#   sq8   8비트 스칼라 양자화 (벡터당 d 바이트, 정확도 손실 거의 없음)
+#   ivf   IVF 클러스터 검색 (nprobe개 클러스터만 탐색, 벡터는 float32 그대로)
+#   hnsw  HNSW 그래프 검색 (학습 불필요, 그래프만큼 파일이 커짐)
+#   pq    IVF + PQ 곱 양자화 (벡터당 약 d/16 바이트로 가장 작음, 재현율 손실 있음)
+#
+# 저장된 인덱스는 faiss.IO_FLAG_MMAP으로 열어 벡터를 프로세스 메모리에 복사하지 않으므로
+# 데이터가 늘어도 시작 시간과 프로세스별 RSS가 거의 그대로입니다 (페이지 캐시는 프로세스 간 공유).
+# 문서 본문/메타데이터는 pickle 대신 columnar_docstore 형식(docstore.bin)으로 저장하고 같은 방식으로 매핑합니다.
+#
+# 환경 변수:
+#   ONEDAYAI_IVF_NPROBE  ivf/pq 검색에서 탐색할 클러스터 수 (기본: nlist/8, 최소 8, nlist 이하)
+#                        benchmark.py의 인덱스 비교가 nprobe별 recall을 함께 출력하므로 그 결과로 정합니다.
+import os
+import math
+import tempfile
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+import embedding_providers as ep
+from columnar_docstore import ColumnarDocstore, write_docstore
+
+INDEX_TYPES = ("flat", "sq8", "ivf", "hnsw", "pq")
+DEFAULT_INDEX_TYPE = "flat"
+
+INDEX_FILENAME = "index.faiss"  # FAISS.save_local/load_local과 같은 파일 이름
+DOCSTORE_FILENAME = "docstore.bin"  # 예전 index.pkl(pickle)은 읽지 않음: 없으면 인덱스를 다시 만듦
+
+# 삭제 후 남은 벡터의 위치가 당겨지는 인덱스(IndexFlatCodes 계열)만 LangChain FAISS.delete와 호환됩니다.
+# 나머지는 CSV가 바뀌면 다시 학습합니다 (임베딩은 디스크 캐시에서 읽으므로 API 호출 없음).
+INCREMENTAL_INDEX_TYPES = ("flat", "sq8")
+
+_INDEX_BASE = "rows"
+_MIN_TRAIN_POINTS = 64  # 이보다 벡터가 적으면 학습형 인덱스 대신 flat으로 만듦
+_IVF_POINTS_PER_LIST = 39  # faiss 권장: 클러스터당 학습 벡터 39개 이상
+_IVF_NPROBE_RATIO = 8  # nprobe = nlist / 8
+_IVF_MIN_NPROBE = 8  # 클러스터가 적을 때 nlist/8이 1~2가 되면 recall이 크게 떨어지므로 최소값
+_IVF_NPROBE = int(os.environ["ONEDAYAI_IVF_NPROBE"]) if os.environ.get("ONEDAYAI_IVF_NPROBE") else None
+_HNSW_M = 32
+_HNSW_EF_SEARCH = 64
+_PQ_DIMS_PER_SUBQUANTIZER = 16
+
+
+def index_subdir(index_type=DEFAULT_INDEX_TYPE, embedding_provider=ep.OPENAI):
+    """
+    인덱스 폴더 이름 (인덱스 종류와 임베딩 제공자로 구분: rows, rows_ivf, rows-ngram, rows-ngram_ivf, ...).
+    OpenAI 제공자는 제공자를 나누기 전 폴더 이름을 그대로 씁니다.
+    """
+    base = _INDEX_BASE if embedding_provider == ep.OPENAI else f"{_INDEX_BASE}-{embedding_provider}"
+    return base if index_type == DEFAULT_INDEX_TYPE else f"{base}_{index_type}"
+
+
+def check_index_type(index_type):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"알 수 없는 index_type: {index_type} (가능한 값: {', '.join(INDEX_TYPES)})")
+
+
+def _ivf_nlist(count):
+    return max(1, min(int(4 * math.sqrt(count)), count // _IVF_POINTS_PER_LIST))
+
+
+def _pq_subquantizers(dim):
+    """d를 나누어떨어지게 하는 부분 양자화기 수 중 d/16에 가장 가까운 값."""
+    target = max(1, dim // _PQ_DIMS_PER_SUBQUANTIZER)
+    divisors = [m for m in range(1, dim + 1) if dim % m == 0]
+    return min(divisors, key=lambda m: (abs(m - target), m))
+
+
+def factory_string(index_type, dim, count):
+    """faiss.index_factory 문자열을 결정합니다 (벡터 수에 맞춰 클러스터 수/PQ 비트 수 조정)."""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "hnsw":
+        return f"HNSW{_HNSW_M}"
+    if index_type == "ivf":
+        return f"IVF{_ivf_nlist(count)},Flat"
+    # PQ 코드북(2^nbits개 중심)은 학습 벡터가 충분해야 하므로 적으면 4비트로
+    nbits = 8 if count >= 256 * _IVF_POINTS_PER_LIST else 4
+    return f"IVF{_ivf_nlist(count)},PQ{_pq_subquantizers(dim)}x{nbits}"
+
+
+def ivf_nprobe(nlist, nprobe=None):
+    """탐색할 클러스터 수: nprobe(없으면 ONEDAYAI_IVF_NPROBE, 그것도 없으면 nlist/8과 최소값 중 큰 값)를 nlist 이하로."""
+    nprobe = nprobe or _IVF_NPROBE or max(_IVF_MIN_NPROBE, nlist // _IVF_NPROBE_RATIO)
+    return max(1, min(nlist, nprobe))
+
+
+def extract_ivf(index):
+    """ivf/pq 인덱스의 IVF 부분 (nlist, nprobe). IVF가 아니면 None."""
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def tune_search(index, nprobe=None):
+    """저장/로드 후에도 같은 검색 파라미터(nprobe, efSearch)를 쓰도록 다시 지정합니다. nprobe는 ivf_nprobe 참고."""
+    ivf = extract_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = ivf_nprobe(ivf.nlist, nprobe)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = _HNSW_EF_SEARCH
+    return index
+
+
+def train_index(vectorstore, index_type):
+    """
+    FAISS.from_documents로 만든 flat 벡터스토어의 벡터로 index_type 인덱스를 학습시켜 교체합니다.
+    벡터가 너무 적으면 flat을 유지합니다. 실제로 사용한 인덱스 종류를 반환합니다.
+    """
+    check_index_type(index_type)
+    flat = vectorstore.index
+    if index_type == "flat":
+        return "flat"
+    if index_type != "sq8" and flat.ntotal < _MIN_TRAIN_POINTS:
+        print(f"벡터가 {flat.ntotal}개뿐이라 '{index_type}' 대신 flat 인덱스를 사용합니다.")
+        return "flat"
+    vectors = flat.reconstruct_n(0, flat.ntotal)
+    spec = factory_string(index_type, flat.d, flat.ntotal)
+    index = faiss.index_factory(flat.d, spec, faiss.METRIC_L2)
+    index.train(vectors)
+    index.add(vectors)
+    vectorstore.index = tune_search(index)
+    print(f"'{spec}' 인덱스 학습 완료 ({flat.ntotal}개 벡터)")
+    return index_type
+
+
+def atomic_write(index_path, filename, write):
+    """write(임시 경로)로 임시 파일을 쓴 뒤 index_path/filename으로 교체합니다."""
+    fd, tmp_path = tempfile.mkstemp(dir=index_path, prefix=f".{filename}-", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, os.path.join(index_path, filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_vectorstore(vectorstore, index_path):
+    """
+    인덱스(index.faiss)와 docstore(docstore.bin)를 임시 파일에 쓴 뒤 교체합니다.
+    다른 세션이 같은 파일을 메모리 매핑하고 있을 때 제자리에서 덮어쓰면 SIGBUS로 프로세스가 죽기 때문입니다.
+    docstore는 인덱스 벡터 순서대로 쓰므로 로드할 때 index_to_docstore_id를 따로 저장할 필요가 없습니다.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    atomic_write(index_path, INDEX_FILENAME, lambda path: faiss.write_index(vectorstore.index, path))
+    doc_ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+    documents = [vectorstore.docstore.search(doc_id) for doc_id in doc_ids]
+    missing = [doc_id for doc_id, doc in zip(doc_ids, documents) if not isinstance(doc, Document)]
+    if missing:
+        raise ValueError(f"docstore에 없는 문서 ID가 {len(missing)}개 있습니다: {missing[:3]}")
+    atomic_write(index_path, DOCSTORE_FILENAME, lambda path: write_docstore(path, doc_ids, documents))
+
+
+def load_vectorstore(index_path, embeddings, mmap=True):
+    """
+    저장된 인덱스를 엽니다. mmap=True이면 읽기 전용 메모리 매핑으로 열며, 이 경우 add/delete를 할 수 없습니다.
+    메모리 매핑을 지원하지 않는 faiss 빌드/플랫폼에서는 일반 로드로 대신합니다.
+    docstore는 항상 매핑해 열고 문서는 검색될 때 디코딩합니다 (증분 갱신 내용은 메모리에 얹었다가 저장 시 합침).
+    """
+    index_file = os.path.join(index_path, INDEX_FILENAME)
+    mapped = False
+    if mmap:
+        try:
+            index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            mapped = True
+        except RuntimeError as e:
+            print(f"메모리 매핑 로드 실패, 일반 로드로 대신합니다: {e}")
+    if not mapped:
+        index = faiss.read_index(index_file)
+    docstore = ColumnarDocstore(os.path.join(index_path, DOCSTORE_FILENAME))
+    doc_ids = docstore.doc_ids()
+    if len(doc_ids) != index.ntotal:
+        raise ValueError(f"docstore 문서 수({len(doc_ids)})와 인덱스 벡터 수({index.ntotal})가 다릅니다.")
+    vectorstore = FAISS(embeddings, tune_search(index), docstore, dict(enumerate(doc_ids)))
+    vectorstore.memory_mapped = mapped
+    return vectorstore
+
+
+def index_file_bytes(index_path):
+    return os.path.getsize(os.path.join(index_path, INDEX_FILENAME))
+
+
+def docstore_file_bytes(index_path):
+    return os.path.getsize(os.path.join(index_path, DOCSTORE_FILENAME))
+
+
+def recall_at_k(exact_results, approx_results):
+    """질의별 정확한 검색 결과(문서 ID 목록) 대비 근사 검색 결과의 평균 recall@k."""
+    recalls = [len(set(exact).intersection(approx)) / len(exact)
+               for exact, approx in zip(exact_results, approx_results) if exact]
+    return float(np.mean(recalls)) if recalls else 0.0